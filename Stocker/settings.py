@@ -54,6 +54,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main.middleware.SQLStatsMiddleware',
+    'main.middleware.PrimaryPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,13 +84,90 @@ WSGI_APPLICATION = 'Stocker.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Run on every new connection. WAL lets readers carry on while one writer
+# commits; synchronous=NORMAL is durable across crashes of the app (not of
+# the OS) under WAL; writers wait up to busy_timeout ms for the lock.
+SQLITE_INIT_COMMAND = (
+    'PRAGMA journal_mode=WAL;'
+    'PRAGMA synchronous=NORMAL;'
+    'PRAGMA busy_timeout=10000;'
+    'PRAGMA cache_size=-32000;'
+    'PRAGMA mmap_size=268435456;'
+    'PRAGMA temp_store=MEMORY;'
+)
+
+# seconds a connection is kept for reuse by the next request
+CONN_MAX_AGE = int(os.environ.get('STOCKER_CONN_MAX_AGE', 300))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # take the write lock when a transaction starts, so concurrent writers
+            # queue on the busy timeout instead of failing to upgrade a read lock
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': SQLITE_INIT_COMMAND,
+        },
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        # a file rather than shared-cache memory, so threaded tests get real locking
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+
+# A read replica: a copy of the primary refreshed by `manage.py sync_replica`.
+# With it set, main.db_router sends reads there and writes to the primary.
+if os.environ.get('STOCKER_REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['STOCKER_REPLICA_DB'],
+        'OPTIONS': {
+            'init_command': SQLITE_INIT_COMMAND + 'PRAGMA query_only=ON;',
+        },
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    }
+
+DATABASE_ROUTERS = ['main.db_router.PrimaryReplicaRouter']
+
+# how long a client that wrote keeps reading from the primary
+DATABASE_REPLICA_LAG_SECONDS = int(os.environ.get('STOCKER_REPLICA_LAG', 30))
+
+
+# SQL instrumentation (main.sqlstats): share of requests recorded (staff
+# requests always are), repeats of one query shape that flag an N+1,
+# and how many request summaries each process keeps.
+SQL_STATS_SAMPLE_RATE = float(os.environ.get('STOCKER_SQL_SAMPLE_RATE', 1.0 if DEBUG else 0.01))
+SQL_STATS_N_PLUS_ONE = int(os.environ.get('STOCKER_SQL_N_PLUS_ONE', 5))
+SQL_STATS_LOG_SIZE = 200
+
+
+# Cache
+# Per-process memory by default. Set STOCKER_CACHE_DIR to share one file
+# cache between workers. Entries are keyed by version stamps, so either
+# way a write never leaves a stale entry behind, it just stops using it.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'stocker',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
     }
 }
 
+if os.environ.get('STOCKER_CACHE_DIR'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['STOCKER_CACHE_DIR'],
+        'TIMEOUT': 86400,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -134,6 +213,27 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Media URLs carry a content hash (?v=...) and are served by main.media.serve
+STORAGES = {
+    'default': {'BACKEND': 'main.media.HashedMediaStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Who may fetch what under MEDIA_ROOT: first matching prefix wins,
+# anything unlisted is staff-only
+MEDIA_ACCESS = [
+    ('products/', 'public'),
+    ('suppliers/', 'public'),
+    ('images/avatars/', 'authenticated'),
+    ('avatars/', 'authenticated'),
+]
+
+# '' streams files from Python. 'x-accel-redirect' (nginx) or 'x-sendfile'
+# (Apache/lighttpd) hand the bytes to the web server after access checks;
+# for nginx, MEDIA_ACCEL_PREFIX must be an `internal` location aliased to MEDIA_ROOT.
+MEDIA_OFFLOAD = os.environ.get('STOCKER_MEDIA_OFFLOAD', '')
+MEDIA_ACCEL_PREFIX = os.environ.get('STOCKER_MEDIA_ACCEL_PREFIX', '/protected-media/')
+
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -15,9 +15,9 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
-from django.conf.urls.static import static
-from . import settings
+from django.urls import path, re_path, include
+from django.conf import settings
+from main.views import media_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -26,4 +26,6 @@ urlpatterns = [
     path("suppliers/", include("suppliers.urls")),
     path("accounts/", include("accounts.urls")),
     path("reports/", include("reports.urls")),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path("api/v1/", include("main.api_urls")),
+    re_path(r"^%s(?P<name>.+)$" % settings.MEDIA_URL.lstrip("/"), media_view, name="media_view"),
+]
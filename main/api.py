@@ -0,0 +1,150 @@
+import base64
+import binascii
+import hashlib
+from functools import wraps
+from django.contrib.auth import authenticate
+from django.http import HttpResponse, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from .pagination import InvalidCursor
+
+
+def json_error(message:str, status:int, **extra) -> JsonResponse:
+    return JsonResponse(dict(extra, error=message), status=status)
+
+
+def basic_auth_user(request):
+    '''The user named by an "Authorization: Basic" header, or None.'''
+    scheme, _, credentials = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+    if scheme.lower() != "basic":
+        return None
+    try:
+        username, _, password = base64.b64decode(credentials.strip()).decode("utf-8").partition(":")
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    return authenticate(request, username=username, password=password)
+
+
+def api_view(view):
+    '''
+    Authentication for JSON endpoints used by scripts as well as the browser.
+
+    Clients send HTTP Basic credentials and need no CSRF token; requests
+    authenticated by the session cookie still go through the CSRF check.
+    '''
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if "HTTP_AUTHORIZATION" in request.META:
+            user = basic_auth_user(request)
+            if user is None or not user.is_active:
+                response = json_error("invalid credentials", 401)
+                response["WWW-Authenticate"] = 'Basic realm="api"'
+                return response
+            request.user = user
+        else:
+            if not request.user.is_authenticated:
+                response = json_error("authentication required", 401)
+                response["WWW-Authenticate"] = 'Basic realm="api"'
+                return response
+            rejected = CsrfViewMiddleware(lambda request: None).process_view(request, None, (), {})
+            if rejected is not None:
+                return json_error("CSRF verification failed", 403)
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+API_PAGE_SIZE = 100
+MAX_API_PAGE_SIZE = 500
+
+
+class ApiError(Exception):
+
+    def __init__(self, message:str, status:int=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_fields(request, available:dict, default:tuple, restricted:tuple=()) -> list:
+    '''
+    The fields a client picked with ?fields=a,b,c, in the order given.
+
+    Fields in restricted are only offered to staff.
+    '''
+    allowed = [name for name in available if request.user.is_staff or name not in restricted]
+    value = request.GET.get("fields", "").strip()
+    if not value:
+        return [name for name in default if name in allowed]
+    fields = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise ApiError(f"unknown fields: {', '.join(unknown)}; available: {', '.join(allowed)}")
+    return fields
+
+
+def parse_page_size(request) -> int:
+    value = request.GET.get("limit")
+    if not value:
+        return API_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ApiError("limit must be a whole number")
+    if not 1 <= limit <= MAX_API_PAGE_SIZE:
+        raise ApiError(f"limit must be between 1 and {MAX_API_PAGE_SIZE}")
+    return limit
+
+
+def parse_bool(request, name:str):
+    value = request.GET.get(name)
+    if value is None or value == "":
+        return None
+    if value.lower() in ("1", "true", "yes"):
+        return True
+    if value.lower() in ("0", "false", "no"):
+        return False
+    raise ApiError(f"{name} must be true or false")
+
+
+def page_url(request, token:str):
+    if token is None:
+        return None
+    query = request.GET.copy()
+    query["cursor"] = token
+    return request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+
+
+def cursor_page(request, paginator):
+    '''The ?cursor= page of a listing; a cursor that is not one of ours is a 400, not the first page.'''
+    try:
+        return paginator.get_page(request.GET.get("cursor"), strict=True)
+    except InvalidCursor:
+        raise ApiError("cursor is not valid for this listing")
+
+
+def make_etag(request, *parts) -> str:
+    '''
+    A strong ETag for a listing: the version stamps it was built from plus
+    everything in the request that changes its content.
+    '''
+    query = sorted((key, value) for key, values in request.GET.lists() for value in values)
+    digest = hashlib.sha1(repr((request.path, query, request.user.is_staff) + parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def conditional_json(request, etag:str, build) -> HttpResponse:
+    '''
+    304 when the client's If-None-Match still matches, otherwise the JSON from build().
+
+    Listings are only built, and their queries run, once the ETag has changed,
+    so a polling client costs a single version lookup.
+    '''
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(build())
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    patch_vary_headers(response, ("Authorization", "Cookie"))
+    return response
@@ -0,0 +1,13 @@
+from django.urls import path
+from products import views as product_views
+from suppliers import views as supplier_views
+
+
+app_name = "api"
+
+# read-only JSON API; breaking changes go under a new version prefix
+urlpatterns = [
+    path("products/", product_views.product_api_view, name="product_api_view"),
+    path("categories/", product_views.category_api_view, name="category_api_view"),
+    path("suppliers/", supplier_views.supplier_api_view, name="supplier_api_view"),
+]
@@ -0,0 +1,161 @@
+import os
+import time
+import tracemalloc
+from django.urls import reverse
+from products.models import Product, Category
+from suppliers.models import Supplier
+from . import sqlstats
+
+
+# multiplies every time budget, for slow CI machines
+TIME_BUDGET_SCALE = float(os.environ.get("STOCKER_BENCH_TIME_SCALE", 1.0))
+
+
+class Case:
+    '''
+    One URL to benchmark and its budgets.
+
+    target names the object the URL takes ("product", "category",
+    "supplier"), resolved against the database by targets(). max_queries
+    must not grow with the catalog; max_ms bounds the p95.
+    '''
+
+    def __init__(self, url_name:str, max_queries:int, max_ms:float, target:str=None, query:str=""):
+        self.url_name = url_name
+        self.max_queries = max_queries
+        self.max_ms = max_ms
+        self.target = target
+        self.query = query
+
+    @property
+    def name(self) -> str:
+        return self.url_name + (f"?{self.query}" if self.query else "")
+
+    def url(self, targets:dict) -> str:
+        url = reverse(self.url_name, args=[targets[self.target]] if self.target else None)
+        return f"{url}?{self.query}" if self.query else url
+
+
+# Every read-only URL of main, products, suppliers and reports, as staff.
+# Left out because a GET writes: the delete views, products:stock_movement_view,
+# products:bulk_stock_view (POST) and products:check_notifications_view (sends alerts).
+# main:contact_messages_view has no template in the tree yet.
+# Query budgets are what the page runs at any catalog size, plus one; time
+# budgets hold with 10,000 products (the low-stock and expiring reports
+# list every matching product, so they are the slowest by far).
+CASES = [
+    Case("main:home_view", 6, 100),
+    Case("main:dashboard_view", 8, 100),
+    Case("main:contact_view", 4, 50),
+    Case("main:sql_stats_view", 3, 50),
+    Case("api:product_api_view", 5, 100),
+    Case("api:category_api_view", 5, 50),
+    Case("api:supplier_api_view", 5, 50),
+
+    Case("products:product_list_view", 7, 100),
+    Case("products:product_create_view", 4, 50),
+    Case("products:product_detail_view", 11, 100, target="product"),
+    Case("products:product_update_view", 7, 50, target="product"),
+    Case("products:product_search_view", 4, 50, query="q=milk"),
+    Case("products:autocomplete_view", 3, 50, query="kind=product&q=mi"),
+    Case("products:category_list_view", 6, 100),
+    Case("products:category_create_view", 4, 50),
+    Case("products:category_update_view", 5, 50, target="category"),
+    Case("products:export_products_csv", 4, 1000),
+    Case("products:import_products_csv", 4, 50),
+
+    Case("suppliers:supplier_list_view", 7, 100),
+    Case("suppliers:supplier_create_view", 4, 50),
+    Case("suppliers:supplier_detail_view", 6, 50, target="supplier"),
+    Case("suppliers:supplier_update_view", 5, 50, target="supplier"),
+    Case("suppliers:supplier_search_view", 4, 50, query="q=trading"),
+
+    Case("reports:reports_dashboard", 8, 100),
+    Case("reports:inventory_report", 9, 400),
+    Case("reports:analytics_report", 6, 100),
+    Case("reports:analytics_api", 4, 50),
+    Case("reports:stock_trend_api", 4, 50),
+    Case("reports:supplier_report", 6, 300),
+    Case("reports:low_stock_report", 6, 1000),
+    Case("reports:expiring_products_report", 6, 1000),
+]
+
+
+class Result:
+
+    def __init__(self, case:Case, status:int, timings:list, queries:int, suspects:list, peak_kb:float):
+        self.case = case
+        self.status = status
+        self.timings = sorted(timings)
+        self.queries = queries
+        self.suspects = suspects
+        self.peak_kb = peak_kb
+
+    def percentile(self, fraction:float) -> float:
+        return self.timings[min(len(self.timings) - 1, int(len(self.timings) * fraction))] * 1000
+
+    @property
+    def p50(self) -> float:
+        return self.percentile(0.5)
+
+    @property
+    def p95(self) -> float:
+        return self.percentile(0.95)
+
+    def failures(self) -> list:
+        failures = []
+        if self.status != 200:
+            failures.append(f"status {self.status}")
+        if self.queries > self.case.max_queries:
+            failures.append(f"{self.queries} queries > {self.case.max_queries}")
+        if self.p95 > self.case.max_ms * TIME_BUDGET_SCALE:
+            failures.append(f"p95 {self.p95:.1f} ms > {self.case.max_ms * TIME_BUDGET_SCALE:.0f} ms")
+        return failures
+
+
+def targets() -> dict:
+    '''An object of each kind for the detail and update URLs (the richest product).'''
+    product = Product.objects.order_by("-current_stock", "id").first()
+    return {
+        "product": product.id if product else 0,
+        "category": Category.objects.order_by("id").values_list("id", flat=True).first() or 0,
+        "supplier": Supplier.objects.order_by("id").values_list("id", flat=True).first() or 0,
+    }
+
+
+def _get(client, url:str):
+    response = client.get(url)
+    if response.streaming:
+        # an export's queries and time are spent while it streams
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def run_case(client, case:Case, targets:dict, repeat:int=10) -> Result:
+    '''
+    Times repeat GETs of the case's URL after one warm-up, then counts the
+    queries of one more and its peak Python memory (tracemalloc) of another.
+    '''
+    url = case.url(targets)
+    response = _get(client, url)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _get(client, url)
+        timings.append(time.perf_counter() - start)
+
+    with sqlstats.record() as stats:
+        _get(client, url)
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    _get(client, url)
+    peak = tracemalloc.get_traced_memory()[1]
+    if not tracing:
+        tracemalloc.stop()
+
+    return Result(case, response.status_code, timings, stats.count, stats.suspects(), peak / 1024)
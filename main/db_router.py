@@ -0,0 +1,68 @@
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA_DB_ALIAS = "replica"
+
+# never read from a copy: a session missing from a lagging replica logs the user out
+PRIMARY_ONLY_APPS = {"sessions"}
+
+# None outside a unit of work; inside one, set once it has written, so what
+# follows reads its own writes. Only start_pinned() opens a unit of work, so a
+# write from a command or a test never leaves the rest of the process pinned.
+_pinned = ContextVar("pinned_to_primary", default=None)
+
+
+def start_pinned(pinned:bool=True):
+    '''Starts a unit of work (a request) on the primary or not; returns a token for finish().'''
+    return _pinned.set(pinned)
+
+
+def finish(token):
+    _pinned.reset(token)
+
+
+def is_pinned() -> bool:
+    return bool(_pinned.get())
+
+
+def replica_enabled() -> bool:
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+class PrimaryReplicaRouter:
+    '''
+    Reads go to the replica alias when one is configured, writes to the primary.
+
+    Reads stay on the primary inside a transaction (select_for_update and
+    read-modify-write code must see the rows it is about to change) and
+    for the rest of a request once it has written. Migrations only run
+    on the primary; the replica is a copy of it (see sync_replica).
+    '''
+
+    def db_for_read(self, model, **hints):
+        if (
+            not replica_enabled()
+            or is_pinned()
+            or model._meta.app_label in PRIMARY_ONLY_APPS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if _pinned.get() is not None:
+            _pinned.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both aliases hold the same rows
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_DB_ALIAS:
+            return False
+        return None
@@ -0,0 +1,220 @@
+import hashlib
+import io
+import json
+import logging
+import posixpath
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+class Preset:
+    '''
+    A set of derivative widths for one kind of picture.
+
+    square presets are centre-cropped to 1:1 (logos and avatars are shown
+    in round or square frames); the others keep the original's aspect.
+    '''
+
+    def __init__(self, widths:tuple, sizes:str, square:bool=False):
+        self.widths = widths
+        self.sizes = sizes
+        self.square = square
+
+
+PRESETS = {
+    "card": Preset((240, 400, 640), "(min-width: 768px) 33vw, 100vw"),
+    "logo": Preset((80, 160), "80px", square=True),
+    "avatar": Preset((40, 80), "35px", square=True),
+}
+
+# WebP first; JPEG is the <img> fallback
+FORMATS = ("webp", "jpeg")
+QUALITY = {"webp": 80, "jpeg": 82}
+
+# model label -> (image field, preset), for the post_save hook and the backfill
+IMAGE_FIELDS = {
+    "products.product": ("image", "card"),
+    "suppliers.supplier": ("logo", "logo"),
+    "accounts.profile": ("avatar", "avatar"),
+}
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_TIMEOUT = None
+# a missing or unreadable original is retried after this, not on every render
+FAILURE_TIMEOUT = 5 * 60
+# an image whose derivatives aren't made yet is looked for again after this
+PENDING_TIMEOUT = 60
+
+
+def content_hash(data:bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:20]
+
+
+def derivative_name(name:str, digest:str, preset:str, width:int, extension:str) -> str:
+    '''products/pb.jpg -> products/thumbs/<hash>/card-400.webp'''
+    return posixpath.join(posixpath.dirname(name), "thumbs", digest, f"{preset}-{width}.{extension}")
+
+
+def manifest_name(name:str, digest:str, preset:str) -> str:
+    '''products/pb.jpg -> products/thumbs/<hash>/card.json, written once the derivatives are'''
+    return posixpath.join(posixpath.dirname(name), "thumbs", digest, f"{preset}.json")
+
+
+def _manifest_key(name:str, preset:str) -> str:
+    return f"images:{preset}:{hashlib.sha1(name.encode()).hexdigest()}"
+
+
+def _resize(image:Image.Image, width:int, square:bool) -> Image.Image:
+    if square:
+        return ImageOps.fit(image, (width, width), Image.LANCZOS)
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _open(data:bytes) -> Image.Image:
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    transparent = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    return image.convert("RGBA" if transparent else "RGB")
+
+
+def _encode(image:Image.Image, extension:str) -> bytes:
+    buffer = io.BytesIO()
+    if extension == "jpeg":
+        if image.mode == "RGBA":
+            # JPEG has no alpha: flatten transparent logos onto white
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        image.save(buffer, "JPEG", quality=QUALITY["jpeg"], optimize=True, progressive=True)
+    else:
+        image.save(buffer, "WEBP", quality=QUALITY["webp"], method=4)
+    return buffer.getvalue()
+
+
+def _read(name:str) -> bytes:
+    with default_storage.open(name, "rb") as source:
+        return source.read()
+
+
+def _stored_manifest(name:str, digest:str, preset:str):
+    '''
+    The manifest generate() left next to the derivatives, or None. One
+    that is still being written reads as None too.
+    '''
+    path = manifest_name(name, digest, preset)
+    if not default_storage.exists(path):
+        return None
+    try:
+        return json.loads(_read(path))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def generate(name:str, preset:str) -> dict:
+    '''
+    Writes the preset's derivatives of a stored image and returns its manifest.
+
+    Derivatives live under thumbs/<content hash>/ next to the original, so
+    a file whose derivatives already exist (the same upload under another
+    name, or a re-run) is only read and hashed. Widths above the
+    original's are skipped rather than upscaled. The manifest is written
+    last, so once it exists every derivative it lists does too.
+    '''
+    data = _read(name)
+    digest = content_hash(data)
+    manifest = _stored_manifest(name, digest, preset)
+    if manifest is not None:
+        remember(name, preset, manifest)
+        return manifest
+
+    settings = PRESETS[preset]
+    image = _open(data)
+    widths = [width for width in settings.widths if width <= image.width] or [image.width]
+
+    variants = []
+    for width in widths:
+        resized = None
+        for extension in FORMATS:
+            path = derivative_name(name, digest, preset, width, extension)
+            if default_storage.exists(path):
+                continue
+            if resized is None:
+                resized = _resize(image, width, settings.square)
+            default_storage.save(path, ContentFile(_encode(resized, extension)))
+        height = width if settings.square else max(1, round(image.height * width / image.width))
+        variants.append([width, height])
+
+    manifest = {"hash": digest, "variants": variants}
+    path = manifest_name(name, digest, preset)
+    # another worker may have finished the same image first
+    if not default_storage.exists(path):
+        default_storage.save(path, ContentFile(json.dumps(manifest).encode()))
+    remember(name, preset, manifest)
+    return manifest
+
+
+def remember(name:str, preset:str, manifest:dict):
+    cache.set(_manifest_key(name, preset), manifest, MANIFEST_TIMEOUT)
+
+
+def get_manifest(name:str, preset:str):
+    '''
+    The derivatives of an image, from the cache or else from the manifest
+    generate() stored next to them. Nothing is decoded or resized here:
+    that is left to the post_save hook and generate_thumbnails. None
+    until then, or when the original is gone: the page shows the original.
+    '''
+    if not name:
+        return None
+    key = _manifest_key(name, preset)
+    manifest = cache.get(key)
+    if manifest is False:
+        return None
+    if manifest is None:
+        try:
+            manifest = _stored_manifest(name, content_hash(_read(name)), preset)
+        except FileNotFoundError:
+            # e.g. a default picture that was never uploaded
+            logger.info("No original for %s thumbnails: %s", preset, name)
+            cache.set(key, False, FAILURE_TIMEOUT)
+            return None
+        except Exception:
+            logger.warning("Couldn't read %s for %s thumbnails", name, preset, exc_info=True)
+            cache.set(key, False, FAILURE_TIMEOUT)
+            return None
+        if manifest is None:
+            cache.set(key, False, PENDING_TIMEOUT)
+        else:
+            remember(name, preset, manifest)
+    return manifest
+
+
+def make_derivatives(name:str, preset:str):
+    '''
+    generate() unless the manifest is already cached, logging a failure
+    rather than raising it: for the post_save hook.
+    '''
+    if not name or cache.get(_manifest_key(name, preset)):
+        return
+    try:
+        generate(name, preset)
+    except FileNotFoundError:
+        logger.info("No original for %s thumbnails: %s", preset, name)
+        cache.set(_manifest_key(name, preset), False, FAILURE_TIMEOUT)
+    except Exception:
+        logger.warning("Couldn't make %s thumbnails for %s", preset, name, exc_info=True)
+        cache.set(_manifest_key(name, preset), False, FAILURE_TIMEOUT)
+
+
+def derivative_url(name:str, digest:str, preset:str, width:int, extension:str) -> str:
+    return default_storage.url(derivative_name(name, digest, preset, width, extension))
+
+
+def srcset(name:str, preset:str, manifest:dict, extension:str) -> str:
+    return ", ".join(
+        f"{derivative_url(name, manifest['hash'], preset, width, extension)} {width}w"
+        for width, _ in manifest["variants"]
+    )
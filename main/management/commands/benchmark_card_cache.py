@@ -0,0 +1,59 @@
+import time
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.test import override_settings
+from main import versions
+from products.models import Product
+from suppliers.models import Supplier
+
+
+GRIDS = {
+    "product_list": ("products/product_list_items.html", "products", lambda: Product.objects.select_related("category").order_by("-created_at", "-id"), ("products.category",)),
+    "dashboard": ("main/dashboard.html", "products", lambda: Product.objects.order_by("-created_at", "-id"), ()),
+    "supplier_list": ("suppliers/supplier_list_items.html", "suppliers", lambda: Supplier.objects.order_by("name", "id"), ()),
+}
+
+
+class Command(BaseCommand):
+    help = 'Time a page of cards rendered without the fragment cache, with it empty and with it warm (clears the default cache)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=12, help='Cards per page')
+        parser.add_argument('--repeat', type=int, default=50, help='Renders timed per case')
+        parser.add_argument('--grid', choices=list(GRIDS), action='append', help='Grids to time (default: all)')
+
+    def _render(self, template, name, objects, shared_keys) -> float:
+        start = time.perf_counter()
+        # looking the versions up is part of the cached path's cost
+        render_to_string(template, {name: versions.with_versions(objects, *shared_keys)})
+        return time.perf_counter() - start
+
+    def _median_ms(self, timings) -> float:
+        return sorted(timings)[len(timings) // 2] * 1000
+
+    def handle(self, *args, **options):
+        if options['cards'] < 1 or options['repeat'] < 1:
+            raise CommandError("--cards and --repeat must be at least 1")
+
+        for grid in options['grid'] or list(GRIDS):
+            template, name, queryset, shared_keys = GRIDS[grid]
+            objects = list(queryset()[:options['cards']])
+            if not objects:
+                self.stdout.write(self.style.WARNING(f"{grid}: nothing to render"))
+                continue
+
+            repeat = range(options['repeat'])
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+                before = [self._render(template, name, objects, shared_keys) for _ in repeat]
+            cold = []
+            for _ in repeat:
+                cache.clear()
+                cold.append(self._render(template, name, objects, shared_keys))
+            warm = [self._render(template, name, objects, shared_keys) for _ in repeat]
+
+            before_ms, cold_ms, warm_ms = self._median_ms(before), self._median_ms(cold), self._median_ms(warm)
+            self.stdout.write(
+                f"{grid}: {len(objects)} cards, median {before_ms:.2f} ms without the cache, "
+                f"{cold_ms:.2f} ms on a miss, {warm_ms:.2f} ms on a hit ({before_ms / warm_ms:.1f}x)"
+            )
@@ -0,0 +1,129 @@
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction, OperationalError
+from django.db.models import F, Sum
+from products.models import Product
+
+
+PROFILES = {
+    # the stock configuration: rollback journal, deferred transactions, a connection per request
+    "plain": {"options": {}, "persistent": False, "replica": False},
+    "tuned": {"options": {"transaction_mode": "IMMEDIATE", "init_command": settings.SQLITE_INIT_COMMAND}, "persistent": True, "replica": False},
+    "replica": {"options": {"transaction_mode": "IMMEDIATE", "init_command": settings.SQLITE_INIT_COMMAND}, "persistent": True, "replica": True},
+}
+
+
+def percentile(values:list, fraction:float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+class Command(BaseCommand):
+    help = 'Mixed read/write load from concurrent threads against a scratch database, per connection profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--seconds', type=float, default=5, help='Run time per profile')
+        parser.add_argument('--write-ratio', type=float, default=0.2, help='Share of operations that write')
+        parser.add_argument('--products', type=int, default=5000, help='Products in the scratch database')
+        parser.add_argument('--profile', choices=list(PROFILES), action='append', help='Profiles to run (default: all)')
+
+    def _alias(self, name:str, path:str, profile:dict, read_only:bool=False) -> str:
+        options = dict(profile["options"])
+        if read_only:
+            options["init_command"] = options.get("init_command", "") + "PRAGMA query_only=ON;"
+        connections.settings[name] = {
+            **connections.settings['default'],
+            'NAME': path,
+            'OPTIONS': options,
+            'CONN_MAX_AGE': None if profile["persistent"] else 0,
+        }
+        return name
+
+    def _prepare(self, directory:str, profile_name:str, profile:dict, products:int) -> tuple:
+        path = os.path.join(directory, f"{profile_name}.sqlite3")
+        primary = self._alias(f"bench_{profile_name}", path, profile)
+        call_command("migrate", database=primary, verbosity=0)
+        Product.objects.using(primary).bulk_create([
+            Product(name=f"Bench {i}", description="", sku=f"BENCH-{i}", cost_price=1, selling_price=2, current_stock=1000)
+            for i in range(products)
+        ], batch_size=500)
+        ids = list(Product.objects.using(primary).filter(sku__startswith="BENCH-").values_list("id", flat=True))
+        connections[primary].close()
+
+        reader = primary
+        if profile["replica"]:
+            replica_path = os.path.join(directory, f"{profile_name}-replica.sqlite3")
+            shutil.copyfile(path, replica_path)
+            reader = self._alias(f"bench_{profile_name}_replica", replica_path, profile, read_only=True)
+        return primary, reader, ids
+
+    def _client(self, primary:str, reader:str, ids:list, write_ratio:float, deadline:float, persistent:bool, results:dict, lock):
+        reads, writes, errors = [], [], 0
+        rng = random.Random()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                if rng.random() < write_ratio:
+                    # read-modify-write, the shape of a form save
+                    with transaction.atomic(using=primary):
+                        rows = Product.objects.using(primary).filter(pk=rng.choice(ids))
+                        rows.values_list("current_stock", flat=True).get()
+                        rows.update(current_stock=F("current_stock") + rng.choice((-1, 1)))
+                    writes.append(time.perf_counter() - start)
+                else:
+                    # a list page and a report-style aggregate
+                    list(Product.objects.using(reader).order_by("-created_at", "-id").values("id", "name", "current_stock")[:24])
+                    Product.objects.using(reader).filter(low_stock=True).aggregate(units=Sum("current_stock"))
+                    reads.append(time.perf_counter() - start)
+            except OperationalError:
+                errors += 1
+            if not persistent:
+                # a connection per request, as CONN_MAX_AGE = 0 does
+                connections[primary].close()
+                connections[reader].close()
+        connections.close_all()
+        with lock:
+            results["reads"].extend(reads)
+            results["writes"].extend(writes)
+            results["errors"] += errors
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['products'] < 1 or not 0 <= options['write_ratio'] <= 1:
+            raise CommandError("--threads and --products must be at least 1, --write-ratio between 0 and 1")
+
+        directory = tempfile.mkdtemp(prefix="stocker-bench-")
+        try:
+            for name in options['profile'] or list(PROFILES):
+                profile = PROFILES[name]
+                primary, reader, ids = self._prepare(directory, name, profile, options['products'])
+
+                results, lock = {"reads": [], "writes": [], "errors": 0}, threading.Lock()
+                deadline = time.perf_counter() + options['seconds']
+                threads = [
+                    threading.Thread(target=self._client, args=(primary, reader, ids, options['write_ratio'], deadline, profile["persistent"], results, lock))
+                    for _ in range(options['threads'])
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+                operations = len(results["reads"]) + len(results["writes"])
+                self.stdout.write(
+                    f"{name}: {operations / options['seconds']:.0f} ops/s, "
+                    f"reads p50 {percentile(results['reads'], 0.5):.1f} ms p95 {percentile(results['reads'], 0.95):.1f} ms, "
+                    f"writes p50 {percentile(results['writes'], 0.5):.1f} ms p95 {percentile(results['writes'], 0.95):.1f} ms, "
+                    f"{results['errors']} 'database is locked' errors"
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from main import benchmarks
+from .seed_inventory import ADMIN_USERNAME
+
+
+class Command(BaseCommand):
+    help = 'Time every read-only page against the current database and check its query and p95 budgets (run seed_inventory first)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per URL')
+        parser.add_argument('--user', default=ADMIN_USERNAME, help='Staff user to browse as')
+        parser.add_argument('--case', action='append', help='Only URLs whose name contains this (repeatable)')
+        parser.add_argument('--check', action='store_true', help='Exit with an error when a budget is exceeded')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1")
+        user = User.objects.filter(username=options['user'], is_staff=True).first()
+        if user is None:
+            raise CommandError(f"No staff user '{options['user']}'; run seed_inventory or pass --user")
+
+        cases = [
+            case for case in benchmarks.CASES
+            if not options['case'] or any(part in case.name for part in options['case'])
+        ]
+        targets = benchmarks.targets()
+        # a page that raises is reported as a 500 rather than ending the run
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+
+        over = 0
+        self.stdout.write(f"{'url':<48} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8} {'peak KB':>8}")
+        # the test client's host name, without touching the real setting otherwise
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            for case in cases:
+                result = benchmarks.run_case(client, case, targets, options['repeat'])
+                failures = result.failures()
+                over += bool(failures)
+                line = f"{case.name:<48} {result.p50:>8.1f} {result.p95:>8.1f} {result.queries:>8} {result.peak_kb:>8.0f}"
+                if failures:
+                    self.stdout.write(self.style.ERROR(f"{line}  over budget: {', '.join(failures)}"))
+                else:
+                    self.stdout.write(line)
+                for suspect in result.suspects:
+                    self.stdout.write(self.style.WARNING(f"    N+1 suspect: {suspect['count']}x at {suspect['call_site']}"))
+
+        summary = f"{len(cases) - over}/{len(cases)} URLs within budget"
+        if over and options['check']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary) if not over else self.style.WARNING(summary))
@@ -0,0 +1,44 @@
+import time
+from django.core.management.base import BaseCommand
+from main.outbox import claim_batch, dispatch_batch, MAX_ATTEMPTS
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbox emails in batches, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Messages claimed per batch')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent mail connections')
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS, help='Attempts before a message is dead-lettered')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain what is due and exit instead of running forever')
+
+    def handle(self, *args, **options):
+        self.stdout.write("Dispatching outbox...")
+        totals = {"sent": 0, "retried": 0, "dead": 0}
+
+        try:
+            while True:
+                batch = claim_batch(options['batch_size'], options['max_attempts'])
+
+                if not batch:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                stats = dispatch_batch(batch, options['workers'], options['max_attempts'])
+                for key, value in stats.items():
+                    totals[key] += value
+
+                self.stdout.write(
+                    f"Batch of {len(batch)}: {stats['sent']} sent, {stats['retried']} retrying, {stats['dead']} dead"
+                )
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping dispatcher...")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Outbox dispatched: {totals['sent']} sent, {totals['retried']} retrying, {totals['dead']} dead"
+            )
+        )
@@ -0,0 +1,55 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from main import images
+
+
+def _generate(name:str, preset:str):
+    # runs in a worker process: files only, no database
+    try:
+        return name, preset, images.generate(name, preset), None
+    except Exception as e:
+        return name, preset, None, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Make the thumbnail derivatives of every product image, supplier logo and avatar already uploaded'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+        parser.add_argument('--model', choices=list(images.IMAGE_FIELDS), action='append', help='Only these models (default: all)')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1")
+
+        jobs = set()
+        for label in options['model'] or list(images.IMAGE_FIELDS):
+            field, preset = images.IMAGE_FIELDS[label]
+            model = apps.get_model(label)
+            names = model.objects.exclude(**{field: ""}).values_list(field, flat=True).distinct()
+            jobs.update((name, preset) for name in names)
+
+        if not jobs:
+            self.stdout.write("No images to process.")
+            return
+
+        start = time.perf_counter()
+        made, failed = 0, 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [pool.submit(_generate, name, preset) for name, preset in sorted(jobs)]
+            for future in as_completed(futures):
+                name, preset, manifest, error = future.result()
+                if error:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f"  {name} ({preset}): {error}"))
+                    continue
+                # the workers' caches die with them; keep the manifest in this one
+                images.remember(name, preset, manifest)
+                made += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Thumbnails ready for {made} images, {failed} failed ({time.perf_counter() - start:.1f}s, {options['workers']} workers)"
+        ))
@@ -0,0 +1,155 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from accounts.models import Profile
+from main import versions
+from products import search, autocomplete
+from products.models import Product, Category
+from reports import stats
+from suppliers.models import Supplier
+
+
+# every seeded row is recognisable by these, so --clear only removes seed data
+SKU_PREFIX = "SEED-"
+CATEGORY_PREFIX = "Seed "
+SUPPLIER_DOMAIN = "seed.example.com"
+USERNAME_PREFIX = "seed_"
+ADMIN_USERNAME = "seed_admin"
+
+BATCH_SIZE = 1000
+
+COUNTRIES = ["Saudi Arabia", "UAE", "Egypt", "Germany", "China", "USA", "India", "Turkey"]
+WORDS = [
+    "Fresh", "Organic", "Premium", "Classic", "Daily", "Golden", "Natural", "Royal",
+    "Milk", "Rice", "Coffee", "Dates", "Olive Oil", "Honey", "Tea", "Flour",
+    "Cheese", "Yogurt", "Juice", "Water", "Soap", "Tissue", "Detergent", "Cable",
+]
+
+# share of products that are perishable, and that start at or below their minimum
+PERISHABLE_SHARE = 0.3
+LOW_STOCK_SHARE = 0.15
+
+
+def clear_seed_data() -> int:
+    products = Product.objects.filter(sku__startswith=SKU_PREFIX)
+    removed = products.count()
+    products.delete()
+    Supplier.objects.filter(email__endswith="@" + SUPPLIER_DOMAIN).delete()
+    Category.objects.filter(name__startswith=CATEGORY_PREFIX, product__isnull=True).delete()
+    User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+    return removed
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate a deterministic catalog (categories, suppliers, products, manager users) for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000, help='Products to create')
+        parser.add_argument('--suppliers', type=int, default=200, help='Suppliers to create')
+        parser.add_argument('--categories', type=int, help='Categories to create (default: one per 200 products, at least 5)')
+        parser.add_argument('--users', type=int, default=10, help='Manager users to create, besides seed_admin')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same catalog')
+        parser.add_argument('--clear', action='store_true', help='Remove earlier seed data first')
+
+    def handle(self, *args, **options):
+        products, suppliers = options['products'], options['suppliers']
+        categories = options['categories'] or max(5, products // 200)
+        if products < 0 or suppliers < 1 or categories < 1 or options['users'] < 0:
+            raise CommandError("--suppliers and --categories must be at least 1, --products and --users not negative")
+
+        if options['clear']:
+            self.stdout.write(f"Removed {clear_seed_data()} seeded products")
+        elif User.objects.filter(username=ADMIN_USERNAME).exists():
+            raise CommandError("Seed data already exists; run with --clear to replace it")
+
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        with transaction.atomic():
+            category_ids = self._categories(categories)
+            supplier_ids = self._suppliers(rng, suppliers)
+            admin_id = self._users(options['users'])
+            self._products(rng, products, category_ids, supplier_ids, admin_id)
+
+        # bulk_create skips the signals that keep these in step
+        search.rebuild_index()
+        stats.reconcile()
+        autocomplete.invalidate()
+        versions.bump("products.product", "products.category", "suppliers.supplier", "auth.user")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {products} products, {suppliers} suppliers, {categories} categories and "
+            f"{options['users'] + 1} users in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def _categories(self, count:int) -> list:
+        created = Category.objects.bulk_create([Category(name=f"{CATEGORY_PREFIX}{i:04d}") for i in range(count)])
+        return [category.id for category in created]
+
+    def _suppliers(self, rng:random.Random, count:int) -> list:
+        created = Supplier.objects.bulk_create([
+            Supplier(
+                name=f"{rng.choice(WORDS)} Trading {i:05d}",
+                email=f"supplier{i}@{SUPPLIER_DOMAIN}",
+                phone=f"+9665{rng.randrange(10**7, 10**8)}",
+                country=rng.choice(COUNTRIES),
+                is_active=rng.random() < 0.9,
+                rating=rng.randint(1, 5),
+            )
+            for i in range(count)
+        ], batch_size=BATCH_SIZE)
+        return [supplier.id for supplier in created]
+
+    def _users(self, managers:int) -> int:
+        # no usable password: benchmarks log in with force_login
+        password = make_password(None)
+        admin = User.objects.create(
+            username=ADMIN_USERNAME, email=f"admin@{SUPPLIER_DOMAIN}", password=password,
+            is_staff=True, is_superuser=True,
+        )
+        users = User.objects.bulk_create([
+            User(username=f"{USERNAME_PREFIX}manager{i}", email=f"manager{i}@{SUPPLIER_DOMAIN}", password=password, is_staff=True)
+            for i in range(managers)
+        ])
+        Profile.objects.bulk_create(
+            [Profile(user=admin, position="Administrator")] + [
+                Profile(user=user, position="Inventory Manager", is_manager=True, notification_email=user.email)
+                for user in users
+            ]
+        )
+        return admin.id
+
+    def _products(self, rng:random.Random, count:int, category_ids:list, supplier_ids:list, admin_id:int):
+        today = timezone.localdate()
+        Link = Product.suppliers.through
+        for start in range(0, count, BATCH_SIZE):
+            batch = []
+            for i in range(start, min(start + BATCH_SIZE, count)):
+                cost = Decimal(rng.randrange(100, 50000)) / 100
+                min_level = rng.randrange(5, 50)
+                perishable = rng.random() < PERISHABLE_SHARE
+                batch.append(Product(
+                    name=f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}",
+                    description=f"Seeded product {i}",
+                    sku=f"{SKU_PREFIX}{i:07d}",
+                    category_id=rng.choice(category_ids),
+                    cost_price=cost,
+                    selling_price=(cost * Decimal(rng.uniform(1.1, 1.8))).quantize(Decimal("0.01")),
+                    min_stock_level=min_level,
+                    current_stock=rng.randrange(0, min_level + 1) if rng.random() < LOW_STOCK_SHARE else rng.randrange(min_level + 1, min_level * 10),
+                    is_perishable=perishable,
+                    # a fixed spread around today: some expired, some expiring soon, most later
+                    expiry_date=today + timedelta(days=rng.randrange(-10, 180)) if perishable else None,
+                    created_by_id=admin_id,
+                ))
+            created = Product.objects.bulk_create(batch)
+            Link.objects.bulk_create([
+                Link(product_id=product.id, supplier_id=supplier_id)
+                for product in created
+                for supplier_id in rng.sample(supplier_ids, min(len(supplier_ids), rng.randint(1, 3)))
+            ])
@@ -0,0 +1,41 @@
+import sqlite3
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from main.db_router import REPLICA_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database onto the read replica (STOCKER_REPLICA_DB)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Keep syncing every this many seconds')
+
+    def sync(self, primary:str, replica:str) -> float:
+        start = time.perf_counter()
+        source = sqlite3.connect(primary)
+        target = sqlite3.connect(replica)
+        try:
+            # one step reads a single consistent snapshot; under WAL that doesn't block writers
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        return time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        if REPLICA_DB_ALIAS not in settings.DATABASES:
+            raise CommandError("no replica configured, set STOCKER_REPLICA_DB")
+
+        primary = str(settings.DATABASES['default']['NAME'])
+        replica = str(settings.DATABASES[REPLICA_DB_ALIAS]['NAME'])
+
+        try:
+            while True:
+                elapsed = self.sync(primary, replica)
+                self.stdout.write(self.style.SUCCESS(f"Replica synced in {elapsed:.2f}s"))
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping replica sync...")
@@ -0,0 +1,217 @@
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+# query parameter carrying the content fingerprint in media URLs
+VERSION_PARAM = "v"
+
+# a year: versioned URLs change whenever the file does
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def fingerprint(name:str):
+    '''
+    Short content hash of a stored file, or None when it doesn't exist.
+
+    Cached per (name, mtime, size), so a file is read once per change and
+    every later lookup costs a stat().
+    '''
+    try:
+        path = default_storage.path(name)
+        stat = os.stat(path)
+    except (OSError, SuspiciousFileOperation, NotImplementedError):
+        return None
+    key = f"media:fp:{hashlib.sha1(name.encode()).hexdigest()}:{stat.st_mtime_ns}:{stat.st_size}"
+    digest = cache.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()[:20]
+        cache.set(key, digest, None)
+    return digest
+
+
+class HashedMediaStorage(FileSystemStorage):
+    '''
+    MEDIA storage whose URLs carry the file's content hash (?v=...), so
+    they can be cached for a year and still change the moment the file does.
+    '''
+
+    def url(self, name):
+        url = super().url(name)
+        digest = fingerprint(name) if name else None
+        return f"{url}?{VERSION_PARAM}={digest}" if digest else url
+
+
+def canonical_name(name:str):
+    '''
+    The name with "." and empty segments collapsed, or None for an absolute
+    path or one with a ".." segment: access is decided on the prefix, so
+    products/../avatars/x.jpg must never reach it.
+    '''
+    if not name or name.startswith("/") or "\\" in name or "\x00" in name:
+        return None
+    if ".." in name.split("/"):
+        return None
+    name = posixpath.normpath(name)
+    return None if name in (".", "") else name
+
+
+def access_level(name:str) -> str:
+    '''The first MEDIA_ACCESS prefix that matches; anything unlisted is staff-only.'''
+    for prefix, level in settings.MEDIA_ACCESS:
+        if name.startswith(prefix):
+            return level
+    return "staff"
+
+
+def can_access(user, level:str) -> bool:
+    if level == "public":
+        return True
+    if level == "authenticated":
+        return user.is_authenticated
+    return user.is_authenticated and user.is_staff
+
+
+def parse_range(header:str, size:int):
+    '''
+    (start, end) inclusive for a single "bytes=" range, None to send the
+    whole file (no header, a malformed one or several ranges).
+    '''
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+    start = int(first)
+    if start >= size:
+        raise RangeNotSatisfiable()
+    end = int(last) if last else size - 1
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _read_range(path:str, start:int, end:int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _offload(name:str, path:str):
+    '''An empty response telling the front-end server to send the file, or None.'''
+    mode = settings.MEDIA_OFFLOAD
+    if mode == "x-accel-redirect":
+        response = HttpResponse()
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + quote(name)
+    elif mode == "x-sendfile":
+        response = HttpResponse()
+        response["X-Sendfile"] = path
+    else:
+        return None
+    # let nginx/Apache fill in the real type and length
+    del response["Content-Type"]
+    return response
+
+
+def serve(request, name:str):
+    '''
+    Sends a MEDIA file after checking MEDIA_ACCESS.
+
+    Answers If-None-Match/If-Modified-Since with 304 and a single byte
+    range with 206. A request for the current ?v= fingerprint is cacheable
+    for a year; any other URL must revalidate. With MEDIA_OFFLOAD set, only
+    headers are produced here and the web server streams the bytes.
+    '''
+    name = canonical_name(name)
+    if name is None:
+        raise Http404("Media file not found")
+    level = access_level(name)
+    if not can_access(request.user, level):
+        return HttpResponseForbidden()
+
+    try:
+        path = default_storage.path(name)
+        stat = os.stat(path)
+    except (OSError, SuspiciousFileOperation):
+        raise Http404("Media file not found")
+    if not os.path.isfile(path):
+        raise Http404("Media file not found")
+
+    digest = fingerprint(name)
+    etag = f'"{digest}"'
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _offload(name, path)
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(path)
+        content_type = content_type or "application/octet-stream"
+        # If-Range: only honour the range while the client's copy is current
+        if_range = request.headers.get("If-Range")
+        range_header = request.headers.get("Range") if not if_range or if_range == etag else None
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{stat.st_size}"
+            return response
+
+        if byte_range is None:
+            response = FileResponse(open(path, "rb"), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(_read_range(path, start, end), status=206, content_type=content_type)
+            response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            response["Content-Length"] = str(end - start + 1)
+        if encoding:
+            response["Content-Encoding"] = encoding
+        response["Accept-Ranges"] = "bytes"
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    if request.GET.get(VERSION_PARAM) == digest:
+        patch_cache_control(response, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    if level == "public":
+        patch_cache_control(response, public=True)
+    else:
+        patch_cache_control(response, private=True)
+        patch_vary_headers(response, ("Cookie",))
+    return response
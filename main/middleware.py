@@ -0,0 +1,79 @@
+import random
+import time
+from django.conf import settings
+from . import db_router, sqlstats
+
+
+PRIMARY_COOKIE = "db_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class PrimaryPinMiddleware:
+    '''
+    Keeps a client that just wrote reading from the primary.
+
+    Unsafe methods read from the primary for the whole request. A request
+    that wrote sets a short-lived cookie, so the redirect that usually
+    follows a POST, and anything else in the replica's lag window, still
+    sees the change.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not db_router.replica_enabled():
+            return self.get_response(request)
+
+        unsafe = request.method not in SAFE_METHODS
+        pinned = unsafe or PRIMARY_COOKIE in request.COOKIES
+        token = db_router.start_pinned(pinned)
+        try:
+            response = self.get_response(request)
+            # db_for_write pins the request, so a GET that wrote shows up here too
+            wrote = unsafe or (db_router.is_pinned() and not pinned)
+        finally:
+            db_router.finish(token)
+
+        if wrote:
+            response.set_cookie(
+                PRIMARY_COOKIE, "1",
+                max_age=settings.DATABASE_REPLICA_LAG_SECONDS, httponly=True, samesite="Lax",
+            )
+        return response
+
+
+class SQLStatsMiddleware:
+    '''
+    Records the SQL of a sample of requests (SQL_STATS_SAMPLE_RATE) and of
+    every staff request.
+
+    Recorded requests go to sqlstats' rolling log, with repeated query
+    shapes flagged as N+1 suspects. Staff also get a Server-Timing header
+    (db time and query count, and total time) for the browser's devtools.
+    Queries run while a streaming response is iterated are not counted.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        staff = request.user.is_authenticated and request.user.is_staff
+        if not (staff or random.random() < settings.SQL_STATS_SAMPLE_RATE):
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with sqlstats.record() as stats:
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+        sqlstats.log_request(view, request.path, stats, duration)
+
+        if staff:
+            response["Server-Timing"] = (
+                f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries, {stats.duplicates()} repeated", '
+                f"total;dur={duration * 1000:.1f}"
+            )
+        return response
@@ -0,0 +1,169 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import OutboxMessage
+
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 60 * 60
+# a message claimed longer than this is assumed lost by a crashed worker
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def enqueue(subject:str, body:str, to:list, from_email:str=None, content_subtype:str="plain") -> OutboxMessage:
+    '''
+    Stores an email for the dispatcher instead of sending it.
+
+    Call it inside the same transaction as the write that triggers the email,
+    so the message exists if and only if that write commits.
+    '''
+    return OutboxMessage.objects.create(
+        subject=subject[:255],
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+        content_subtype=content_subtype,
+    )
+
+
+def enqueue_many(messages:list) -> list:
+    '''Bulk version of enqueue() for (subject, body, to) tuples.'''
+    return OutboxMessage.objects.bulk_create([
+        OutboxMessage(subject=subject[:255], body=body, from_email=settings.DEFAULT_FROM_EMAIL, to=list(to))
+        for subject, body, to in messages
+    ])
+
+
+def backoff_delay(attempts:int) -> timedelta:
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def release_stale(now, max_attempts:int=MAX_ATTEMPTS) -> int:
+    '''
+    Returns messages claimed longer than CLAIM_TIMEOUT ago to the queue.
+
+    A lost claim counts as a failed attempt, so a message that takes its
+    worker down every time is still dead-lettered after max_attempts.
+    '''
+    stale = OutboxMessage.objects.filter(status=OutboxMessage.STATUS_SENDING, claimed_at__lt=now - CLAIM_TIMEOUT)
+    lost = {"attempts": F("attempts") + 1, "claimed_at": None, "last_error": "claim timed out"}
+    released = stale.filter(attempts__gte=max_attempts - 1).update(status=OutboxMessage.STATUS_DEAD, **lost)
+    return released + stale.update(status=OutboxMessage.STATUS_PENDING, **lost)
+
+
+def claim_batch(batch_size:int, max_attempts:int=MAX_ATTEMPTS) -> list:
+    '''
+    Marks up to batch_size due messages as sending and returns them.
+
+    The claim is a conditional UPDATE on the status, so two dispatchers never
+    pick up the same message.
+    '''
+    now = timezone.now()
+    release_stale(now, max_attempts)
+
+    with transaction.atomic():
+        ids = list(
+            OutboxMessage.objects
+            .filter(status=OutboxMessage.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        OutboxMessage.objects.filter(id__in=ids, status=OutboxMessage.STATUS_PENDING).update(
+            status=OutboxMessage.STATUS_SENDING, claimed_at=now
+        )
+
+    return list(OutboxMessage.objects.filter(id__in=ids, status=OutboxMessage.STATUS_SENDING, claimed_at=now))
+
+
+def _send_chunk(chunk:list) -> list:
+    '''Sends a chunk over one connection; returns (message id, error or None) pairs.'''
+    results = []
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        for outbox_message in chunk:
+            email = EmailMessage(outbox_message.subject, outbox_message.body, outbox_message.from_email, outbox_message.to, connection=connection)
+            email.content_subtype = outbox_message.content_subtype
+            try:
+                email.send()
+                results.append((outbox_message.id, None))
+            except Exception as e:
+                results.append((outbox_message.id, str(e) or e.__class__.__name__))
+    except Exception as e:
+        # could not even connect: fail the rest of the chunk
+        done = {message_id for message_id, _ in results}
+        results.extend((m.id, str(e) or e.__class__.__name__) for m in chunk if m.id not in done)
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+    return results
+
+
+def dispatch_batch(batch:list, workers:int=4, max_attempts:int=MAX_ATTEMPTS) -> dict:
+    '''
+    Sends a claimed batch with a pool of worker threads and records the outcome.
+
+    Each worker owns one mail connection. Only the calling thread touches the
+    database, failed messages are rescheduled with exponential backoff and
+    moved to the dead letter status after max_attempts.
+    '''
+    stats = {"sent": 0, "retried": 0, "dead": 0}
+    if not batch:
+        return stats
+
+    workers = max(1, min(workers, len(batch)))
+    chunks = [batch[i::workers] for i in range(workers)]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = [result for chunk_results in pool.map(_send_chunk, chunks) for result in chunk_results]
+
+    messages_by_id = {m.id: m for m in batch}
+    now = timezone.now()
+    sent_ids = [message_id for message_id, error in results if error is None]
+
+    with transaction.atomic():
+        if sent_ids:
+            OutboxMessage.objects.filter(id__in=sent_ids).update(
+                status=OutboxMessage.STATUS_SENT, sent_at=now, claimed_at=None, last_error=""
+            )
+            stats["sent"] = len(sent_ids)
+
+        failed = []
+        for message_id, error in results:
+            if error is None:
+                continue
+            outbox_message = messages_by_id[message_id]
+            outbox_message.attempts += 1
+            outbox_message.last_error = error
+            outbox_message.claimed_at = None
+            if outbox_message.attempts >= max_attempts:
+                outbox_message.status = OutboxMessage.STATUS_DEAD
+                stats["dead"] += 1
+            else:
+                outbox_message.status = OutboxMessage.STATUS_PENDING
+                outbox_message.next_attempt_at = now + backoff_delay(outbox_message.attempts)
+                stats["retried"] += 1
+            failed.append(outbox_message)
+
+        if failed:
+            OutboxMessage.objects.bulk_update(failed, ["attempts", "last_error", "claimed_at", "status", "next_attempt_at"])
+
+    return stats
+
+
+def drain(batch_size:int=100, workers:int=4, max_attempts:int=MAX_ATTEMPTS) -> dict:
+    '''Dispatches batches until nothing is due. Handy for tests and cron.'''
+    totals = {"sent": 0, "retried": 0, "dead": 0}
+    while True:
+        batch = claim_batch(batch_size, max_attempts)
+        if not batch:
+            return totals
+        for key, value in dispatch_batch(batch, workers, max_attempts).items():
+            totals[key] += value
@@ -0,0 +1,172 @@
+import base64
+import json
+from datetime import datetime, date
+from decimal import Decimal
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime, parse_date
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return parse_datetime(value["dt"])
+        if "d" in value:
+            return parse_date(value["d"])
+        if "dec" in value:
+            return Decimal(value["dec"])
+    return value
+
+
+def encode_cursor(values:list, direction:str) -> str:
+    payload = json.dumps({"v": [_encode_value(v) for v in values], "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token:str) -> tuple:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload["d"]
+        if direction not in ("next", "prev"):
+            raise ValueError(direction)
+        return [_decode_value(v) for v in payload["v"]], direction
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(str(e))
+
+
+class CursorPage:
+
+    def __init__(self, object_list:list, next_token:str, previous_token:str, estimated_total=None):
+        self.object_list = object_list
+        self.next_token = next_token
+        self.previous_token = previous_token
+        self.estimated_total = estimated_total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_token is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_token is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next or self.has_previous
+
+
+class CursorPaginator:
+    '''
+    Keyset pagination over a fixed ordering such as ("-created_at", "-id").
+
+    A page is fetched with WHERE (ordering columns) beyond the cursor and
+    LIMIT per_page + 1, so page 1000 costs the same as page 1 and no COUNT(*)
+    is run. The last ordering field must be unique (usually the id).
+    Tokens are opaque base64 strings holding the boundary row's values.
+    '''
+
+    def __init__(self, queryset, per_page:int, ordering:tuple, estimate=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering
+        self.fields = [field.lstrip("-") for field in ordering]
+        self.estimate = estimate
+
+    def _reversed(self, ordering:tuple) -> list:
+        return [field[1:] if field.startswith("-") else "-" + field for field in ordering]
+
+    def _after(self, values:list, ordering:tuple) -> Q:
+        '''Rows strictly after the given values in the given ordering.'''
+        condition = Q()
+        for position, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            term = Q(**{f"{name}__{lookup}": values[position]})
+            for previous_name, previous_value in zip(self.fields[:position], values[:position]):
+                term &= Q(**{previous_name: previous_value})
+            condition |= term
+        return condition
+
+    def _values(self, obj) -> list:
+        return [getattr(obj, field) for field in self.fields]
+
+    def _to_python(self, values:list) -> list:
+        '''
+        A decoded value as its ordering field's type, so a forged cursor
+        fails here rather than in the query. None never comes from a real
+        row: the ordering fields are not nullable.
+        '''
+        converted = []
+        for name, value in zip(self.fields, values):
+            try:
+                value = self.queryset.model._meta.get_field(name).to_python(value)
+            except FieldDoesNotExist:
+                pass
+            if value is None:
+                raise ValidationError(f"{name} is missing")
+            converted.append(value)
+        return converted
+
+    def get_page(self, token:str=None, strict:bool=False) -> CursorPage:
+        '''
+        The page the token points at, or the first page. A token that does
+        not decode or does not fit this listing falls back to the first
+        page, unless strict, when InvalidCursor is raised instead.
+        '''
+        values, direction = (None, "next")
+        if token:
+            try:
+                values, direction = decode_cursor(token)
+                if len(values) != len(self.fields):
+                    raise InvalidCursor("cursor does not match this listing")
+                values = self._to_python(values)
+            except (InvalidCursor, ValidationError, ValueError, TypeError) as e:
+                if strict:
+                    raise InvalidCursor(str(e))
+                values, direction = None, "next"
+
+        ordering = self.ordering if direction == "next" else self._reversed(self.ordering)
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(values, ordering))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == "prev":
+            rows.reverse()
+            has_next = values is not None
+            has_previous = has_more
+        else:
+            has_next = has_more
+            has_previous = values is not None
+
+        next_token = encode_cursor(self._values(rows[-1]), "next") if rows and has_next else None
+        previous_token = encode_cursor(self._values(rows[0]), "prev") if rows and has_previous else None
+
+        estimated_total = self.estimate() if self.estimate else None
+        return CursorPage(rows, next_token, previous_token, estimated_total)
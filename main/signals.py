@@ -0,0 +1,73 @@
+from django.contrib.auth.models import User, Group
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from . import images, versions
+
+
+# models whose changes invalidate cached reports and pages
+VERSIONED_MODELS = {"products.product", "products.category", "suppliers.supplier"}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_model_version(sender, instance, raw=False, **kwargs):
+    key = versions.key_for(sender)
+    if key in VERSIONED_MODELS and not raw:
+        versions.bump(key, versions.object_key(sender, instance.pk))
+
+
+@receiver(m2m_changed)
+def bump_relation_version(sender, instance, action, model, pk_set=None, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    keys = {versions.key_for(type(instance)), versions.key_for(model)} & VERSIONED_MODELS
+    if not keys:
+        return
+    # both ends of the relation show it, so each touched row moves too
+    objects = []
+    if versions.key_for(type(instance)) in VERSIONED_MODELS:
+        objects.append(versions.object_key(type(instance), instance.pk))
+    if versions.key_for(model) in VERSIONED_MODELS:
+        objects.extend(versions.object_key(model, pk) for pk in pk_set or ())
+    versions.bump(*sorted(keys), *objects)
+
+
+# what a page shows about the visitor: their name and avatar, and the
+# links their permissions allow
+@receiver(post_save, sender=User)
+@receiver(post_save, sender="accounts.Profile")
+def bump_user_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        versions.bump(versions.object_key(User, instance.pk if sender is User else instance.user_id))
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def bump_user_permissions_version(sender, instance, action, model, pk_set=None, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if isinstance(instance, User):
+        versions.bump(versions.object_key(User, instance.pk))
+    elif pk_set is None:
+        # a group or permission cleared of its users doesn't say which they were
+        versions.bump("auth.group")
+    else:
+        versions.bump(*(versions.object_key(User, pk) for pk in pk_set))
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(post_delete, sender=Group)
+def bump_group_version(sender, action="post_delete", **kwargs):
+    if action in ("post_add", "post_remove", "post_clear", "post_delete"):
+        versions.bump("auth.group")
+
+
+@receiver(post_save)
+def make_image_derivatives(sender, instance, raw=False, **kwargs):
+    field = images.IMAGE_FIELDS.get(versions.key_for(sender))
+    if field is None or raw:
+        return
+    name, preset = getattr(instance, field[0]).name, field[1]
+    # a no-op from the cache unless the image is new
+    transaction.on_commit(lambda: images.make_derivatives(name, preset))
@@ -0,0 +1,176 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from django.conf import settings
+from django.db import connections
+
+
+# IN (%s, %s, ...) and multi-row VALUES differ only in length: same shape
+_IN_LIST_RE = re.compile(r"IN \((?:%s, )*%s\)")
+_VALUES_RE = re.compile(r"VALUES (?:\((?:%s, )*%s\), )*\((?:%s, )*%s\)")
+
+logger = logging.getLogger(__name__)
+
+_DJANGO_DIR = os.path.dirname(sys.modules["django"].__file__)
+_TEMPLATE_BASE = os.path.join(_DJANGO_DIR, "template", "base.py")
+# the recording machinery wraps every request, so it is never the culprit
+_SKIPPED_FILES = {__file__, os.path.join(os.path.dirname(__file__), "middleware.py")}
+
+# recent request summaries of this process, newest last
+_recent = deque(maxlen=settings.SQL_STATS_LOG_SIZE)
+# view name -> running totals, for the summary endpoint
+_totals = {}
+_lock = threading.Lock()
+
+
+def shape(sql:str) -> str:
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    return _VALUES_RE.sub("VALUES (...)", sql)
+
+
+def _template_site(frame):
+    '''template:line of the node a Django template frame is rendering, if it is one.'''
+    node = frame.f_locals.get("self") if frame.f_code.co_name == "render_annotated" else None
+    token, origin = getattr(node, "token", None), getattr(node, "origin", None)
+    if token is None or origin is None:
+        return None
+    return f"{origin.template_name or origin.name}:{token.lineno}"
+
+
+def call_site() -> str:
+    '''
+    Where the query came from: the innermost template line being rendered,
+    or else the innermost frame of project code, skipping this module and
+    the middleware that records every request.
+    '''
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename == _TEMPLATE_BASE:
+            site = _template_site(frame)
+            if site:
+                return site
+        elif (
+            filename not in _SKIPPED_FILES
+            and filename.startswith(str(settings.BASE_DIR))
+            and not filename.startswith(_DJANGO_DIR)
+            and "site-packages" not in filename
+        ):
+            return f"{os.path.relpath(filename, settings.BASE_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+class QueryStats:
+    '''
+    Query count, SQL time and repeated query shapes for one unit of work.
+
+    Used as a connection execute_wrapper. A shape repeated
+    SQL_STATS_N_PLUS_ONE times is an N+1 suspect; its call site is
+    captured then, once, so the stack is only walked for suspects.
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # shape -> [count, seconds, call site]
+        self.shapes = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            entry = self.shapes.setdefault(shape(sql), [0, 0.0, None])
+            entry[0] += 1
+            entry[1] += elapsed
+            if entry[0] == settings.SQL_STATS_N_PLUS_ONE:
+                entry[2] = call_site()
+
+    def suspects(self) -> list:
+        '''N+1 suspects, most repeated first.'''
+        return sorted(
+            (
+                {"sql": sql, "count": count, "ms": round(seconds * 1000, 2), "call_site": site}
+                for sql, (count, seconds, site) in self.shapes.items()
+                if count >= settings.SQL_STATS_N_PLUS_ONE
+            ),
+            key=lambda suspect: -suspect["count"],
+        )
+
+    def duplicates(self) -> int:
+        '''Queries that repeated a shape already run.'''
+        return sum(count - 1 for count, _, _ in self.shapes.values())
+
+
+@contextmanager
+def record():
+    '''
+    Collects QueryStats for every query run inside the block, on every database alias.
+
+        with sqlstats.record() as stats:
+            build_report()
+        print(stats.count, stats.suspects())
+    '''
+    stats = QueryStats()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        yield stats
+
+
+def log_request(view:str, path:str, stats:QueryStats, duration:float):
+    '''Adds a sampled request to the rolling log and the per-view totals; logs N+1 suspects.'''
+    suspects = stats.suspects()
+    entry = {
+        "view": view,
+        "path": path,
+        "at": time.time(),
+        "ms": round(duration * 1000, 2),
+        "queries": stats.count,
+        "sql_ms": round(stats.duration * 1000, 2),
+        "duplicates": stats.duplicates(),
+        "suspects": suspects,
+    }
+    with _lock:
+        _recent.append(entry)
+        totals = _totals.setdefault(view, {"requests": 0, "queries": 0, "sql_ms": 0.0, "max_queries": 0, "n_plus_one": 0})
+        totals["requests"] += 1
+        totals["queries"] += stats.count
+        totals["sql_ms"] += stats.duration * 1000
+        totals["max_queries"] = max(totals["max_queries"], stats.count)
+        totals["n_plus_one"] += bool(suspects)
+
+    for suspect in suspects:
+        logger.warning("N+1 suspect in %s: %dx %s at %s", view, suspect["count"], suspect["sql"][:160], suspect["call_site"])
+
+
+def summary() -> dict:
+    '''This process's per-view totals (worst average query count first) and recent requests.'''
+    with _lock:
+        views = [
+            {
+                "view": view,
+                **totals,
+                "sql_ms": round(totals["sql_ms"], 2),
+                "avg_queries": round(totals["queries"] / totals["requests"], 1),
+            }
+            for view, totals in _totals.items()
+        ]
+        recent = list(_recent)
+    views.sort(key=lambda row: -row["avg_queries"])
+    return {"sample_rate": settings.SQL_STATS_SAMPLE_RATE, "views": views, "recent": recent[::-1]}
+
+
+def reset():
+    with _lock:
+        _recent.clear()
+        _totals.clear()
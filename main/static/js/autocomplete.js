@@ -0,0 +1,113 @@
+// Typeahead fields backed by /products/autocomplete/.
+//
+// <div class="autocomplete" data-kind="category" data-name="category" [data-multiple]>
+//     <input type="text" class="form-control autocomplete-input">
+//     <div class="autocomplete-selected">...hidden inputs / chips for the current value...</div>
+// </div>
+
+(function () {
+    const DEBOUNCE_MS = 150;
+
+    function makeChip(container, name, id, label) {
+        const chip = document.createElement("span");
+        chip.className = "badge bg-info me-1 autocomplete-chip";
+        chip.textContent = label + " ";
+
+        const hidden = document.createElement("input");
+        hidden.type = "hidden";
+        hidden.name = name;
+        hidden.value = id;
+
+        const remove = document.createElement("a");
+        remove.href = "#";
+        remove.className = "text-white text-decoration-none";
+        remove.textContent = "×";
+        remove.addEventListener("click", function (event) {
+            event.preventDefault();
+            chip.remove();
+        });
+
+        chip.appendChild(hidden);
+        chip.appendChild(remove);
+        container.appendChild(chip);
+    }
+
+    function setup(field) {
+        const input = field.querySelector(".autocomplete-input");
+        const selected = field.querySelector(".autocomplete-selected");
+        const multiple = field.hasAttribute("data-multiple");
+        const name = field.dataset.name;
+        const url = field.dataset.url;
+
+        const menu = document.createElement("ul");
+        menu.className = "dropdown-menu w-100";
+        field.appendChild(menu);
+
+        let timer = null;
+        let controller = null;
+
+        function close() {
+            menu.classList.remove("show");
+            menu.innerHTML = "";
+        }
+
+        function choose(item) {
+            if (multiple) {
+                if (!selected.querySelector('input[value="' + item.id + '"]')) {
+                    makeChip(selected, name, item.id, item.label);
+                }
+                input.value = "";
+            } else {
+                selected.querySelector("input[type=hidden]").value = item.id;
+                input.value = item.label;
+            }
+            close();
+        }
+
+        function render(results) {
+            menu.innerHTML = "";
+            results.forEach(function (item) {
+                const li = document.createElement("li");
+                const link = document.createElement("a");
+                link.href = "#";
+                link.className = "dropdown-item";
+                link.textContent = item.label;
+                link.addEventListener("mousedown", function (event) {
+                    event.preventDefault();
+                    choose(item);
+                });
+                li.appendChild(link);
+                menu.appendChild(li);
+            });
+            menu.classList.toggle("show", results.length > 0);
+        }
+
+        input.addEventListener("input", function () {
+            clearTimeout(timer);
+            if (!multiple && input.value === "") {
+                selected.querySelector("input[type=hidden]").value = "";
+            }
+            const query = input.value.trim();
+            if (!query) {
+                close();
+                return;
+            }
+            timer = setTimeout(function () {
+                if (controller) {
+                    controller.abort();
+                }
+                controller = new AbortController();
+                fetch(url + "?kind=" + encodeURIComponent(field.dataset.kind) + "&q=" + encodeURIComponent(query), {signal: controller.signal})
+                    .then(function (response) { return response.json(); })
+                    .then(function (data) { render(data.results || []); })
+                    .catch(function () {});
+            }, DEBOUNCE_MS);
+        });
+
+        input.addEventListener("blur", close);
+    }
+
+    document.addEventListener("DOMContentLoaded", function () {
+        document.querySelectorAll(".autocomplete").forEach(setup);
+    });
+})();
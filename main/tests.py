@@ -1,3 +1,371 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.template import engines
+from django.db.models.fields.files import FieldFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from PIL import Image
+from products import stock
+from products.models import Product, Category, StockMovement
+from suppliers.models import Supplier
+from . import benchmarks, db_router, images, outbox, sqlstats
+from .models import OutboxMessage
+from .pagination import CursorPaginator, InvalidCursor, encode_cursor
 
-# Create your tests here.
+
+class SeedInventoryTest(TestCase):
+
+    def seed(self, *args):
+        call_command("seed_inventory", "--products", "300", "--suppliers", "20", "--users", "3", *args, stdout=StringIO())
+
+    def catalog(self) -> list:
+        return list(
+            Product.objects.order_by("sku")
+            .values_list("sku", "name", "category__name", "cost_price", "current_stock", "is_perishable", "expiry_date")
+        )
+
+    def test_counts_and_mix(self):
+        self.seed()
+        self.assertEqual(Product.objects.count(), 300)
+        self.assertEqual(Supplier.objects.count(), 20)
+        self.assertEqual(Category.objects.count(), 5)
+        self.assertEqual(User.objects.filter(profile__is_manager=True).count(), 3)
+        self.assertTrue(User.objects.get(username="seed_admin").is_staff)
+        self.assertFalse(Product.objects.filter(suppliers=None).exists())
+        self.assertTrue(Product.objects.filter(low_stock=True).exists())
+        self.assertTrue(Product.objects.filter(is_perishable=True, expiry_date__isnull=False).exists())
+
+    def test_same_seed_same_catalog(self):
+        self.seed()
+        first = self.catalog()
+        self.seed("--clear")
+        self.assertEqual(self.catalog(), first)
+        self.seed("--clear", "--seed", "7")
+        self.assertNotEqual(self.catalog(), first)
+
+
+class ViewBudgetTest(TestCase):
+    '''
+    Every page in benchmarks.CASES, as staff, against a seeded catalog: a
+    query count over budget (a new N+1, a lost select_related) or a p95
+    over its time budget fails the build. STOCKER_BENCH_TIME_SCALE loosens
+    the time budgets on slow machines.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("seed_inventory", "--products", "500", "--suppliers", "40", "--users", "3", stdout=StringIO())
+        cls.admin = User.objects.get(username="seed_admin")
+
+    def test_budgets(self):
+        self.client.force_login(self.admin)
+        targets = benchmarks.targets()
+        for case in benchmarks.CASES:
+            with self.subTest(case.name):
+                result = benchmarks.run_case(self.client, case, targets, repeat=5)
+                self.assertEqual(result.failures(), [], f"{case.name}: {result.suspects}")
+
+
+class OutboxTest(TestCase):
+
+    def test_enqueue_commits_with_the_write(self):
+        with transaction.atomic():
+            outbox.enqueue("Kept", "body", ["a@example.com"])
+        try:
+            with transaction.atomic():
+                outbox.enqueue("Rolled back", "body", ["a@example.com"])
+                raise RuntimeError("the write failed")
+        except RuntimeError:
+            pass
+
+        self.assertEqual(list(OutboxMessage.objects.values_list("subject", flat=True)), ["Kept"])
+        self.assertEqual(mail.outbox, [])
+
+    def test_dispatch_sends_due_messages(self):
+        outbox.enqueue_many([("One", "body", ["a@example.com"]), ("Two", "body", ["b@example.com"])])
+
+        self.assertEqual(outbox.drain(workers=2), {"sent": 2, "retried": 0, "dead": 0})
+        self.assertEqual(sorted(email.subject for email in mail.outbox), ["One", "Two"])
+        self.assertEqual(OutboxMessage.objects.filter(status=OutboxMessage.STATUS_SENT).count(), 2)
+        self.assertEqual(outbox.drain(), {"sent": 0, "retried": 0, "dead": 0})
+
+    def test_failures_back_off_then_dead_letter(self):
+        message = outbox.enqueue("Flaky", "body", ["a@example.com"])
+
+        with mock.patch("main.outbox.EmailMessage.send", side_effect=ConnectionError("refused")):
+            self.assertEqual(outbox.drain(max_attempts=2), {"sent": 0, "retried": 1, "dead": 0})
+            message.refresh_from_db()
+            self.assertEqual((message.status, message.attempts, message.last_error), (OutboxMessage.STATUS_PENDING, 1, "refused"))
+            self.assertGreaterEqual(message.next_attempt_at, timezone.now() + outbox.backoff_delay(1) - timedelta(seconds=5))
+            # not due again until the backoff has passed
+            self.assertEqual(outbox.drain(max_attempts=2), {"sent": 0, "retried": 0, "dead": 0})
+
+            OutboxMessage.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(outbox.drain(max_attempts=2), {"sent": 0, "retried": 0, "dead": 1})
+        self.assertEqual(mail.outbox, [])
+
+    def test_stale_claim_counts_as_an_attempt(self):
+        message = outbox.enqueue("Lost", "body", ["a@example.com"])
+        long_ago = timezone.now() - outbox.CLAIM_TIMEOUT - timedelta(minutes=1)
+
+        OutboxMessage.objects.update(status=OutboxMessage.STATUS_SENDING, claimed_at=long_ago)
+        self.assertEqual(len(outbox.claim_batch(10, max_attempts=2)), 1)
+        message.refresh_from_db()
+        self.assertEqual(message.attempts, 1)
+
+        OutboxMessage.objects.update(claimed_at=long_ago)
+        self.assertEqual(outbox.claim_batch(10, max_attempts=2), [])
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OutboxMessage.STATUS_DEAD, 2))
+
+
+@override_settings(SQL_STATS_N_PLUS_ONE=3)
+class SqlStatsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ("Bakery", "Dairy", "Produce"):
+            Category.objects.create(name=name)
+
+    def test_call_site_in_code(self):
+        with sqlstats.record() as stats:
+            for category in Category.objects.all():
+                category.product_set.count()
+        suspect, = stats.suspects()
+        self.assertEqual(suspect["count"], 3)
+        self.assertTrue(suspect["call_site"].startswith("main/tests.py:"), suspect["call_site"])
+
+    def test_call_site_in_template(self):
+        template = engines["django"].from_string("{% for category in categories %}\n{{ category.product_set.count }}{% endfor %}")
+        with sqlstats.record() as stats:
+            template.render({"categories": Category.objects.all()})
+        suspect, = stats.suspects()
+        self.assertTrue(suspect["call_site"].endswith(":2"), suspect["call_site"])
+
+    def test_suspects_are_logged(self):
+        with sqlstats.record() as stats:
+            for category in Category.objects.all():
+                category.product_set.count()
+        with self.assertLogs("main.sqlstats", "WARNING") as logs:
+            sqlstats.log_request("test", "/test/", stats, 0.01)
+        self.assertIn("N+1 suspect in test: 3x", logs.output[0])
+        sqlstats.reset()
+
+
+class PrimaryPinTest(TestCase):
+
+    def test_writes_pin_only_inside_a_unit_of_work(self):
+        router = db_router.PrimaryReplicaRouter()
+        router.db_for_write(Category)
+        self.assertFalse(db_router.is_pinned())
+
+        token = db_router.start_pinned(False)
+        try:
+            router.db_for_write(Category)
+            self.assertTrue(db_router.is_pinned())
+        finally:
+            db_router.finish(token)
+        self.assertFalse(db_router.is_pinned())
+
+
+class CursorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ("Bakery", "Dairy", "Produce"):
+            Category.objects.create(name=name)
+        cls.user = User.objects.create_user("cursor", password="x")
+
+    def forged(self) -> list:
+        return [
+            encode_cursor([{"dt": "garbage"}, 1], "next"),
+            encode_cursor(["Dairy", "abc"], "next"),
+            encode_cursor(["Dairy", None], "next"),
+            encode_cursor(["Dairy"], "next"),
+            "not a cursor",
+        ]
+
+    def test_pages(self):
+        paginator = CursorPaginator(Category.objects.all(), 2, ("name", "id"))
+        first = paginator.get_page()
+        self.assertEqual([c.name for c in first], ["Bakery", "Dairy"])
+        second = paginator.get_page(first.next_token, strict=True)
+        self.assertEqual([c.name for c in second], ["Produce"])
+        self.assertEqual([c.name for c in paginator.get_page(second.previous_token)], ["Bakery", "Dairy"])
+
+    def test_forged_cursor_falls_back_or_raises(self):
+        paginator = CursorPaginator(Category.objects.all(), 2, ("name", "id"))
+        for token in self.forged():
+            with self.subTest(token):
+                self.assertEqual([c.name for c in paginator.get_page(token)], ["Bakery", "Dairy"])
+                with self.assertRaises(InvalidCursor):
+                    paginator.get_page(token, strict=True)
+
+    def test_forged_cursor_is_a_400_in_the_api(self):
+        self.client.force_login(self.user)
+        for token in self.forged():
+            with self.subTest(token):
+                response = self.client.get(reverse("api:category_api_view"), {"cursor": token})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("cursor", response.json()["error"])
+
+
+class MediaAccessTest(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        for name in ("products/p.jpg", "avatars/a.jpg"):
+            path = f"{self.root}/{name}"
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"not really a jpeg")
+        override = override_settings(MEDIA_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_public_and_private(self):
+        self.assertEqual(self.client.get("/media/products/p.jpg").status_code, 200)
+        self.assertEqual(self.client.get("/media/avatars/a.jpg").status_code, 403)
+
+    def test_traversal_cannot_borrow_a_public_prefix(self):
+        for url in (
+            "/media/products/../avatars/a.jpg",
+            "/media/products/%2e%2e/avatars/a.jpg",
+            "/media/products/%2E%2E/avatars/a.jpg",
+            "/media/products/..%2favatars/a.jpg",
+        ):
+            with self.subTest(url):
+                self.assertIn(self.client.get(url).status_code, (403, 404))
+        self.assertEqual(self.client.get("/media/products/./p.jpg").status_code, 200)
+
+
+class ResponsiveImageFallbackTest(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        os.makedirs(f"{self.root}/products")
+        with open(f"{self.root}/products/broken.jpg", "wb") as f:
+            f.write(b"not really a jpeg")
+        override = override_settings(MEDIA_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+
+    def render(self, name:str) -> str:
+        template = engines["django"].from_string('{% load responsive_images %}{% responsive_image image "card" %}')
+        return template.render({"image": FieldFile(Product(), Product._meta.get_field("image"), name)})
+
+    def test_missing_and_unreadable_originals_fall_back_quietly(self):
+        with self.assertLogs("main.images", "INFO") as logs:
+            for name in ("products/missing.jpg", "products/broken.jpg"):
+                with self.subTest(name):
+                    html = self.render(name)
+                    self.assertIn(f'<img src="/media/{name}', html)
+                    self.assertNotIn("<picture>", html)
+            images.make_derivatives("products/broken.jpg", "card")
+        self.assertEqual([record.levelname for record in logs.records], ["INFO", "WARNING"])
+
+        # remembered for a while rather than retried on every render
+        with self.assertNoLogs("main.images"):
+            self.render("products/broken.jpg")
+        self.assertIs(cache.get(images._manifest_key("products/broken.jpg", "card")), False)
+
+    def test_renders_never_decode(self):
+        Image.new("RGB", (500, 300), "red").save(f"{self.root}/products/red.jpg")
+        with mock.patch.object(images, "_open", side_effect=AssertionError("decoded while rendering")):
+            self.assertNotIn("<picture>", self.render("products/red.jpg"))
+        self.assertFalse(os.path.exists(f"{self.root}/products/thumbs"))
+
+        images.make_derivatives("products/red.jpg", "card")
+        cache.clear()
+        with mock.patch.object(images, "_open", side_effect=AssertionError("decoded while rendering")):
+            html = self.render("products/red.jpg")
+        self.assertIn("<picture>", html)
+        self.assertIn("/card-400.webp", html)
+        self.assertNotIn("card-640", html)
+        self.assertIn('width="400" height="240"', html)
+
+
+class ConditionalPageTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+        cls.clerk = User.objects.create_user("clerk")
+        cls.product = Product.objects.create(name="Milk", description="", sku="M-1", cost_price=1, selling_price=2, current_stock=5)
+        cls.other = Product.objects.create(name="Salt", description="", sku="S-1", cost_price=1, selling_price=2, current_stock=5)
+        cls.supplier = Supplier.objects.create(name="Farm", email="farm@example.com")
+
+    def revalidate(self, url:str, etag:str):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_product_detail(self):
+        self.client.force_login(self.clerk)
+        url = reverse("products:product_detail_view", args=[self.product.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+
+        # session, user and the one version lookup; the view itself does not run
+        with self.assertNumQueries(3):
+            self.assertEqual(self.revalidate(url, etag).status_code, 304)
+
+        self.other.name = "Sea Salt"
+        self.other.save()
+        self.assertEqual(self.revalidate(url, etag).status_code, 304)
+
+        self.product.name = "Whole Milk"
+        self.product.save()
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertContains(response, "Whole Milk")
+
+    def test_product_detail_after_stock_movement(self):
+        self.client.force_login(self.clerk)
+        url = reverse("products:product_detail_view", args=[self.product.id])
+        etag = self.client.get(url)["ETag"]
+        stock.record_movement(self.product.id, StockMovement.RECEIPT, 3)
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_supplier_detail(self):
+        self.client.force_login(self.clerk)
+        url = reverse("suppliers:supplier_detail_view", args=[self.supplier.id])
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.revalidate(url, etag).status_code, 304)
+
+        self.supplier.name = "Hillside Farm"
+        self.supplier.save()
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_report(self):
+        self.client.force_login(self.staff)
+        url = reverse("reports:inventory_report")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.revalidate(url, etag).status_code, 304)
+
+        self.other.selling_price = 3
+        self.other.save()
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_copies_are_per_user(self):
+        url = reverse("products:product_detail_view", args=[self.product.id])
+        self.client.force_login(self.clerk)
+        etag = self.client.get(url)["ETag"]
+        self.client.force_login(self.staff)
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
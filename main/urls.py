@@ -8,5 +8,6 @@ urlpatterns = [
     path('', views.home_view, name="home_view"),
     path('contact/', views.contact_view, name="contact_view"),
     path('contact/messages/', views.contact_messages_view, name="contact_messages_view"),
-    path('dashboard/', views.dashboard_view, name="dashboard_view")
+    path('dashboard/', views.dashboard_view, name="dashboard_view"),
+    path('sql-stats/', views.sql_stats_view, name="sql_stats_view"),
 ]
\ No newline at end of file
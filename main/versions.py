@@ -0,0 +1,135 @@
+import hashlib
+from functools import wraps
+from django.conf import settings
+from django.contrib import messages
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from .models import VersionStamp
+
+
+# keeps IN (...) lists under SQLite's bound parameter limit
+KEY_CHUNK_SIZE = 900
+
+
+def key_for(model) -> str:
+    return model._meta.label_lower
+
+
+def object_key(model, pk) -> str:
+    '''The key of a single row, e.g. "products.product:42".'''
+    return f"{key_for(model)}:{pk}"
+
+
+def bump(*keys:str):
+    '''Moves every key to a new version; call after writes that skip model signals.'''
+    now = timezone.now()
+    keys = list(dict.fromkeys(keys))
+    for i in range(0, len(keys), KEY_CHUNK_SIZE):
+        chunk = keys[i:i + KEY_CHUNK_SIZE]
+        updated = VersionStamp.objects.filter(key__in=chunk).update(version=F("version") + 1, updated_at=now)
+        if updated < len(chunk):
+            # the ones already there were bumped above, the rest start at 1
+            VersionStamp.objects.bulk_create(
+                [VersionStamp(key=key, version=1, updated_at=now) for key in chunk],
+                ignore_conflicts=True,
+            )
+
+
+def bump_objects(model, ids):
+    '''Bumps the model and each of the given rows, for bulk writes.'''
+    bump(key_for(model), *(object_key(model, pk) for pk in ids))
+
+
+def get_versions(*keys:str) -> dict:
+    '''key -> (version, updated_at) in one query; unknown keys are at version 0.'''
+    found = dict(
+        (stamp.key, (stamp.version, stamp.updated_at))
+        for stamp in VersionStamp.objects.filter(key__in=keys)
+    )
+    return {key: found.get(key, (0, None)) for key in keys}
+
+
+def stamp(*keys:str) -> str:
+    '''A short string that changes whenever any of the keys is bumped.'''
+    versions = get_versions(*keys)
+    return "-".join(str(versions[key][0]) for key in keys)
+
+
+def with_versions(objects, *shared_keys:str):
+    '''
+    Sets cache_version on each object from its own stamp and the shared
+    keys (e.g. a related model it shows), all read with one query.
+
+    Templates key per-object fragment caches on it, so a save, delete or
+    bulk write that bumps the row moves its fragments to a new key.
+    '''
+    objects = list(objects)
+    if not objects:
+        return objects
+    keys = [object_key(type(obj), obj.pk) for obj in objects]
+    found = get_versions(*keys, *shared_keys)
+    shared = ".".join(str(found[key][0]) for key in shared_keys)
+    for obj, key in zip(objects, keys):
+        obj.cache_version = f"{found[key][0]}.{shared}" if shared_keys else str(found[key][0])
+    return objects
+
+
+def user_keys(request) -> list:
+    '''
+    Keys for what a page shows about the visitor: the navbar and the
+    buttons that depend on their permissions.
+    '''
+    if not request.user.is_authenticated:
+        return []
+    return ["auth.group", object_key(request.user, request.user.pk)]
+
+
+def conditional_page(keys_for):
+    '''
+    ETag/Last-Modified for a page built from versioned data.
+
+    keys_for(request, **kwargs) names the version keys the page depends on.
+    They are read with one query and, when the client's copy still matches,
+    a 304 is returned without running the view. The ETag also covers the
+    visitor (their stamp, staff flag and CSRF cookie, since pages carry
+    forms and permission-dependent links), so one user's copy never
+    validates for another, and the date. Pages with flash messages
+    waiting are always rendered.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD") or len(messages.get_messages(request)):
+                return view(request, *args, **kwargs)
+
+            keys = list(keys_for(request, *args, **kwargs)) + user_keys(request)
+            versions = get_versions(*keys)
+            variant = (
+                request.get_full_path(),
+                # expiry badges and counts move with the calendar
+                timezone.localdate().isoformat(),
+                request.user.pk,
+                request.user.is_staff,
+                request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+                [(key, version, updated_at.isoformat() if updated_at else None) for key, (version, updated_at) in versions.items()],
+            )
+            etag = f'"{hashlib.sha1(repr(variant).encode()).hexdigest()}"'
+            updated = [updated_at for _, updated_at in versions.values() if updated_at]
+            last_modified = int(max(updated).timestamp()) if updated else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response["ETag"] = etag
+            if last_modified:
+                response["Last-Modified"] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ("Cookie",))
+            return response
+
+        return wrapper
+    return decorator
@@ -1,12 +1,16 @@
 from django.shortcuts import render, redirect
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, HttpResponse, JsonResponse
 from products.models import Product
 from .models import Contact
-from django.core.mail import EmailMessage
+from .outbox import enqueue
+from . import versions, media, sqlstats
+from reports.stats import get_summary
+from django.core.paginator import Paginator
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.contrib import messages
-from django.db import models
+from django.db import transaction
+from django.views.decorators.http import require_safe
 
 # Create your views here.
 
@@ -18,7 +22,7 @@ def home_view(request:HttpRequest):
         print("User is not logged in")
 
     
-    products = Product.objects.all().order_by("-created_at")[0:3]
+    products = versions.with_versions(Product.objects.all().order_by("-created_at")[0:3])
 
     return render(request, 'main/index.html', {"products" : products} )
 
@@ -26,15 +30,14 @@ def home_view(request:HttpRequest):
 def contact_view(request:HttpRequest):
     
     if request.method == "POST":
-        contact = Contact(name=request.POST["name"], email=request.POST["email"], subject=request.POST["subject"], message=request.POST["message"])
-        contact.save()
+        content_html = render_to_string("main/mail/confirmation.html", {"name": request.POST["name"]})
 
-        
-        content_html = render_to_string("main/mail/confirmation.html")
-        send_to = contact.email
-        email_message = EmailMessage("confirmation", content_html, settings.EMAIL_HOST_USER, [send_to])
-        email_message.content_subtype = "html"
-        email_message.send()
+        # the confirmation is queued with the contact row and sent by dispatch_outbox
+        with transaction.atomic():
+            contact = Contact(name=request.POST["name"], email=request.POST["email"], subject=request.POST["subject"], message=request.POST["message"])
+            contact.save()
+
+            enqueue("confirmation", content_html, [contact.email], from_email=settings.EMAIL_HOST_USER, content_subtype="html")
 
         messages.success(request, "Your message is received. Thank You.", "alert-success")
 
@@ -50,26 +53,35 @@ def contact_messages_view(request:HttpRequest):
 
 def dashboard_view(request:HttpRequest):
 
+    summary = get_summary()
+
     products = Product.objects.all().order_by("-created_at")
-    
-    low_stock_count = Product.objects.filter(
-        current_stock__lte=models.F('min_stock_level')
-    ).count()
-    
-    from datetime import date, timedelta
-    today = date.today()
-    threshold_date = today + timedelta(days=30)
-    
-    expiring_count = Product.objects.filter(
-        is_perishable=True,
-        expiry_date__isnull=False,
-        expiry_date__lte=threshold_date
-    ).count()
+    page_number = request.GET.get("page", 1)
+    paginator = Paginator(products, 12)
+    products_page = paginator.get_page(page_number)
+    versions.with_versions(products_page)
     
     context = {
-        "products": products,
-        "low_stock_count": low_stock_count,
-        "expiring_count": expiring_count,
+        "products": products_page,
+        "low_stock_count": summary.low_stock_count,
+        "expiring_count": summary.expiring_count,
+        "summary": summary,
     }
 
-    return render(request, 'main/dashboard.html', context)
\ No newline at end of file
+    return render(request, 'main/dashboard.html', context)
+
+
+def sql_stats_view(request:HttpRequest):
+
+    if not request.user.is_staff:
+        return JsonResponse({"error": "staff privileges required"}, status=403)
+
+    if request.method == "POST" and request.POST.get("reset") == "1":
+        sqlstats.reset()
+
+    return JsonResponse(sqlstats.summary())
+
+
+@require_safe
+def media_view(request:HttpRequest, name:str):
+    return media.serve(request, name)
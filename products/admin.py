@@ -1,4 +1,40 @@
 from django.contrib import admin
+from .models import ProductAlert, AlertRun, StockMovement
 
 # Register your models here.
 
+
+@admin.register(ProductAlert)
+class ProductAlertAdmin(admin.ModelAdmin):
+    list_display = ["product", "alert_type", "severity", "raised_at", "acknowledged_at", "cleared_at"]
+    list_filter = ["alert_type", "severity"]
+    list_select_related = ["product"]
+    actions = ["acknowledge"]
+
+    @admin.action(description="Acknowledge selected alerts")
+    def acknowledge(self, request, queryset):
+        from django.utils import timezone
+        queryset.filter(acknowledged_at__isnull=True).update(acknowledged_at=timezone.now(), acknowledged_by=request.user)
+
+
+@admin.register(AlertRun)
+class AlertRunAdmin(admin.ModelAdmin):
+    list_display = ["started_at", "incremental", "new_alerts", "escalated_alerts", "cleared_alerts", "emails_sent"]
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    # the ledger is append only; corrections are new adjustment movements
+    list_display = ["created_at", "product", "movement_type", "quantity", "stock_after", "reference", "created_by"]
+    list_filter = ["movement_type"]
+    list_select_related = ["product", "created_by"]
+    search_fields = ["product__sku", "reference"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,230 @@
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Case, When, Value, Q, IntegerField
+from django.utils import timezone
+from .models import Product, ProductAlert, AlertRun
+from .notifications import low_stock_queryset, expiring_queryset, EXPIRY_DAYS_THRESHOLD
+
+
+# expiry severities: inside the window, inside a week, already expired
+EXPIRY_URGENT_DAYS = 7
+
+# keeps IN (...) lists under SQLite's bound parameter limit
+ID_CHUNK_SIZE = 900
+
+
+def _chunks(ids:list, size:int=ID_CHUNK_SIZE):
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def current_low_stock(scope=None) -> dict:
+    '''{product id: severity} for products in low stock; 2 means out of stock.'''
+    queryset = low_stock_queryset()
+    if scope is not None:
+        queryset = queryset.filter(scope)
+    return dict(queryset.annotate(severity=Case(
+        When(current_stock=0, then=Value(2)),
+        default=Value(1),
+        output_field=IntegerField(),
+    )).values_list('id', 'severity'))
+
+
+def current_expiring(scope=None) -> dict:
+    '''{product id: severity} for perishables near expiry; 3 means already expired.'''
+    today = timezone.localdate()
+    queryset = expiring_queryset()
+    if scope is not None:
+        queryset = queryset.filter(scope)
+    return dict(queryset.annotate(severity=Case(
+        When(expiry_date__lt=today, then=Value(3)),
+        When(expiry_date__lte=today + timedelta(days=EXPIRY_URGENT_DAYS), then=Value(2)),
+        default=Value(1),
+        output_field=IntegerField(),
+    )).values_list('id', 'severity'))
+
+
+def incremental_scope(since, expiry_threshold:bool=False) -> Q:
+    '''
+    Products that can have changed alert state since the given time.
+
+    Edits are found through updated_at. For expiry, time passing alone moves
+    a product across a severity boundary, so products whose expiry date
+    crossed one of the boundaries since then are included as well.
+    '''
+    scope = Q(updated_at__gte=since)
+    if expiry_threshold:
+        since_date = timezone.localdate(since)
+        today = timezone.localdate()
+        for days in (EXPIRY_DAYS_THRESHOLD, EXPIRY_URGENT_DAYS, -1):
+            scope |= Q(
+                expiry_date__gt=since_date + timedelta(days=days),
+                expiry_date__lte=today + timedelta(days=days),
+            )
+    return scope
+
+
+class AlertDiff:
+
+    def __init__(self, alert_type:str):
+        self.alert_type = alert_type
+        self.new = set()
+        self.escalated = set()
+        self.cleared = set()
+
+    @property
+    def to_notify(self) -> set:
+        return self.new | self.escalated
+
+
+def diff_alerts(alert_type:str, current:dict, scope=None) -> AlertDiff:
+    '''Compares the current alert set with the stored open alerts.'''
+    diff = AlertDiff(alert_type)
+
+    open_alerts = ProductAlert.objects.filter(alert_type=alert_type, cleared_at__isnull=True)
+    if scope is not None:
+        open_alerts = open_alerts.filter(product__in=Product.objects.filter(scope).values('id'))
+    open_alerts = dict(open_alerts.values_list('product_id', 'severity'))
+
+    diff.new = current.keys() - open_alerts.keys()
+    diff.escalated = {
+        product_id for product_id in current.keys() & open_alerts.keys()
+        if current[product_id] > open_alerts[product_id]
+    }
+    diff.cleared = open_alerts.keys() - current.keys()
+    return diff
+
+
+def apply_diff(diff:AlertDiff, current:dict, now):
+    if diff.new:
+        # reopens a previously cleared row or inserts a new one
+        ProductAlert.objects.bulk_create(
+            [
+                ProductAlert(
+                    product_id=product_id, alert_type=diff.alert_type, severity=current[product_id],
+                    raised_at=now, notified_at=now,
+                    acknowledged_at=None, acknowledged_by=None, cleared_at=None,
+                )
+                for product_id in diff.new
+            ],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['product', 'alert_type'],
+            update_fields=['severity', 'raised_at', 'notified_at', 'acknowledged_at', 'acknowledged_by', 'cleared_at'],
+        )
+
+    by_severity = {}
+    for product_id in diff.escalated:
+        by_severity.setdefault(current[product_id], []).append(product_id)
+    for severity, product_ids in by_severity.items():
+        for chunk in _chunks(product_ids):
+            ProductAlert.objects.filter(alert_type=diff.alert_type, product_id__in=chunk).update(
+                severity=severity, notified_at=now, acknowledged_at=None, acknowledged_by=None
+            )
+
+    for chunk in _chunks(diff.cleared):
+        ProductAlert.objects.filter(alert_type=diff.alert_type, product_id__in=chunk).update(cleared_at=now)
+
+
+def last_run_started_at():
+    run = AlertRun.objects.filter(finished_at__isnull=False).order_by('-started_at').first()
+    return run.started_at if run else None
+
+
+def _products(queryset, product_ids:set) -> list:
+    products = []
+    for chunk in _chunks(sorted(product_ids)):
+        products.extend(queryset.filter(id__in=chunk))
+    return products
+
+
+def check_alerts(mode:str='digest', since=None) -> AlertRun:
+    '''
+    Updates the alert state table and notifies only new or escalated alerts.
+
+    With since, only products that may have changed after that time are
+    compared. The emails are queued in the outbox in the same transaction as
+    the state changes and sent later by dispatch_outbox, so no SMTP session
+    runs while the write lock is held and a failed send is retried there.
+    '''
+    from .notifications import queue_digest, queue_item_notifications
+
+    now = timezone.now()
+    run = AlertRun(started_at=now, incremental=since is not None)
+
+    low_scope = incremental_scope(since) if since else None
+    expiry_scope = incremental_scope(since, expiry_threshold=True) if since else None
+
+    with transaction.atomic():
+        low_current = current_low_stock(low_scope)
+        expiry_current = current_expiring(expiry_scope)
+
+        low_diff = diff_alerts(ProductAlert.LOW_STOCK, low_current, low_scope)
+        expiry_diff = diff_alerts(ProductAlert.EXPIRY, expiry_current, expiry_scope)
+
+        apply_diff(low_diff, low_current, now)
+        apply_diff(expiry_diff, expiry_current, now)
+
+        low_stock_products = _products(low_stock_queryset(), low_diff.to_notify)
+        expiring_products = _products(expiring_queryset(), expiry_diff.to_notify)
+
+        if mode == 'item':
+            run.emails_sent = queue_item_notifications(low_stock_products, expiring_products)
+        else:
+            run.emails_sent = queue_digest(low_stock_products, expiring_products)
+
+        run.new_alerts = len(low_diff.new) + len(expiry_diff.new)
+        run.escalated_alerts = len(low_diff.escalated) + len(expiry_diff.escalated)
+        run.cleared_alerts = len(low_diff.cleared) + len(expiry_diff.cleared)
+        run.finished_at = timezone.now()
+        run.save()
+
+    run.low_stock_products = low_stock_products
+    run.expiring_products = expiring_products
+    return run
+
+
+def check_low_stock(product_ids) -> list:
+    '''
+    Updates the low stock alerts of just these products, e.g. after a bulk stock change.
+
+    New or escalated alerts are queued in the outbox as one digest, inside
+    the caller's transaction. Returns the products that were notified.
+    '''
+    from .notifications import queue_digest
+
+    scope = Q(id__in=list(product_ids))
+    current = current_low_stock(scope)
+    diff = diff_alerts(ProductAlert.LOW_STOCK, current, scope)
+    apply_diff(diff, current, timezone.now())
+
+    products = _products(low_stock_queryset(), diff.to_notify)
+    queue_digest(products)
+    return products
+
+
+def check_products(product_ids) -> tuple:
+    '''
+    Updates both the low stock and the expiry alerts of just these products,
+    e.g. after an edit that can change either.
+
+    As with check_low_stock(), only new or escalated alerts are queued, in
+    one digest inside the caller's transaction. Returns the notified
+    (low stock, expiring) products.
+    '''
+    from .notifications import queue_digest
+
+    now = timezone.now()
+    scope = Q(id__in=list(product_ids))
+    low_current = current_low_stock(scope)
+    expiry_current = current_expiring(scope)
+    low_diff = diff_alerts(ProductAlert.LOW_STOCK, low_current, scope)
+    expiry_diff = diff_alerts(ProductAlert.EXPIRY, expiry_current, scope)
+    apply_diff(low_diff, low_current, now)
+    apply_diff(expiry_diff, expiry_current, now)
+
+    low_stock_products = _products(low_stock_queryset(), low_diff.to_notify)
+    expiring_products = _products(expiring_queryset(), expiry_diff.to_notify)
+    queue_digest(low_stock_products, expiring_products)
+    return low_stock_products, expiring_products
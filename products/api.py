@@ -0,0 +1,156 @@
+from datetime import timedelta
+from django.db.models import Count, Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from main import versions
+from main.api import ApiError, parse_fields, parse_bool, parse_page_size, page_url, cursor_page
+from main.pagination import CursorPaginator
+from reports.inventory import STATUS_LABELS, filter_inventory, parse_category, stock_status
+from suppliers.models import Supplier
+from .models import Product, Category
+
+
+PRODUCT_VERSION_KEYS = ("products.product", "products.category", "suppliers.supplier")
+CATEGORY_VERSION_KEYS = ("products.category", "products.product")
+
+# field name -> (columns it reads, how it is written out)
+PRODUCT_FIELDS = {
+    "id": (("id",), lambda product: product.id),
+    "sku": (("sku",), lambda product: product.sku),
+    "name": (("name",), lambda product: product.name),
+    "description": (("description",), lambda product: product.description),
+    "category": (("category__name",), lambda product: {"id": product.category_id, "name": product.category.name} if product.category_id else None),
+    "suppliers": ((), lambda product: [{"id": supplier.id, "name": supplier.name} for supplier in product.suppliers.all()]),
+    "cost_price": (("cost_price",), lambda product: product.cost_price),
+    "selling_price": (("selling_price",), lambda product: product.selling_price),
+    "current_stock": (("current_stock",), lambda product: product.current_stock),
+    "min_stock_level": (("min_stock_level",), lambda product: product.min_stock_level),
+    "stock_status": ((), lambda product: product.status),
+    "is_perishable": (("is_perishable",), lambda product: product.is_perishable),
+    "expiry_date": (("expiry_date",), lambda product: product.expiry_date),
+    "image": (("image",), lambda product: product.image.url if product.image else None),
+    "created_at": (("created_at",), lambda product: product.created_at),
+    "updated_at": (("updated_at",), lambda product: product.updated_at),
+}
+PRODUCT_DEFAULT_FIELDS = ("id", "sku", "name", "category", "selling_price", "current_stock", "min_stock_level", "stock_status", "updated_at")
+PRODUCT_STAFF_FIELDS = ("cost_price",)
+
+CATEGORY_FIELDS = {
+    "id": lambda category: category.id,
+    "name": lambda category: category.name,
+    "product_count": lambda category: category.product_count,
+}
+
+
+def _int_param(request, name:str, minimum:int=0):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise ApiError(f"{name} must be a whole number")
+    if number < minimum:
+        raise ApiError(f"{name} must be at least {minimum}")
+    return number
+
+
+def filter_products(request, queryset):
+    '''
+    ?status=out_of_stock|low_stock|in_stock, ?category=<id>|none, ?supplier=<id>,
+    ?perishable=true|false, ?expiring_within=<days> (already expired included)
+    and ?updated_since=<ISO datetime>.
+    '''
+    status = request.GET.get("status")
+    if status and status not in STATUS_LABELS:
+        raise ApiError(f"status must be one of {', '.join(STATUS_LABELS)}")
+    category = request.GET.get("category")
+    if category and parse_category(category) is None:
+        raise ApiError("category must be a category id or none")
+    queryset = filter_inventory(queryset, category, status)
+
+    supplier = _int_param(request, "supplier", 1)
+    if supplier:
+        queryset = queryset.filter(suppliers__id=supplier)
+
+    perishable = parse_bool(request, "perishable")
+    if perishable is not None:
+        queryset = queryset.filter(is_perishable=perishable)
+
+    expiring_within = _int_param(request, "expiring_within")
+    if expiring_within is not None:
+        queryset = queryset.filter(
+            is_perishable=True,
+            expiry_date__isnull=False,
+            expiry_date__lte=timezone.localdate() + timedelta(days=expiring_within),
+        )
+
+    updated_since = request.GET.get("updated_since")
+    if updated_since:
+        since = parse_datetime(updated_since)
+        if since is None:
+            raise ApiError("updated_since must be an ISO 8601 datetime")
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        queryset = queryset.filter(updated_at__gte=since)
+
+    return queryset
+
+
+def product_etag_parts(request) -> tuple:
+    parts = (versions.stamp(*PRODUCT_VERSION_KEYS),)
+    # the window moves with the calendar even when no product changes
+    if request.GET.get("expiring_within"):
+        parts += (timezone.localdate().isoformat(),)
+    return parts
+
+
+def product_listing(request) -> dict:
+    '''
+    One page of products with only the requested columns loaded.
+
+    Category names come from the same query and suppliers from one
+    prefetch, so a page costs two queries whatever its size.
+    '''
+    fields = parse_fields(request, PRODUCT_FIELDS, PRODUCT_DEFAULT_FIELDS, PRODUCT_STAFF_FIELDS)
+    limit = parse_page_size(request)
+    queryset = filter_products(request, Product.objects.all())
+
+    columns = {"id"}
+    for name in fields:
+        columns.update(PRODUCT_FIELDS[name][0])
+    queryset = queryset.only(*columns)
+    if "category" in fields:
+        queryset = queryset.select_related("category")
+    if "stock_status" in fields:
+        queryset = queryset.annotate(status=stock_status())
+    if "suppliers" in fields:
+        queryset = queryset.prefetch_related(Prefetch("suppliers", queryset=Supplier.objects.only("id", "name").order_by("name")))
+
+    page = cursor_page(request, CursorPaginator(queryset, limit, ("id",)))
+    return {
+        "fields": fields,
+        "results": [{name: PRODUCT_FIELDS[name][1](product) for name in fields} for product in page],
+        "next": page_url(request, page.next_token),
+        "previous": page_url(request, page.previous_token),
+    }
+
+
+def category_etag_parts(request) -> tuple:
+    return (versions.stamp(*CATEGORY_VERSION_KEYS),)
+
+
+def category_listing(request) -> dict:
+    fields = parse_fields(request, CATEGORY_FIELDS, tuple(CATEGORY_FIELDS))
+    limit = parse_page_size(request)
+    queryset = Category.objects.all()
+    if "product_count" in fields:
+        queryset = queryset.annotate(product_count=Count("product"))
+
+    page = cursor_page(request, CursorPaginator(queryset, limit, ("name", "id")))
+    return {
+        "fields": fields,
+        "results": [{name: CATEGORY_FIELDS[name](category) for name in fields} for category in page],
+        "next": page_url(request, page.next_token),
+        "previous": page_url(request, page.previous_token),
+    }
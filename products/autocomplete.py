@@ -0,0 +1,201 @@
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from django.db import connection
+from suppliers.models import Supplier
+from .models import Product, Category
+
+
+MAX_RESULTS = 10
+# indexes are also rebuilt periodically, off the request thread, to pick up
+# writes made by other worker processes
+REFRESH_SECONDS = 300
+# besides the full label, a name can be found by the start of any of its first few words
+MAX_WORD_KEYS = 5
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"\w[\w\-]*", re.UNICODE)
+
+
+def name_keys(name:str) -> list:
+    name = name.lower().strip()
+    if not name:
+        return []
+    keys = [name]
+    for match in list(WORD_RE.finditer(name))[1:MAX_WORD_KEYS]:
+        keys.append(name[match.start():])
+    return keys
+
+
+class PrefixIndex:
+    '''
+    In-process prefix index over (key, id) pairs kept in one sorted list.
+
+    Lookups are a bisect to the first key >= prefix followed by a short scan,
+    updates insert or remove single entries, so a save never forces a full
+    rebuild. Only the first lookup, or the first after invalidate(), waits
+    for a build; the periodic refresh builds a new list in a background
+    thread and swaps it in, while lookups keep using the current one.
+    '''
+
+    def __init__(self, loader, keys_for):
+        self.loader = loader
+        self.keys_for = keys_for
+        self.lock = threading.RLock()
+        self.entries = []
+        self.labels = {}
+        self.keys_by_id = {}
+        self.built_at = None
+        self.refreshing = False
+        # moved by every change, so a refresh that raced one is thrown away
+        self.generation = 0
+
+    @property
+    def is_built(self) -> bool:
+        return self.built_at is not None
+
+    def _load(self) -> tuple:
+        entries = []
+        labels = {}
+        keys_by_id = {}
+        for object_id, label, raw in self.loader():
+            keys = self.keys_for(raw)
+            labels[object_id] = label
+            keys_by_id[object_id] = keys
+            entries.extend((key, object_id) for key in keys)
+        entries.sort()
+        return entries, labels, keys_by_id
+
+    def build(self):
+        loaded = self._load()
+        with self.lock:
+            self.entries, self.labels, self.keys_by_id = loaded
+            self.built_at = time.monotonic()
+
+    def refresh(self):
+        '''Rebuilds into new lists and swaps them in, unless the index changed meanwhile.'''
+        generation = self.generation
+        loaded = self._load()
+        with self.lock:
+            if generation == self.generation and self.is_built:
+                self.entries, self.labels, self.keys_by_id = loaded
+                self.built_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.warning("Couldn't refresh the autocomplete index", exc_info=True)
+        finally:
+            self.refreshing = False
+            # the thread's own connection
+            connection.close()
+
+    def invalidate(self):
+        with self.lock:
+            self.built_at = None
+            self.generation += 1
+
+    def _ensure_built(self):
+        if self.built_at is None:
+            self.build()
+        elif time.monotonic() - self.built_at > REFRESH_SECONDS:
+            with self.lock:
+                if self.refreshing:
+                    return
+                self.refreshing = True
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+    def search(self, prefix:str, limit:int=MAX_RESULTS) -> list:
+        prefix = prefix.lower().strip()
+        if not prefix:
+            return []
+        self._ensure_built()
+
+        results = []
+        seen = set()
+        with self.lock:
+            position = bisect_left(self.entries, (prefix,))
+            while position < len(self.entries) and len(results) < limit:
+                key, object_id = self.entries[position]
+                if not key.startswith(prefix):
+                    break
+                if object_id not in seen:
+                    seen.add(object_id)
+                    results.append({"id": object_id, "label": self.labels[object_id]})
+                position += 1
+        return results
+
+    def remove(self, object_id):
+        with self.lock:
+            if not self.is_built:
+                return
+            for key in self.keys_by_id.pop(object_id, []):
+                position = bisect_left(self.entries, (key, object_id))
+                if position < len(self.entries) and self.entries[position] == (key, object_id):
+                    del self.entries[position]
+            self.labels.pop(object_id, None)
+            self.generation += 1
+
+    def update(self, object_id, label:str, raw:str):
+        with self.lock:
+            if not self.is_built:
+                return
+            self.remove(object_id)
+            keys = self.keys_for(raw)
+            for key in keys:
+                insort(self.entries, (key, object_id))
+            self.labels[object_id] = label
+            self.keys_by_id[object_id] = keys
+            self.generation += 1
+
+
+def _load_skus():
+    for object_id, sku, name in Product.objects.values_list("id", "sku", "name").iterator(chunk_size=5000):
+        yield object_id, f"{sku} — {name}", sku
+
+
+def _load_products():
+    for object_id, sku, name in Product.objects.values_list("id", "sku", "name").iterator(chunk_size=5000):
+        yield object_id, f"{name} ({sku})", name
+
+
+def _load_suppliers():
+    for object_id, name in Supplier.objects.values_list("id", "name").iterator(chunk_size=5000):
+        yield object_id, name, name
+
+
+def _load_categories():
+    for object_id, name in Category.objects.values_list("id", "name"):
+        yield object_id, name, name
+
+
+INDEXES = {
+    "sku": PrefixIndex(_load_skus, lambda sku: [sku.lower()]),
+    "product": PrefixIndex(_load_products, name_keys),
+    "supplier": PrefixIndex(_load_suppliers, name_keys),
+    "category": PrefixIndex(_load_categories, name_keys),
+}
+
+
+def lookup(kind:str, prefix:str, limit:int=MAX_RESULTS) -> list:
+    return INDEXES[kind].search(prefix, limit)
+
+
+def product_saved(product):
+    INDEXES["sku"].update(product.id, f"{product.sku} — {product.name}", product.sku)
+    INDEXES["product"].update(product.id, f"{product.name} ({product.sku})", product.name)
+
+
+def product_deleted(product_id):
+    INDEXES["sku"].remove(product_id)
+    INDEXES["product"].remove(product_id)
+
+
+def invalidate(*kinds):
+    '''Marks indexes stale after bulk writes; they rebuild on the next lookup.'''
+    for kind in kinds or INDEXES:
+        INDEXES[kind].invalidate()
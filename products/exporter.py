@@ -0,0 +1,93 @@
+import csv
+import zlib
+from .models import Product
+
+
+CHUNK_SIZE = 2000
+
+# key -> (header, queryset field, formatter)
+EXPORT_COLUMNS = {
+    'name': ('Name', 'name', None),
+    'description': ('Description', 'description', None),
+    'sku': ('SKU', 'sku', None),
+    'category': ('Category', 'category__name', lambda value: value or ''),
+    'cost_price': ('Cost Price', 'cost_price', None),
+    'selling_price': ('Selling Price', 'selling_price', None),
+    'current_stock': ('Current Stock', 'current_stock', None),
+    'min_stock_level': ('Min Stock Level', 'min_stock_level', None),
+    'is_perishable': ('Is Perishable', 'is_perishable', lambda value: 'Yes' if value else 'No'),
+    'expiry_date': ('Expiry Date', 'expiry_date', lambda value: value.strftime('%Y-%m-%d') if value else ''),
+}
+
+DEFAULT_COLUMNS = list(EXPORT_COLUMNS)
+
+
+class Echo:
+    '''File-like object that hands back what is written, for csv.writer.'''
+
+    def write(self, value):
+        return value
+
+
+def parse_columns(raw:str) -> list:
+    if not raw:
+        return DEFAULT_COLUMNS
+    columns = [column.strip() for column in raw.split(',') if column.strip() in EXPORT_COLUMNS]
+    return columns or DEFAULT_COLUMNS
+
+
+def filter_products(queryset, category_id=None, low_stock=False, perishable=False):
+    if category_id:
+        queryset = queryset.filter(category_id=category_id)
+    if low_stock:
+        queryset = queryset.filter(low_stock=True)
+    if perishable:
+        queryset = queryset.filter(is_perishable=True)
+    return queryset
+
+
+def iter_csv_rows(queryset, columns:list, chunk_size:int=CHUNK_SIZE):
+    '''
+    Yields the CSV one encoded line at a time.
+
+    Rows come from values_list() with the category name joined in SQL and are
+    fetched chunk_size at a time, so the export costs a single query and never
+    holds more than one chunk in memory.
+    '''
+    writer = csv.writer(Echo())
+    fields = [EXPORT_COLUMNS[column][1] for column in columns]
+    formatters = [EXPORT_COLUMNS[column][2] for column in columns]
+
+    yield writer.writerow([EXPORT_COLUMNS[column][0] for column in columns]).encode('utf-8')
+
+    rows = queryset.order_by('id').values_list(*fields).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield writer.writerow([
+            formatter(value) if formatter else value
+            for value, formatter in zip(row, formatters)
+        ]).encode('utf-8')
+
+
+def gzip_stream(chunks, flush_every:int=64 * 1024):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    pending = 0
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        pending += len(chunk)
+        if data:
+            yield data
+        if pending >= flush_every:
+            # keep the client receiving bytes while large exports are compressed
+            data = compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+            if data:
+                yield data
+    yield compressor.flush()
+
+
+def export_products(columns:list=None, category_id=None, low_stock=False, perishable=False, compress=False):
+    queryset = filter_products(Product.objects.all(), category_id, low_stock, perishable)
+    stream = iter_csv_rows(queryset, columns or DEFAULT_COLUMNS)
+    if compress:
+        stream = gzip_stream(stream)
+    return stream
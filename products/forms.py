@@ -1,5 +1,5 @@
 from django import forms
-from .models import Product, Category
+from .models import Product, Category, StockMovement
 from suppliers.models import Supplier
 
 
@@ -34,4 +34,23 @@ class ProductForm(forms.ModelForm):
             'image' : forms.FileInput({"class" : "form-control"}),
             'is_perishable' : forms.CheckboxInput({"class" : "form-check-input"}),
             'expiry_date' : forms.DateInput({"class" : "form-control", "type" : "date"}),
-        }
\ No newline at end of file
+        }
+
+
+class ProductUpdateForm(ProductForm):
+    # stock levels only change through stock movements, so concurrent edits can't overwrite them
+    class Meta(ProductForm.Meta):
+        fields = [field for field in ProductForm.Meta.fields if field != 'current_stock']
+
+
+class StockMovementForm(forms.ModelForm):
+    class Meta:
+        model = StockMovement
+        fields = ['movement_type', 'quantity', 'location', 'reference', 'note']
+        widgets = {
+            'movement_type' : forms.Select({"class" : "form-select"}),
+            'quantity' : forms.NumberInput({"class" : "form-control"}),
+            'location' : forms.TextInput({"class" : "form-control"}),
+            'reference' : forms.TextInput({"class" : "form-control"}),
+            'note' : forms.Textarea({"class" : "form-control", "rows" : 2}),
+        }
@@ -0,0 +1,278 @@
+import codecs
+import csv
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from django.db import transaction, DatabaseError
+from main import versions
+from .models import Product, Category, StockMovement
+from . import search, autocomplete
+
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 500
+
+REQUIRED_COLUMNS = ['name', 'sku', 'cost_price', 'selling_price']
+
+# fields overwritten when a row's SKU already exists
+UPSERT_FIELDS = [
+    'name', 'description', 'category', 'cost_price', 'selling_price',
+    'current_stock', 'min_stock_level', 'is_perishable', 'expiry_date', 'updated_at',
+]
+
+
+class RowError(Exception):
+    pass
+
+
+class ImportReport:
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.batches = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_error(self, line:int, sku:str, message:str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "sku": sku, "message": message})
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def imported(self) -> int:
+        return self.created + self.updated
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def hidden_errors(self) -> int:
+        return self.failed - len(self.errors)
+
+
+def _parse_decimal(value:str, field:str) -> Decimal:
+    '''A price that fits the model field's max_digits and decimal_places; NaN and Infinity are row errors.'''
+    model_field = Product._meta.get_field(field)
+    whole_digits = model_field.max_digits - model_field.decimal_places
+    try:
+        amount = Decimal(value.strip())
+        if not amount.is_finite():
+            raise InvalidOperation(value)
+        if amount < 0:
+            raise RowError(f"{field} cannot be negative")
+        if amount.adjusted() < whole_digits:
+            amount = amount.quantize(Decimal(1).scaleb(-model_field.decimal_places))
+    except (InvalidOperation, AttributeError):
+        raise RowError(f"{field} must be a number, got '{value}'")
+    # checked after rounding, which can carry into another digit
+    if amount.adjusted() >= whole_digits:
+        raise RowError(f"{field} must be below {10 ** whole_digits}, got '{value}'")
+    return amount
+
+
+def _parse_int(value:str, field:str, default:int) -> int:
+    if value is None or value.strip() == '':
+        return default
+    try:
+        number = int(value.strip())
+    except ValueError:
+        raise RowError(f"{field} must be a whole number, got '{value}'")
+    if number < 0:
+        raise RowError(f"{field} cannot be negative")
+    return number
+
+
+def _parse_date(value:str):
+    if value is None or value.strip() == '':
+        return None
+    try:
+        return datetime.strptime(value.strip(), '%Y-%m-%d').date()
+    except ValueError:
+        raise RowError(f"expiry_date must be YYYY-MM-DD, got '{value}'")
+
+
+def _parse_row(row:dict) -> dict:
+    for column in REQUIRED_COLUMNS:
+        if not (row.get(column) or '').strip():
+            raise RowError(f"missing {column}")
+
+    sku = row['sku'].strip()
+    if len(sku) > 50:
+        raise RowError("sku is longer than 50 characters")
+
+    name = row['name'].strip()
+    if len(name) > 255:
+        raise RowError("name is longer than 255 characters")
+
+    category = (row.get('category') or '').strip()
+    if len(category) > 128:
+        raise RowError("category is longer than 128 characters")
+
+    return {
+        "name": name,
+        "description": row.get('description') or '',
+        "sku": sku,
+        "category": category,
+        "cost_price": _parse_decimal(row['cost_price'], 'cost_price'),
+        "selling_price": _parse_decimal(row['selling_price'], 'selling_price'),
+        "current_stock": _parse_int(row.get('current_stock'), 'current_stock', 0),
+        "min_stock_level": _parse_int(row.get('min_stock_level'), 'min_stock_level', 10),
+        "is_perishable": (row.get('is_perishable') or '').strip().lower() in ('yes', 'true', '1'),
+        "expiry_date": _parse_date(row.get('expiry_date')),
+    }
+
+
+class ProductImporter:
+    '''
+    Streams a products CSV into the database in fixed size batches.
+
+    Each batch is written with one upsert (insert, or update on SKU conflict)
+    inside its own transaction, so a failing batch never leaves half of its
+    rows behind and memory use does not depend on the size of the upload.
+    Stock changes are written to the StockMovement ledger and the batch's
+    alerts are updated in the same transaction.
+    '''
+
+    def __init__(self, user=None, batch_size:int=BATCH_SIZE):
+        self.user = user
+        self.batch_size = batch_size
+        self.categories = dict(Category.objects.values_list('name', 'id'))
+
+    def run(self, csv_file) -> ImportReport:
+        report = ImportReport()
+        if hasattr(csv_file, 'seek'):
+            csv_file.seek(0)
+        # decode the upload line by line instead of reading it all at once
+        reader = csv.DictReader(codecs.getreader('utf-8-sig')(csv_file, errors='strict'))
+
+        batch = {}
+        try:
+            for row in reader:
+                report.rows += 1
+                line = reader.line_num
+                try:
+                    data = _parse_row(row)
+                except RowError as e:
+                    report.add_error(line, (row.get('sku') or '').strip(), str(e))
+                    continue
+
+                # a repeated SKU inside the same batch: the last row wins
+                batch[data['sku']] = (line, data)
+                if len(batch) >= self.batch_size:
+                    self._write_batch(batch, report)
+                    batch = {}
+        except UnicodeDecodeError:
+            report.add_error(reader.line_num + 1, '', "file is not valid UTF-8, import stopped here")
+        except csv.Error as e:
+            report.add_error(reader.line_num, '', f"malformed CSV, import stopped here: {e}")
+
+        if batch:
+            self._write_batch(batch, report)
+
+        return report.finish()
+
+    def _resolve_categories(self, names:set):
+        missing = [name for name in names if name and name not in self.categories]
+        if not missing:
+            return
+        from reports import stats
+
+        Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+        created = dict(Category.objects.filter(name__in=missing).values_list('name', 'id'))
+        self.categories.update(created)
+        stats.add_to_count("total_categories", len(created))
+        versions.bump("products.category")
+
+    def _movements(self, before:dict, after:dict) -> list:
+        '''
+        Ledger entries for the stock the batch set: an adjustment for each
+        existing product whose stock changed, opening stock for new ones.
+        '''
+        movements = []
+        for sku, (product_id, stock) in after.items():
+            if sku in before:
+                change, movement_type, note = stock - before[sku], StockMovement.ADJUSTMENT, "CSV import"
+            else:
+                change, movement_type, note = stock, StockMovement.RECEIPT, "Opening stock (CSV import)"
+            if change:
+                movements.append(StockMovement(
+                    product_id=product_id,
+                    movement_type=movement_type,
+                    quantity=change,
+                    stock_after=stock,
+                    note=note,
+                    created_by=self.user,
+                ))
+        return movements
+
+    def _write_batch(self, batch:dict, report:ImportReport):
+        from reports import stats
+        from .alerts import check_products
+
+        report.batches += 1
+        skus = list(batch.keys())
+        try:
+            with transaction.atomic():
+                self._resolve_categories({data['category'] for _, data in batch.values()})
+
+                existing = {
+                    sku: (product_id, stock) for sku, product_id, stock in
+                    Product.objects.filter(sku__in=skus).values_list('sku', 'id', 'current_stock')
+                }
+
+                products = []
+                for _, data in batch.values():
+                    fields = dict(data)
+                    category = fields.pop('category')
+                    products.append(Product(
+                        category_id=self.categories.get(category) if category else None,
+                        created_by=self.user,
+                        **fields
+                    ))
+
+                # bulk_create skips model signals, so the dashboard figures, the
+                # search index and the catalog version are kept in step here
+                with stats.track(Product.objects.filter(sku__in=skus)):
+                    Product.objects.bulk_create(
+                        products,
+                        update_conflicts=True,
+                        unique_fields=['sku'],
+                        update_fields=UPSERT_FIELDS,
+                    )
+
+                written = {
+                    sku: (product_id, stock) for sku, product_id, stock in
+                    Product.objects.filter(sku__in=skus).values_list('sku', 'id', 'current_stock')
+                }
+                # the import sets stock outright, so the ledger records the difference
+                StockMovement.objects.bulk_create(
+                    self._movements({sku: stock for sku, (_, stock) in existing.items()}, written),
+                    batch_size=500,
+                )
+                product_ids = [product_id for product_id, _ in written.values()]
+                search.index_products(product_ids)
+                versions.bump_objects(Product, [product_id for product_id, _ in existing.values()])
+                check_products(product_ids)
+        except DatabaseError as e:
+            # categories created inside the rolled back transaction are gone too
+            self.categories = dict(Category.objects.values_list('name', 'id'))
+            for line, data in batch.values():
+                report.add_error(line, data['sku'], f"batch rejected by the database: {e}")
+            return
+
+        report.updated += len(existing)
+        report.created += len(batch) - len(existing)
+        autocomplete.invalidate("sku", "product", "category")
+
+
+def import_products(csv_file, user=None, batch_size:int=BATCH_SIZE) -> ImportReport:
+    return ProductImporter(user=user, batch_size=batch_size).run(csv_file)
@@ -1,41 +1,47 @@
-from django.core.management.base import BaseCommand
-from products.models import Product
-from django.db import models
-from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+from products.alerts import check_alerts, last_run_started_at
 
 
 class Command(BaseCommand):
-    help = 'Check and send low stock and expiry notifications'
+    help = 'Check and send low stock and expiry notifications for new or escalated alerts'
 
-    def handle(self, *args, **options):
-        self.stdout.write("Checking notifications...")
-        
-        low_stock_products = Product.objects.filter(
-            current_stock__lte=models.F('min_stock_level')
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode',
+            choices=['digest', 'item'],
+            default='digest',
+            help='digest: one summary email per manager (default). item: one email per product per manager.'
         )
-        
-        low_stock_count = 0
-        for product in low_stock_products:
-            product.send_low_stock_notification()
-            low_stock_count += 1
-        
-        today = date.today()
-        threshold_date = today + timedelta(days=30)
-        
-        expiring_products = Product.objects.filter(
-            is_perishable=True,
-            expiry_date__isnull=False,
-            expiry_date__lte=threshold_date
+        parser.add_argument(
+            '--since',
+            nargs='?',
+            const='last',
+            default=None,
+            help='Only look at products modified since the last run, or since the given ISO datetime.'
         )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Checking notifications...")
+
+        since = None
+        if options['since'] == 'last':
+            since = last_run_started_at()
+            if since is None:
+                self.stdout.write("No previous run found, checking every product")
+        elif options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError(f"Invalid --since datetime: {options['since']}")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
         
-        expiry_count = 0
-        for product in expiring_products:
-            product.send_expiry_notification()
-            expiry_count += 1
+        run = check_alerts(options['mode'], since=since)
         
         self.stdout.write(
             self.style.SUCCESS(
-                f"Notifications sent: {low_stock_count} low stock, {expiry_count} expiry alerts"
+                f"Notifications queued: {len(run.low_stock_products)} low stock, {len(run.expiring_products)} expiry alerts "
+                f"({run.emails_sent} emails; {run.new_alerts} new, {run.escalated_alerts} escalated, {run.cleared_alerts} cleared)"
             )
         )
-
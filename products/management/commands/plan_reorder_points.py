@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from products import planning
+
+
+class Command(BaseCommand):
+    help = 'Recompute every product\'s min_stock_level as a reorder point from its issue history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Show the changes without writing them')
+        parser.add_argument('--lookback-days', type=int, default=planning.LOOKBACK_DAYS, help='Days of issue history to use')
+        parser.add_argument('--recent-days', type=int, default=planning.RECENT_DAYS, help='Days in the moving average used as the demand forecast')
+        parser.add_argument('--lead-time-days', type=float, default=planning.LEAD_TIME_DAYS, help='Supplier lead time in days')
+        parser.add_argument('--service-level', type=float, default=planning.SERVICE_LEVEL, help='Chance of not running out during a lead time, e.g. 0.95')
+        parser.add_argument('--chunk-size', type=int, default=planning.CHUNK_SIZE, help='Products planned per pass')
+        parser.add_argument('--show', type=int, default=50, help='Changes to list')
+
+    def handle(self, *args, **options):
+        if not 0 < options['service_level'] < 1:
+            raise CommandError("--service-level must be between 0 and 1")
+        if options['lookback_days'] < 2 or options['recent_days'] < 1 or options['chunk_size'] < 1:
+            raise CommandError("--lookback-days must be at least 2, --recent-days and --chunk-size at least 1")
+
+        plan = planning.plan_reorder_points(
+            dry_run=options['dry_run'],
+            lookback_days=options['lookback_days'],
+            recent_days=options['recent_days'],
+            lead_time_days=options['lead_time_days'],
+            service_level=options['service_level'],
+            chunk_size=options['chunk_size'],
+            max_changes=options['show'],
+        )
+
+        for change in plan.changes:
+            self.stdout.write(
+                f"  {change['sku']}: {change['old']} -> {change['new']}"
+                f"  ({change['demand']:.2f}/day, safety stock {change['safety_stock']:.1f})"
+            )
+        if plan.changed > len(plan.changes):
+            self.stdout.write(f"  ... and {plan.changed - len(plan.changes)} more")
+
+        summary = (
+            f"{plan.products} products, {plan.with_history} with issue history: "
+            f"{plan.raised} raised, {plan.lowered} lowered, {plan.unchanged} unchanged ({plan.elapsed:.1f}s)"
+        )
+        if plan.dry_run:
+            self.stdout.write(self.style.WARNING(f"Dry run, nothing written. {summary}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Reorder points updated. {summary}"))
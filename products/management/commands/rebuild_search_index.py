@@ -0,0 +1,19 @@
+import time
+from django.core.management.base import BaseCommand
+from products import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text product search index from scratch'
+
+    def handle(self, *args, **options):
+        if not search.is_enabled():
+            self.stdout.write(self.style.WARNING("Full-text index is only used on SQLite, nothing to do"))
+            return
+
+        self.stdout.write("Rebuilding product search index...")
+        started = time.perf_counter()
+        indexed = search.rebuild_index()
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {indexed} products in {time.perf_counter() - started:.2f}s")
+        )
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from products import search
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(search.CREATE_SQL)
+        cursor.execute(search.INSERT_SQL + search.SOURCE_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    from products import search
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(search.DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_alert_state'),
+        ('suppliers', '0002_remove_supplier_address_remove_supplier_city_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:05
+
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_search_index'),
+        ('suppliers', '0002_remove_supplier_address_remove_supplier_city_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='low_stock',
+            field=models.GeneratedField(db_persist=True, expression=models.ExpressionWrapper(models.Q(('current_stock__lte', models.F('min_stock_level'))), output_field=models.BooleanField()), output_field=models.BooleanField()),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stock_deficit',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('min_stock_level'), '-', models.F('current_stock')), output_field=models.IntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('low_stock', True)), fields=['current_stock'], name='product_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('expiry_date__isnull', False), ('is_perishable', True)), fields=['expiry_date'], name='product_perishable_expiry_idx'),
+        ),
+    ]
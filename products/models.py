@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F, Q, ExpressionWrapper
 from django.contrib.auth.models import User
 from suppliers.models import Supplier
 
@@ -33,9 +34,36 @@ class Product(models.Model):
     
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    # computed and stored by the database, so they stay right under save(),
+    # bulk_update() and F() updates alike
+    stock_deficit = models.GeneratedField(
+        expression=F("min_stock_level") - F("current_stock"),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+    low_stock = models.GeneratedField(
+        expression=ExpressionWrapper(Q(current_stock__lte=F("min_stock_level")), output_field=models.BooleanField()),
+        output_field=models.BooleanField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["current_stock"], condition=Q(low_stock=True), name="product_low_stock_idx"),
+            models.Index(fields=["expiry_date"], condition=Q(is_perishable=True, expiry_date__isnull=False), name="product_perishable_expiry_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the row as loaded, so save and delete hooks can diff against it without a query
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
     
     def is_low_stock(self):
         return self.current_stock <= self.min_stock_level
@@ -49,99 +77,117 @@ class Product(models.Model):
         threshold_date = today + timedelta(days=days_threshold)
         return self.expiry_date <= threshold_date
     
-    def send_low_stock_notification(self):
-        if not self.is_low_stock():
-            return
-        
-        from django.core.mail import send_mail
-        from django.conf import settings
-        
-        managers = User.objects.filter(profile__is_manager=True, profile__notification_email__isnull=False).exclude(profile__notification_email='')
-        
-        if not managers:
-            print(f"⚠️  No managers found for low stock notification: {self.name}")
-            return
-        
-        print(f"📧 Found {managers.count()} managers for low stock notification")
-        
-        subject = f"Low Stock Alert: {self.name}"
-        message = f"""
-Low Stock Alert!
-
-Product: {self.name}
-SKU: {self.sku}
-Current Stock: {self.current_stock}
-Minimum Stock Level: {self.min_stock_level}
-Category: {self.category.name if self.category else 'N/A'}
-
-Please restock this item soon.
-        """.strip()
-        
-        emails_sent = 0
-        for manager in managers:
-            try:
-                print(f"📤 Attempting to send email to {manager.profile.notification_email}")
-                result = send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[manager.profile.notification_email],
-                    fail_silently=False
-                )
-                if result:
-                    emails_sent += 1
-                    print(f"✅ Email sent successfully to {manager.profile.notification_email}")
-                else:
-                    print(f"❌ Email failed to send to {manager.profile.notification_email}")
-            except Exception as e:
-                print(f"❌ Error sending email to {manager.profile.notification_email}: {e}")
-        
-        print(f"📧 Low stock notifications sent: {emails_sent}/{managers.count()} managers")
+    def send_low_stock_notification(self, recipients=None):
+        '''Queues a low stock email to every manager in the outbox; returns how many.'''
+        from .notifications import queue_low_stock_notification
+        return queue_low_stock_notification(self, recipients)
     
-    def send_expiry_notification(self):
- 
-        if not self.is_expiring_soon():
-            return
-        
-        from django.core.mail import send_mail
-        from django.conf import settings
-        from datetime import date
-        
-        managers = User.objects.filter(profile__is_manager=True, profile__notification_email__isnull=False).exclude(profile__notification_email='')
-        
-        if not managers:
-            return
-        
-        subject = f"Expiry Alert: {self.name}"
-        message = f"""
-Expiry Alert!
+    def send_expiry_notification(self, recipients=None):
+        '''Queues an expiry email to every manager in the outbox; returns how many.'''
+        from .notifications import queue_expiry_notification
+        return queue_expiry_notification(self, recipients)
 
-Product: {self.name}
-SKU: {self.sku}
-Expiry Date: {self.expiry_date}
-Days Until Expiry: {(self.expiry_date - date.today()).days}
 
-This item is expiring soon. Please take action.
-        """.strip()
-    
-        emails_sent = 0
-        for manager in managers:
-            try:
-                print(f"📤 Attempting to send email to {manager.profile.notification_email}")
-                result = send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[manager.profile.notification_email],
-                    fail_silently=False
-                )
-                if result:
-                    emails_sent += 1
-                    print(f"✅ Email sent successfully to {manager.profile.notification_email}")
-                else:
-                    print(f"❌ Email failed to send to {manager.profile.notification_email}")
-            except Exception as e:
-                print(f"❌ Error sending email to {manager.profile.notification_email}: {e}")
-        
-        print(f"📧 Expiry notifications sent: {emails_sent}/{managers.count()} managers")
-    
+
+class ProductAlert(models.Model):
+    '''
+    Last known alert state of a product, one row per product and alert type.
+
+    check_notifications diffs the products currently in alert against these
+    rows and only notifies when an alert is new or its severity went up.
+    '''
+
+    LOW_STOCK = "low_stock"
+    EXPIRY = "expiry"
+
+    ALERT_TYPE_CHOICES = [
+        (LOW_STOCK, 'Low Stock'),
+        (EXPIRY, 'Expiry'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="alerts")
+    alert_type = models.CharField(max_length=20, choices=ALERT_TYPE_CHOICES)
+    severity = models.PositiveSmallIntegerField(default=1)
+
+    raised_at = models.DateTimeField()
+    notified_at = models.DateTimeField(null=True, blank=True)
+    acknowledged_at = models.DateTimeField(null=True, blank=True)
+    acknowledged_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    cleared_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "alert_type"], name="unique_product_alert_type"),
+        ]
+        indexes = [
+            models.Index(fields=["alert_type", "cleared_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_alert_type_display()} alert for {self.product_id}"
+
+    @property
+    def is_active(self) -> bool:
+        return self.cleared_at is None
+
+    def acknowledge(self, user=None):
+        from django.utils import timezone
+        self.acknowledged_at = timezone.now()
+        self.acknowledged_by = user
+        self.save(update_fields=["acknowledged_at", "acknowledged_by"])
+
+
+class AlertRun(models.Model):
+
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    incremental = models.BooleanField(default=False)
+    new_alerts = models.PositiveIntegerField(default=0)
+    escalated_alerts = models.PositiveIntegerField(default=0)
+    cleared_alerts = models.PositiveIntegerField(default=0)
+    emails_sent = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"Alert run {self.started_at:%Y-%m-%d %H:%M}"
+
+
+class StockMovement(models.Model):
+    '''
+    One change to a product's stock level. The ledger is append only; see
+    products.stock.record_movement for how rows and stock levels are written.
+    '''
+
+    RECEIPT = "receipt"
+    ISSUE = "issue"
+    ADJUSTMENT = "adjustment"
+    TRANSFER = "transfer"
+
+    MOVEMENT_TYPE_CHOICES = [
+        (RECEIPT, 'Receipt'),
+        (ISSUE, 'Issue'),
+        (ADJUSTMENT, 'Adjustment'),
+        (TRANSFER, 'Transfer'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="movements")
+    movement_type = models.CharField(max_length=20, choices=MOVEMENT_TYPE_CHOICES)
+    # signed change applied to current_stock
+    quantity = models.IntegerField()
+    stock_after = models.PositiveIntegerField()
+
+    # the other site for transfers
+    location = models.CharField(max_length=255, blank=True)
+    reference = models.CharField(max_length=100, blank=True)
+    note = models.TextField(blank=True)
+
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["product", "-created_at"]),
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_movement_type_display()} {self.quantity:+d} of {self.product_id}"
@@ -0,0 +1,128 @@
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+
+
+EXPIRY_DAYS_THRESHOLD = 30
+
+
+def get_manager_emails() -> list:
+    '''Notification addresses of every manager, resolved in a single query.'''
+    emails = (
+        User.objects
+        .filter(profile__is_manager=True, profile__notification_email__isnull=False)
+        .exclude(profile__notification_email='')
+        .values_list('profile__notification_email', flat=True)
+        .distinct()
+    )
+    return list(emails)
+
+
+def low_stock_queryset():
+    from .models import Product
+    return Product.objects.filter(low_stock=True).select_related('category')
+
+
+def expiring_queryset(days_threshold:int=EXPIRY_DAYS_THRESHOLD):
+    from .models import Product
+    threshold_date = date.today() + timedelta(days=days_threshold)
+    return Product.objects.filter(
+        is_perishable=True,
+        expiry_date__isnull=False,
+        expiry_date__lte=threshold_date
+    ).select_related('category')
+
+
+def low_stock_message(product) -> tuple:
+    subject = f"Low Stock Alert: {product.name}"
+    message = f"""
+Low Stock Alert!
+
+Product: {product.name}
+SKU: {product.sku}
+Current Stock: {product.current_stock}
+Minimum Stock Level: {product.min_stock_level}
+Category: {product.category.name if product.category else 'N/A'}
+
+Please restock this item soon.
+    """.strip()
+    return subject, message
+
+
+def expiry_message(product) -> tuple:
+    subject = f"Expiry Alert: {product.name}"
+    message = f"""
+Expiry Alert!
+
+Product: {product.name}
+SKU: {product.sku}
+Expiry Date: {product.expiry_date}
+Days Until Expiry: {(product.expiry_date - date.today()).days}
+
+This item is expiring soon. Please take action.
+    """.strip()
+    return subject, message
+
+
+def digest_message(low_stock_products, expiring_products) -> tuple:
+    lines = ["Inventory Alert Digest", ""]
+
+    if low_stock_products:
+        lines.append(f"Low stock ({len(low_stock_products)}):")
+        for product in low_stock_products:
+            lines.append(
+                f"  - {product.name} (SKU {product.sku}): {product.current_stock} in stock, "
+                f"minimum {product.min_stock_level}, category {product.category.name if product.category else 'N/A'}"
+            )
+        lines.append("")
+
+    if expiring_products:
+        today = date.today()
+        lines.append(f"Expiring soon ({len(expiring_products)}):")
+        for product in expiring_products:
+            lines.append(
+                f"  - {product.name} (SKU {product.sku}): expires {product.expiry_date} "
+                f"({(product.expiry_date - today).days} days)"
+            )
+        lines.append("")
+
+    lines.append("Please restock or take action on these items soon.")
+
+    subject = f"Inventory Alerts: {len(low_stock_products)} low stock, {len(expiring_products)} expiring"
+    return subject, "\n".join(lines)
+
+
+def queue_to_managers(subject:str, body:str, recipients:list=None) -> int:
+    '''Writes one outbox message per manager; main.outbox dispatches them later.'''
+    from main.outbox import enqueue_many
+    recipients = get_manager_emails() if recipients is None else recipients
+    return len(enqueue_many([(subject, body, [email]) for email in recipients]))
+
+
+def queue_low_stock_notification(product, recipients:list=None) -> int:
+    if not product.is_low_stock():
+        return 0
+    subject, body = low_stock_message(product)
+    return queue_to_managers(subject, body, recipients)
+
+
+def queue_expiry_notification(product, recipients:list=None) -> int:
+    if not product.is_expiring_soon():
+        return 0
+    subject, body = expiry_message(product)
+    return queue_to_managers(subject, body, recipients)
+
+
+def queue_digest(low_stock_products=None, expiring_products=None, recipients:list=None) -> int:
+    if not low_stock_products and not expiring_products:
+        return 0
+    subject, body = digest_message(low_stock_products or [], expiring_products or [])
+    return queue_to_managers(subject, body, recipients)
+
+
+def queue_item_notifications(low_stock_products=(), expiring_products=(), recipients:list=None) -> int:
+    '''One message per product per manager, for urgent cases; still one recipient lookup.'''
+    from main.outbox import enqueue_many
+    recipients = get_manager_emails() if recipients is None else recipients
+    messages = [low_stock_message(product) for product in low_stock_products]
+    messages += [expiry_message(product) for product in expiring_products]
+    return len(enqueue_many([(subject, body, [email]) for subject, body in messages for email in recipients]))
@@ -0,0 +1,182 @@
+import math
+import time
+from datetime import datetime, timedelta
+from statistics import NormalDist
+import numpy as np
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from main import versions
+from .models import Product, StockMovement
+
+
+LOOKBACK_DAYS = 90
+RECENT_DAYS = 28
+LEAD_TIME_DAYS = 7
+SERVICE_LEVEL = 0.95
+
+# products planned per pass: the demand matrix is CHUNK_SIZE x LOOKBACK_DAYS floats (~14 MB)
+CHUNK_SIZE = 20000
+# keeps IN (...) lists under SQLite's bound parameter limit
+ID_CHUNK_SIZE = 900
+MAX_REPORTED_CHANGES = 500
+
+
+class ReorderPlan:
+
+    def __init__(self, dry_run:bool, max_changes:int=MAX_REPORTED_CHANGES):
+        self.dry_run = dry_run
+        self.max_changes = max_changes
+        self.products = 0
+        self.with_history = 0
+        self.raised = 0
+        self.lowered = 0
+        self.changes = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_change(self, sku:str, old:int, new:int, demand:float, safety_stock:float):
+        if new > old:
+            self.raised += 1
+        else:
+            self.lowered += 1
+        if len(self.changes) < self.max_changes:
+            self.changes.append({"sku": sku, "old": old, "new": new, "demand": demand, "safety_stock": safety_stock})
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def changed(self) -> int:
+        return self.raised + self.lowered
+
+    @property
+    def unchanged(self) -> int:
+        return self.with_history - self.changed
+
+
+def reorder_points(demand:np.ndarray, recent_days:int, lead_time_days:float, service_level:float):
+    '''
+    Reorder point and safety stock per row of a products x days demand matrix.
+
+    Demand during the lead time is forecast from the moving average of the
+    last recent_days; safety stock covers its variability over the whole
+    window at the service level: z * sigma_daily * sqrt(lead time).
+    '''
+    z = NormalDist().inv_cdf(service_level)
+    forecast = demand[:, -recent_days:].mean(axis=1)
+    sigma = demand.std(axis=1, ddof=1) if demand.shape[1] > 1 else np.zeros(len(demand))
+    safety_stock = z * sigma * math.sqrt(lead_time_days)
+    return forecast, safety_stock, np.ceil(forecast * lead_time_days + safety_stock).astype(np.int64)
+
+
+def _product_chunks(chunk_size:int):
+    '''(ids, skus, min levels) for successive id ranges, read with keyset pagination.'''
+    last_id = 0
+    while True:
+        rows = list(
+            Product.objects.filter(id__gt=last_id).order_by("id")
+            .values_list("id", "sku", "min_stock_level")[:chunk_size]
+        )
+        if not rows:
+            return
+        ids, skus, levels = zip(*rows)
+        yield np.array(ids, dtype=np.int64), skus, np.array(levels, dtype=np.int64)
+        last_id = ids[-1]
+
+
+def demand_matrix(ids:np.ndarray, start:datetime, days:int) -> np.ndarray:
+    '''Units issued per product (rows, in ids order) per day since start, summed in SQL.'''
+    matrix = np.zeros((len(ids), days))
+    rows = (
+        StockMovement.objects
+        .filter(
+            movement_type=StockMovement.ISSUE,
+            product_id__gte=int(ids[0]), product_id__lte=int(ids[-1]),
+            created_at__gte=start, created_at__lt=start + timedelta(days=days),
+        )
+        .annotate(day=TruncDate("created_at"))
+        .values_list("product_id", "day")
+        .annotate(units=Sum("quantity"))
+        .order_by()
+    )
+    first_day = timezone.localdate(start)
+    product_ids, day_index, units = [], [], []
+    for product_id, day, quantity in rows.iterator(chunk_size=10000):
+        product_ids.append(product_id)
+        day_index.append((day - first_day).days)
+        units.append(-quantity)
+    if product_ids:
+        positions = np.searchsorted(ids, product_ids)
+        np.add.at(matrix, (positions, np.clip(day_index, 0, days - 1)), units)
+    return matrix
+
+
+def write_levels(ids:np.ndarray, levels:np.ndarray, now) -> int:
+    '''
+    Bulk update of min_stock_level, one UPDATE ... WHERE id IN (...) per level.
+
+    Products share few distinct levels, so this is far fewer statements than
+    rows, and skips the per-row CASE WHEN that bulk_update() builds in Python.
+    '''
+    order = np.argsort(levels, kind="stable")
+    ids, levels = ids[order], levels[order]
+    boundaries = np.flatnonzero(np.diff(levels)) + 1
+    updated = 0
+    for group_ids, group_levels in zip(np.split(ids, boundaries), np.split(levels, boundaries)):
+        group_ids = group_ids.tolist()
+        for i in range(0, len(group_ids), ID_CHUNK_SIZE):
+            updated += Product.objects.filter(id__in=group_ids[i:i + ID_CHUNK_SIZE]).update(
+                min_stock_level=int(group_levels[0]), updated_at=now
+            )
+    return updated
+
+
+def plan_reorder_points(
+    dry_run:bool=False,
+    lookback_days:int=LOOKBACK_DAYS,
+    recent_days:int=RECENT_DAYS,
+    lead_time_days:float=LEAD_TIME_DAYS,
+    service_level:float=SERVICE_LEVEL,
+    chunk_size:int=CHUNK_SIZE,
+    max_changes:int=MAX_REPORTED_CHANGES,
+) -> ReorderPlan:
+    '''
+    Sets min_stock_level to the reorder point computed from the issue history.
+
+    Products are planned chunk_size at a time, so memory stays bounded
+    however large the catalog is. Products without any issue in the window
+    keep their level. With dry_run nothing is written and the plan lists
+    the changes it would make.
+    '''
+    from reports import stats
+
+    plan = ReorderPlan(dry_run, max_changes)
+    today = timezone.localdate()
+    start = timezone.make_aware(datetime.combine(today - timedelta(days=lookback_days), datetime.min.time()))
+    recent_days = min(recent_days, lookback_days)
+    now = timezone.now()
+
+    for ids, skus, levels in _product_chunks(chunk_size):
+        plan.products += len(ids)
+        demand = demand_matrix(ids, start, lookback_days)
+
+        has_history = demand.any(axis=1)
+        forecast, safety_stock, new_levels = reorder_points(demand, recent_days, lead_time_days, service_level)
+        changed = np.flatnonzero(has_history & (new_levels != levels))
+        plan.with_history += int(has_history.sum())
+
+        for index in changed:
+            plan.add_change(skus[index], int(levels[index]), int(new_levels[index]), float(forecast[index]), float(safety_stock[index]))
+
+        if dry_run or not len(changed):
+            continue
+
+        # queryset updates skip model signals; low stock counts on the dashboard depend on the levels
+        with transaction.atomic(), stats.track(Product.objects.filter(id__gte=int(ids[0]), id__lte=int(ids[-1]))):
+            write_levels(ids[changed], new_levels[changed], now)
+            versions.bump_objects(Product, ids[changed].tolist())
+
+    return plan.finish()
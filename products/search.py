@@ -0,0 +1,181 @@
+import re
+from django.db import connection
+from django.db.models import Q
+from .models import Product
+
+
+FTS_TABLE = "products_product_fts"
+
+# bm25 weights for name, sku, description, category, suppliers
+COLUMN_WEIGHTS = (10.0, 8.0, 1.0, 3.0, 2.0)
+
+ID_CHUNK_SIZE = 900
+
+CREATE_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    name, sku, description, category, suppliers,
+    tokenize = "unicode61 remove_diacritics 2 tokenchars '-_'",
+    prefix = '2 3'
+)
+"""
+
+DROP_SQL = f"DROP TABLE IF EXISTS {FTS_TABLE}"
+
+# one row per product with its category and supplier names flattened in
+SOURCE_SQL = """
+SELECT p.id, p.name, p.sku, p.description, COALESCE(c.name, ''),
+       COALESCE((SELECT group_concat(s.name, ' ')
+                 FROM products_product_suppliers ps
+                 JOIN suppliers_supplier s ON s.id = ps.supplier_id
+                 WHERE ps.product_id = p.id), '')
+FROM products_product p
+LEFT JOIN products_category c ON c.id = p.category_id
+"""
+
+INSERT_SQL = f"INSERT INTO {FTS_TABLE} (rowid, name, sku, description, category, suppliers) "
+
+TOKEN_RE = re.compile(r"[\w\-]+", re.UNICODE)
+
+
+def is_enabled() -> bool:
+    return connection.vendor == "sqlite"
+
+
+def _chunks(ids:list, size:int=ID_CHUNK_SIZE):
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def create_index(cursor=None):
+    if not is_enabled():
+        return
+    if cursor is None:
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_SQL)
+    else:
+        cursor.execute(CREATE_SQL)
+
+
+def rebuild_index() -> int:
+    '''Drops and refills the whole index in one INSERT ... SELECT.'''
+    if not is_enabled():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(DROP_SQL)
+        cursor.execute(CREATE_SQL)
+        cursor.execute(INSERT_SQL + SOURCE_SQL)
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def index_products(product_ids) -> None:
+    '''(Re)indexes the given products, e.g. after a save or a bulk import batch.'''
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(product_ids):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", chunk)
+            cursor.execute(INSERT_SQL + SOURCE_SQL + f" WHERE p.id IN ({placeholders})", chunk)
+
+
+def remove_products(product_ids) -> None:
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(product_ids):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", chunk)
+
+
+def build_match_query(text:str) -> str:
+    '''
+    Turns user input into an FTS5 query where every word must match as a prefix.
+
+    Words are quoted so characters like '-' or ':' are never read as FTS
+    operators.
+    '''
+    tokens = TOKEN_RE.findall(text.lower())
+    return " ".join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+
+
+class SearchResults:
+    '''
+    Lazy, sliceable search result set, so it can be handed to Paginator.
+
+    count() and each page are separate queries against the FTS table; only
+    the products of the requested page are loaded from products_product.
+    '''
+
+    def __init__(self, text:str, order_by:str=None):
+        self.text = text
+        self.match = build_match_query(text)
+        self.order_by = order_by
+        self._count = None
+
+    def _fallback_queryset(self):
+        words = TOKEN_RE.findall(self.text)
+        queryset = Product.objects.all()
+        for word in words:
+            queryset = queryset.filter(
+                Q(name__icontains=word) | Q(sku__icontains=word) | Q(description__icontains=word)
+                | Q(category__name__icontains=word) | Q(suppliers__name__icontains=word)
+            )
+        return queryset.distinct().order_by("-created_at" if self.order_by == "created_at" else "name")
+
+    def count(self) -> int:
+        if self._count is None:
+            if not self.match:
+                self._count = 0
+            elif not is_enabled():
+                self._count = self._fallback_queryset().count()
+            else:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [self.match])
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def _ids(self, offset:int, limit:int) -> list:
+        weights = ", ".join(str(weight) for weight in COLUMN_WEIGHTS)
+        if self.order_by:
+            # ordering other than relevance is done on the product table
+            order = "p.name" if self.order_by == "name" else "p.created_at DESC"
+            sql = (
+                f"SELECT p.id FROM {FTS_TABLE} f JOIN products_product p ON p.id = f.rowid "
+                f"WHERE f.{FTS_TABLE} MATCH %s ORDER BY {order}, p.id LIMIT %s OFFSET %s"
+            )
+        else:
+            sql = (
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, {weights}), rowid LIMIT %s OFFSET %s"
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [self.match, limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+
+        start = key.start or 0
+        stop = key.stop if key.stop is not None else self.count()
+        if not self.match or stop <= start:
+            return []
+
+        if not is_enabled():
+            return list(self._fallback_queryset()[start:stop])
+
+        ids = self._ids(start, stop - start)
+        products = Product.objects.select_related("category").in_bulk(ids)
+        return [products[product_id] for product_id in ids if product_id in products]
+
+
+def search_products(text:str, order_by:str=None) -> SearchResults:
+    if order_by not in ("name", "created_at"):
+        order_by = None
+    return SearchResults(text, order_by)
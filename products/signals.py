@@ -0,0 +1,87 @@
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from suppliers.models import Supplier
+from .models import Product, Category
+from . import search, autocomplete
+
+
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver(m2m_changed, sender=Product.suppliers.through)
+def index_product_suppliers(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear", "pre_clear"):
+        return
+    if reverse:
+        # supplier.product_set changed: pk_set holds product ids
+        if action == "pre_clear":
+            instance._cleared_product_ids = list(instance.product_set.values_list("id", flat=True))
+            return
+        product_ids = pk_set if action != "post_clear" else getattr(instance, "_cleared_product_ids", [])
+        search.index_products(product_ids or [])
+    elif action != "pre_clear":
+        search.index_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def index_category_products(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        search.index_products(Product.objects.filter(category=instance).values_list("id", flat=True))
+
+
+@receiver(post_save, sender=Supplier)
+def index_supplier_products(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        search.index_products(instance.product_set.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=Supplier)
+def remember_supplier_products(sender, instance, **kwargs):
+    # the m2m rows are removed with the supplier, so collect the ids first
+    instance._product_ids = list(instance.product_set.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Supplier)
+def index_deleted_supplier_products(sender, instance, **kwargs):
+    search.index_products(getattr(instance, "_product_ids", []))
+
+
+@receiver(post_save, sender=Product)
+def update_product_autocomplete(sender, instance, raw=False, **kwargs):
+    if not raw:
+        autocomplete.product_saved(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_autocomplete(sender, instance, **kwargs):
+    autocomplete.product_deleted(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def update_category_autocomplete(sender, instance, raw=False, **kwargs):
+    if not raw:
+        autocomplete.INDEXES["category"].update(instance.pk, instance.name, instance.name)
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_autocomplete(sender, instance, **kwargs):
+    autocomplete.INDEXES["category"].remove(instance.pk)
+
+
+@receiver(post_save, sender=Supplier)
+def update_supplier_autocomplete(sender, instance, raw=False, **kwargs):
+    if not raw:
+        autocomplete.INDEXES["supplier"].update(instance.pk, instance.name, instance.name)
+
+
+@receiver(post_delete, sender=Supplier)
+def remove_supplier_autocomplete(sender, instance, **kwargs):
+    autocomplete.INDEXES["supplier"].remove(instance.pk)
@@ -0,0 +1,245 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from main import versions
+from .models import Product, StockMovement
+
+
+MAX_BULK_ITEMS = 5000
+
+# delta and absolute stay well inside SQLite's 64-bit integers, summed over a batch too
+MAX_QUANTITY = 2 ** 31
+
+# keeps IN (...) lists under SQLite's bound parameter limit
+ID_CHUNK_SIZE = 900
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+class BulkItemError(Exception):
+    pass
+
+
+def signed_quantity(movement_type:str, quantity:int) -> int:
+    '''Receipts always add and issues always remove; adjustments and transfers keep their sign.'''
+    if movement_type == StockMovement.RECEIPT:
+        return abs(quantity)
+    if movement_type == StockMovement.ISSUE:
+        return -abs(quantity)
+    return quantity
+
+
+def record_movement(product_id:int, movement_type:str, quantity:int, user=None, location:str="", reference:str="", note:str="") -> StockMovement:
+    '''
+    Applies a signed stock change to a product and writes it to the ledger.
+
+    The stock moves with one conditional UPDATE
+    (current_stock = current_stock + quantity WHERE current_stock >= -quantity),
+    so concurrent movements never overwrite each other and stock can't go
+    below zero: InsufficientStock is raised instead and nothing is written.
+    The product's low stock alert is updated in the same transaction.
+    '''
+    from reports import stats
+    from .alerts import check_low_stock
+
+    if quantity == 0:
+        raise ValueError("a stock movement needs a non-zero quantity")
+
+    with transaction.atomic():
+        # select_for_update is a no-op on SQLite: the figures read around the update are
+        # this change's alone because transaction_mode IMMEDIATE takes the write lock at BEGIN
+        if not list(Product.objects.select_for_update().filter(pk=product_id).values_list("id", flat=True)):
+            raise Product.DoesNotExist(f"no product with id {product_id}")
+
+        rows = Product.objects.filter(pk=product_id)
+        with stats.track(rows):
+            updated = rows.filter(current_stock__gte=-quantity).update(
+                current_stock=F("current_stock") + quantity,
+                updated_at=timezone.now(),
+            )
+        if not updated:
+            raise InsufficientStock(f"not enough stock to remove {-quantity} units")
+
+        product = rows.get()
+        movement = StockMovement.objects.create(
+            product=product,
+            movement_type=movement_type,
+            quantity=quantity,
+            stock_after=product.current_stock,
+            location=location,
+            reference=reference,
+            note=note,
+            created_by=user,
+        )
+        versions.bump_objects(Product, [product_id])
+
+        # opens, escalates or clears the ProductAlert row, so check_alerts won't notify it again
+        check_low_stock([product_id])
+
+    return movement
+
+
+def record_opening_stock(product:Product, user=None):
+    '''Ledger entry for the stock a product was created with.'''
+    if product.current_stock:
+        StockMovement.objects.create(
+            product=product,
+            movement_type=StockMovement.RECEIPT,
+            quantity=product.current_stock,
+            stock_after=product.current_stock,
+            note="Opening stock",
+            created_by=user,
+        )
+
+
+def parse_bulk_item(raw) -> dict:
+    '''Validates one {"sku", "delta" | "absolute", "type"?, "reference"?} item.'''
+    if not isinstance(raw, dict):
+        raise BulkItemError("item must be an object")
+
+    sku = raw.get("sku")
+    if not isinstance(sku, str) or not sku.strip():
+        raise BulkItemError("sku is required")
+
+    if ("delta" in raw) == ("absolute" in raw):
+        raise BulkItemError("give exactly one of delta or absolute")
+    field = "delta" if "delta" in raw else "absolute"
+    value = raw[field]
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise BulkItemError(f"{field} must be a whole number")
+    if abs(value) >= MAX_QUANTITY:
+        raise BulkItemError(f"{field} must be below {MAX_QUANTITY}")
+    if field == "delta" and value == 0:
+        raise BulkItemError("delta cannot be zero")
+    if field == "absolute" and value < 0:
+        raise BulkItemError("absolute cannot be negative")
+
+    movement_type = raw.get("type")
+    if movement_type is not None and movement_type not in dict(StockMovement.MOVEMENT_TYPE_CHOICES):
+        raise BulkItemError(f"unknown movement type '{movement_type}'")
+    if field == "delta" and signed_quantity(movement_type, value) != value:
+        raise BulkItemError(f"a {movement_type} cannot have a delta of {value}")
+
+    return {
+        "sku": sku.strip(),
+        "delta": value if field == "delta" else None,
+        "absolute": value if field == "absolute" else None,
+        "type": movement_type,
+        "reference": str(raw.get("reference", ""))[:100],
+    }
+
+
+def _default_type(item:dict, change:int) -> str:
+    if item["type"]:
+        return item["type"]
+    if item["absolute"] is not None:
+        return StockMovement.ADJUSTMENT
+    return StockMovement.RECEIPT if change > 0 else StockMovement.ISSUE
+
+
+def apply_changes(changes:dict, now) -> int:
+    '''
+    Adds {product id: change} to current_stock, refusing any row that would go negative.
+
+    Rows sharing a change are moved by one conditional F() UPDATE, so a batch
+    of scanner deltas (mostly +1/-1) takes a few statements, not one per row.
+    Returns the number of rows updated.
+    '''
+    by_change = {}
+    for product_id, change in changes.items():
+        by_change.setdefault(change, []).append(product_id)
+
+    updated = 0
+    for change, product_ids in by_change.items():
+        for i in range(0, len(product_ids), ID_CHUNK_SIZE):
+            updated += Product.objects.filter(
+                id__in=product_ids[i:i + ID_CHUNK_SIZE], current_stock__gte=-change
+            ).update(current_stock=F("current_stock") + change, updated_at=now)
+    return updated
+
+
+def apply_bulk(raw_items:list, user=None, all_or_nothing:bool=False) -> tuple:
+    '''
+    Applies a batch of stock changes in one transaction.
+
+    Returns (results, applied): one result per item, in order, and whether
+    anything was written. Items with an unknown SKU, bad values or not enough
+    stock are rejected on their own unless all_or_nothing is set, in which
+    case one bad item leaves the whole batch unapplied. Items for the same
+    SKU apply in order.
+    '''
+    from reports import stats
+    from .alerts import check_low_stock
+
+    results = [None] * len(raw_items)
+    parsed = []
+    for index, raw in enumerate(raw_items):
+        try:
+            parsed.append((index, parse_bulk_item(raw)))
+        except BulkItemError as e:
+            sku = raw.get("sku") if isinstance(raw, dict) else None
+            results[index] = {"index": index, "sku": sku, "status": "error", "error": str(e)}
+
+    with transaction.atomic():
+        # one IN query for every SKU in the batch, locking the rows until commit
+        products = dict(
+            (sku, (product_id, stock)) for sku, product_id, stock in
+            Product.objects.select_for_update()
+            .filter(sku__in={item["sku"] for _, item in parsed})
+            .values_list("sku", "id", "current_stock")
+        )
+
+        levels = {sku: stock for sku, (_, stock) in products.items()}
+        movements = []
+        for index, item in parsed:
+            sku = item["sku"]
+            if sku not in products:
+                results[index] = {"index": index, "sku": sku, "status": "error", "error": "unknown SKU"}
+                continue
+            before = levels[sku]
+            after = item["absolute"] if item["absolute"] is not None else before + item["delta"]
+            if after < 0:
+                results[index] = {"index": index, "sku": sku, "status": "error", "error": f"insufficient stock: {before} available"}
+                continue
+            if item["type"] and signed_quantity(item["type"], after - before) != after - before:
+                results[index] = {"index": index, "sku": sku, "status": "error", "error": f"a {item['type']} cannot change stock by {after - before}"}
+                continue
+
+            levels[sku] = after
+            results[index] = {"index": index, "sku": sku, "status": "ok", "change": after - before, "stock": after}
+            if after != before:
+                movements.append(StockMovement(
+                    product_id=products[sku][0],
+                    movement_type=_default_type(item, after - before),
+                    quantity=after - before,
+                    stock_after=after,
+                    reference=item["reference"],
+                    created_by=user,
+                ))
+
+        if all_or_nothing and any(result["status"] == "error" for result in results):
+            for result in results:
+                if result["status"] == "ok":
+                    result["status"] = "not_applied"
+            return results, False
+
+        changes = {
+            product_id: levels[sku] - stock
+            for sku, (product_id, stock) in products.items() if levels[sku] != stock
+        }
+        if not changes:
+            return results, False
+
+        # queryset updates skip model signals, so the dashboard figures are kept in step here
+        with stats.track(Product.objects.filter(id__in=list(changes))):
+            updated = apply_changes(changes, timezone.now())
+        if updated != len(changes):
+            raise InsufficientStock("stock levels changed while the batch was applied")
+
+        StockMovement.objects.bulk_create(movements, batch_size=500)
+        versions.bump_objects(Product, changes.keys())
+        check_low_stock(changes.keys())
+
+    return results, True
@@ -1,3 +1,647 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import threading
+from datetime import date, timedelta
+from io import BytesIO
+from unittest import mock
+import numpy as np
+from django.db import connection
+from django.db.models import F
+from django.contrib.auth.models import Permission, User
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from django.urls import reverse
+from accounts.models import Profile
+from main import outbox, versions
+from main.models import OutboxMessage
+from suppliers.models import Supplier
+from .models import Product, Category, ProductAlert, StockMovement
+from . import alerts, autocomplete, notifications, planning, search, stock
+from .exporter import export_products
+from .importer import import_products
 
-# Create your tests here.
+
+class StockMovementConcurrencyTest(TransactionTestCase):
+    '''Many threads moving stock of one SKU at once must not lose a single update.'''
+
+    THREADS = 8
+    MOVES_PER_THREAD = 25
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="Hammered", description="", sku="CONC-1",
+            cost_price=1, selling_price=2, current_stock=0, min_stock_level=0,
+        )
+
+    def run_threads(self, target):
+        errors = []
+
+        def worker(index):
+            try:
+                target(index)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_concurrent_receipts_are_all_applied(self):
+        def receive(index):
+            for _ in range(self.MOVES_PER_THREAD):
+                stock.record_movement(self.product.id, StockMovement.RECEIPT, 1)
+
+        errors = self.run_threads(receive)
+
+        self.assertEqual(errors, [])
+        total = self.THREADS * self.MOVES_PER_THREAD
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.current_stock, total)
+        self.assertEqual(StockMovement.objects.filter(product=self.product).count(), total)
+        # every movement saw a distinct stock level, so none was applied on a stale value
+        stock_levels = list(StockMovement.objects.values_list("stock_after", flat=True))
+        self.assertEqual(sorted(stock_levels), list(range(1, total + 1)))
+
+    def test_concurrent_issues_never_go_negative(self):
+        available = self.THREADS * self.MOVES_PER_THREAD // 2
+        Product.objects.filter(pk=self.product.pk).update(current_stock=available)
+        refused = []
+
+        def issue(index):
+            for _ in range(self.MOVES_PER_THREAD):
+                try:
+                    stock.record_movement(self.product.id, StockMovement.ISSUE, -1)
+                except stock.InsufficientStock:
+                    refused.append(index)
+
+        errors = self.run_threads(issue)
+
+        self.assertEqual(errors, [])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.current_stock, 0)
+        self.assertEqual(StockMovement.objects.count(), available)
+        self.assertEqual(len(refused), self.THREADS * self.MOVES_PER_THREAD - available)
+
+
+class StockMovementTest(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="Widget", description="", sku="W-1",
+            cost_price=1, selling_price=2, current_stock=5, min_stock_level=2,
+        )
+
+    def test_movement_updates_stock_and_ledger(self):
+        movement = stock.record_movement(self.product.id, StockMovement.ADJUSTMENT, -3, reference="count")
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.current_stock, 2)
+        self.assertEqual(movement.stock_after, 2)
+        self.assertEqual(movement.quantity, -3)
+
+    def test_insufficient_stock_writes_nothing(self):
+        with self.assertRaises(stock.InsufficientStock):
+            stock.record_movement(self.product.id, StockMovement.ISSUE, -6)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.current_stock, 5)
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_signed_quantity(self):
+        self.assertEqual(stock.signed_quantity(StockMovement.RECEIPT, -4), 4)
+        self.assertEqual(stock.signed_quantity(StockMovement.ISSUE, 4), -4)
+        self.assertEqual(stock.signed_quantity(StockMovement.TRANSFER, -4), -4)
+
+    def test_low_stock_movement_opens_one_alert(self):
+        manager = User.objects.create_user("manager", email="manager@example.com")
+        Profile.objects.create(user=manager, is_manager=True, notification_email=manager.email)
+
+        stock.record_movement(self.product.id, StockMovement.ISSUE, -3)
+        stock.record_movement(self.product.id, StockMovement.ISSUE, -1)
+
+        self.assertEqual(ProductAlert.objects.filter(product=self.product, cleared_at__isnull=True).count(), 1)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        # the scheduled check finds the alert already open and stays quiet
+        run = alerts.check_alerts()
+        self.assertEqual(run.new_alerts, 0)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    def test_bulk_rejects_out_of_range_values(self):
+        results, applied = stock.apply_bulk([
+            {"sku": "W-1", "delta": 10 ** 30},
+            {"sku": "W-1", "absolute": 2 ** 31},
+            {"sku": "W-1", "delta": 1},
+        ])
+
+        self.assertTrue(applied)
+        self.assertEqual([result["status"] for result in results], ["error", "error", "ok"])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.current_stock, 6)
+
+
+class CheckAlertsTest(TestCase):
+
+    def setUp(self):
+        manager = User.objects.create_user("manager", email="manager@example.com")
+        Profile.objects.create(user=manager, is_manager=True, notification_email=manager.email)
+        for sku in ("A-1", "B-1"):
+            Product.objects.create(name=sku, sku=sku, cost_price=1, selling_price=2, current_stock=1, min_stock_level=5)
+
+    def test_alerts_are_queued_not_sent(self):
+        for mode, queued in (("digest", 1), ("item", 2)):
+            with self.subTest(mode):
+                ProductAlert.objects.all().delete()
+                OutboxMessage.objects.all().delete()
+                mail.outbox = []
+
+                run = alerts.check_alerts(mode)
+
+                self.assertEqual(run.emails_sent, queued)
+                self.assertEqual(OutboxMessage.objects.count(), queued)
+                self.assertEqual(mail.outbox, [])
+                outbox.drain()
+                self.assertEqual(len(mail.outbox), queued)
+
+    def test_product_notifications_go_through_the_outbox(self):
+        product = Product.objects.get(sku="A-1")
+        self.assertEqual(product.send_low_stock_notification(), 1)
+        self.assertEqual(product.send_expiry_notification(), 0)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(OutboxMessage.objects.get().subject, "Low Stock Alert: A-1")
+
+
+class ProductUpdateAlertsTest(TestCase):
+
+    def setUp(self):
+        manager = User.objects.create_user("manager", email="manager@example.com")
+        Profile.objects.create(user=manager, is_manager=True, notification_email=manager.email)
+        self.staff = User.objects.create_user("staff", is_staff=True)
+        self.staff.user_permissions.add(Permission.objects.get(codename="change_product"))
+        self.product = Product.objects.create(
+            name="Yogurt", description="", sku="Y-1", cost_price=1, selling_price=2,
+            current_stock=20, min_stock_level=5, is_perishable=True, expiry_date=date.today() + timedelta(days=60),
+            category=Category.objects.create(name="Dairy"),
+        )
+        self.supplier = Supplier.objects.create(name="Farm", email="farm@example.com")
+
+    def edit(self, **changes):
+        data = {
+            "name": "Yogurt", "description": "plain", "sku": "Y-1", "cost_price": "1", "selling_price": "2",
+            "category": self.product.category_id, "suppliers": [self.supplier.id], "min_stock_level": "5", "is_perishable": "on", "expiry_date": self.product.expiry_date.isoformat(),
+        }
+        data.update(changes)
+        self.client.force_login(self.staff)
+        return self.client.post(reverse("products:product_update_view", args=[self.product.id]), data)
+
+    def test_alerts_fire_on_state_changes_only(self):
+        self.edit(description="creamy")
+        self.assertEqual(OutboxMessage.objects.count(), 0)
+
+        soon = (date.today() + timedelta(days=10)).isoformat()
+        self.edit(expiry_date=soon)
+        self.edit(expiry_date=soon, description="still expiring")
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+        self.edit(expiry_date=soon, min_stock_level="50")
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+        self.assertIn("1 low stock", OutboxMessage.objects.latest("id").subject)
+
+
+class ImportPricesTest(TestCase):
+
+    def test_out_of_range_prices_are_row_errors(self):
+        csv_file = BytesIO(
+            b"name,sku,cost_price,selling_price\n"
+            b"Good,G-1,1.5,2\n"
+            b"Not a number,N-1,NaN,2\n"
+            b"Infinite,I-1,1,Infinity\n"
+            b"Too large,L-1,100000000,2\n"
+        )
+        report = import_products(csv_file)
+
+        self.assertEqual(report.created, 1)
+        self.assertEqual([error["sku"] for error in report.errors], ["N-1", "I-1", "L-1"])
+        self.assertEqual(Product.objects.get().sku, "G-1")
+
+
+class ImportLedgerTest(TestCase):
+
+    def setUp(self):
+        manager = User.objects.create_user("manager", email="manager@example.com")
+        Profile.objects.create(user=manager, is_manager=True, notification_email=manager.email)
+        Product.objects.create(name="Old", description="", sku="O-1", cost_price=1, selling_price=2, current_stock=10, min_stock_level=5)
+
+    def test_stock_changes_go_through_the_ledger_and_alerts(self):
+        report = import_products(BytesIO(
+            b"name,sku,cost_price,selling_price,current_stock,min_stock_level\n"
+            b"Old,O-1,1,2,3,5\n"
+            b"New,N-1,1,2,8,5\n"
+            b"Empty,E-1,1,2,0,5\n"
+        ))
+        self.assertEqual((report.created, report.updated), (2, 1))
+
+        movements = {m.product.sku: (m.movement_type, m.quantity, m.stock_after) for m in StockMovement.objects.select_related("product")}
+        self.assertEqual(movements, {
+            "O-1": (StockMovement.ADJUSTMENT, -7, 3),
+            "N-1": (StockMovement.RECEIPT, 8, 8),
+        })
+        self.assertEqual(
+            set(ProductAlert.objects.filter(cleared_at__isnull=True).values_list("product__sku", flat=True)),
+            {"O-1", "E-1"},
+        )
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+        # the same file again changes nothing, so nothing more is written or sent
+        import_products(BytesIO(
+            b"name,sku,cost_price,selling_price,current_stock,min_stock_level\n"
+            b"Old,O-1,1,2,3,5\n"
+        ))
+        self.assertEqual(StockMovement.objects.count(), 2)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+
+class ExportTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        dairy = Category.objects.create(name="Dairy")
+        Product.objects.create(name="Milk", description="", sku="M-1", category=dairy, cost_price=1, selling_price=2,
+                               current_stock=1, min_stock_level=5, is_perishable=True, expiry_date=date(2030, 1, 2))
+        Product.objects.create(name="Salt", description="", sku="S-1", cost_price="0.50", selling_price=1, current_stock=50)
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+
+    def rows(self, chunks) -> list:
+        return list(csv.reader(b"".join(chunks).decode().splitlines()))
+
+    def test_columns_and_filters(self):
+        with self.assertNumQueries(1):
+            rows = self.rows(export_products())
+        self.assertEqual(rows[0][:3], ["Name", "Description", "SKU"])
+        self.assertEqual(rows[1], ["Milk", "", "M-1", "Dairy", "1.00", "2.00", "1", "5", "Yes", "2030-01-02"])
+        self.assertEqual(rows[2][3], "")
+
+        self.assertEqual(self.rows(export_products(["sku", "current_stock"], low_stock=True)), [["SKU", "Current Stock"], ["M-1", "1"]])
+        self.assertEqual(len(self.rows(export_products(["sku"], perishable=True))), 2)
+
+    def test_view_streams_gzip(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("products:export_products_csv"), {"gzip": "1", "columns": "sku,bogus"})
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertTrue(response.streaming)
+        body = gzip.decompress(b"".join(response.streaming_content)).decode()
+        self.assertEqual(body.splitlines(), ["SKU", "M-1", "S-1"])
+
+
+class DigestTest(TestCase):
+
+    def setUp(self):
+        for name, email in (("a", "a@example.com"), ("b", "b@example.com"), ("c", "")):
+            user = User.objects.create_user(name, email=email)
+            Profile.objects.create(user=user, is_manager=True, notification_email=email)
+        Profile.objects.create(user=User.objects.create_user("clerk"), notification_email="clerk@example.com")
+        Product.objects.create(name="Milk", description="", sku="M-1", cost_price=1, selling_price=2, current_stock=1, min_stock_level=5)
+        Product.objects.create(name="Eggs", description="", sku="E-1", cost_price=1, selling_price=2, current_stock=0, min_stock_level=5,
+                               is_perishable=True, expiry_date=date.today() + timedelta(days=3))
+
+    def test_manager_emails_in_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(sorted(notifications.get_manager_emails()), ["a@example.com", "b@example.com"])
+
+    def test_one_digest_per_manager_over_one_connection(self):
+        low = list(notifications.low_stock_queryset().order_by("sku"))
+        expiring = list(notifications.expiring_queryset())
+        subject, body = notifications.digest_message(low, expiring)
+        self.assertEqual(subject, "Inventory Alerts: 2 low stock, 1 expiring")
+        self.assertIn("Eggs (SKU E-1): 0 in stock", body)
+        self.assertIn("Eggs (SKU E-1): expires", body)
+
+        self.assertEqual(notifications.queue_digest(low, expiring), 2)
+        with mock.patch("main.outbox.get_connection", wraps=outbox.get_connection) as get_connection:
+            outbox.drain(workers=1)
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual(sorted(email.to[0] for email in mail.outbox), ["a@example.com", "b@example.com"])
+        self.assertEqual({email.subject for email in mail.outbox}, {subject})
+
+
+class SearchTest(TestCase):
+
+    def setUp(self):
+        self.dairy = Category.objects.create(name="Dairy")
+        self.milk = Product.objects.create(name="Whole Milk", description="Fresh", sku="MLK-1", category=self.dairy, cost_price=1, selling_price=2)
+        self.bread = Product.objects.create(name="Bread", description="Goes well with milk", sku="BRD-1", cost_price=1, selling_price=2)
+        Product.objects.create(name="Salt", description="", sku="SLT-1", cost_price=1, selling_price=2)
+
+    def names(self, text:str, order_by:str=None) -> list:
+        return [product.name for product in search.search_products(text, order_by)[:10]]
+
+    def test_ranked_prefix_matches(self):
+        self.assertEqual(self.names("mil"), ["Whole Milk", "Bread"])
+        self.assertEqual(self.names("milk", "name"), ["Bread", "Whole Milk"])
+        self.assertEqual(self.names("mlk-1"), ["Whole Milk"])
+        self.assertEqual(search.search_products("milk").count(), 2)
+        self.assertEqual(self.names('" OR milk:*'), [])
+
+    def test_index_follows_edits(self):
+        self.dairy.name = "Cheese Counter"
+        self.dairy.save()
+        self.assertEqual(self.names("cheese"), ["Whole Milk"])
+
+        supplier = Supplier.objects.create(name="Hillside Farm", email="farm@example.com")
+        self.bread.suppliers.add(supplier)
+        self.assertEqual(self.names("hillside"), ["Bread"])
+
+        self.milk.delete()
+        self.assertEqual(self.names("milk"), ["Bread"])
+
+    def test_view_pages_results(self):
+        response = self.client.get(reverse("products:product_search_view"), {"search": "milk"})
+        self.assertEqual([product.name for product in response.context["products"]], ["Whole Milk", "Bread"])
+
+
+class AutocompleteTest(TestCase):
+
+    def setUp(self):
+        # the indexes live in the process, outside the test's transaction
+        autocomplete.invalidate()
+        self.addCleanup(autocomplete.invalidate)
+        self.milk = Product.objects.create(name="Whole Milk", description="", sku="MLK-1", cost_price=1, selling_price=2)
+        Product.objects.create(name="Milk Chocolate", description="", sku="CHC-1", cost_price=1, selling_price=2)
+
+    def labels(self, kind:str, prefix:str) -> list:
+        return [result["label"] for result in autocomplete.lookup(kind, prefix)]
+
+    def test_prefix_and_word_matches(self):
+        # "milk", the second word of Whole Milk, sorts before "milk chocolate"
+        self.assertEqual(self.labels("product", "MIL"), ["Whole Milk (MLK-1)", "Milk Chocolate (CHC-1)"])
+        self.assertEqual(self.labels("product", "whole m"), ["Whole Milk (MLK-1)"])
+        self.assertEqual(self.labels("sku", "mlk"), ["MLK-1 — Whole Milk"])
+        self.assertEqual(self.labels("product", " "), [])
+
+    def test_saves_update_a_built_index(self):
+        self.labels("product", "m")
+        self.milk.name = "Oat Drink"
+        self.milk.save()
+        Product.objects.create(name="Mango", description="", sku="MNG-1", cost_price=1, selling_price=2)
+        self.assertEqual(self.labels("product", "m"), ["Mango (MNG-1)", "Milk Chocolate (CHC-1)"])
+        self.assertEqual(self.labels("product", "oat"), ["Oat Drink (MLK-1)"])
+
+        self.milk.delete()
+        self.assertEqual(self.labels("sku", "mlk"), [])
+
+    def test_stale_index_refreshes_off_the_request_thread(self):
+        index = autocomplete.INDEXES["product"]
+        self.labels("product", "m")
+        index.built_at -= autocomplete.REFRESH_SECONDS + 1
+        self.addCleanup(setattr, index, "refreshing", False)
+        Product.objects.filter(pk=self.milk.pk).update(name="Oat Drink")
+        with mock.patch.object(autocomplete.threading, "Thread") as thread, self.assertNumQueries(0):
+            self.assertEqual(self.labels("product", "oat"), [])
+            self.labels("product", "oat")
+        thread.assert_called_once_with(target=index._refresh_in_background, daemon=True)
+
+        index.refresh()
+        self.assertEqual(self.labels("product", "oat"), ["Oat Drink (MLK-1)"])
+
+    def test_refresh_that_raced_a_save_is_dropped(self):
+        index = autocomplete.INDEXES["product"]
+        self.labels("product", "m")
+        load = index._load
+
+        def load_then_save():
+            loaded = load()
+            Product.objects.create(name="Mango", description="", sku="MNG-1", cost_price=1, selling_price=2)
+            return loaded
+
+        with mock.patch.object(index, "_load", load_then_save):
+            index.refresh()
+        self.assertEqual(self.labels("product", "man"), ["Mango (MNG-1)"])
+
+    def test_view(self):
+        url = reverse("products:autocomplete_view")
+        response = self.client.get(url, {"kind": "sku", "q": "chc", "limit": "x"})
+        self.assertEqual(response.json()["results"][0]["label"], "CHC-1 — Milk Chocolate")
+        self.assertEqual(self.client.get(url, {"kind": "nope", "q": "a"}).status_code, 400)
+
+
+class StockStatusColumnsTest(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Tea", description="", sku="T-1", cost_price=1, selling_price=2, current_stock=8, min_stock_level=5)
+
+    def status(self) -> tuple:
+        return Product.objects.values_list("stock_deficit", "low_stock").get(pk=self.product.pk)
+
+    def test_columns_follow_every_kind_of_write(self):
+        self.assertEqual(self.status(), (-3, False))
+        Product.objects.filter(pk=self.product.pk).update(current_stock=F("current_stock") - 3)
+        self.assertEqual(self.status(), (0, True))
+
+        self.product.refresh_from_db()
+        self.product.min_stock_level = 2
+        self.product.save()
+        self.assertEqual(self.status(), (-3, False))
+
+        self.product.current_stock = 0
+        Product.objects.bulk_update([self.product], ["current_stock"])
+        self.assertEqual(self.status(), (2, True))
+
+    def test_low_stock_and_expiry_queries_use_the_partial_indexes(self):
+        plans = {
+            "product_low_stock_idx": notifications.low_stock_queryset(),
+            "product_perishable_expiry_idx": notifications.expiring_queryset(),
+        }
+        for index, queryset in plans.items():
+            with self.subTest(index):
+                self.assertIn(index, queryset.explain())
+
+
+class ReorderPlanTest(TestCase):
+
+    def setUp(self):
+        self.busy = Product.objects.create(name="Busy", description="", sku="B-1", cost_price=1, selling_price=2, current_stock=10000, min_stock_level=1)
+        self.idle = Product.objects.create(name="Idle", description="", sku="I-1", cost_price=1, selling_price=2, current_stock=5, min_stock_level=3)
+        # 10 units issued on each of the last 28 days
+        now = timezone.now()
+        for days_ago in range(1, 29):
+            movement = StockMovement.objects.create(
+                product=self.busy, movement_type=StockMovement.ISSUE, quantity=-10, stock_after=0,
+            )
+            StockMovement.objects.filter(pk=movement.pk).update(created_at=now - timedelta(days=days_ago))
+
+    def test_reorder_points(self):
+        demand = np.array([[2.0, 2.0, 2.0, 2.0], [0.0, 4.0, 0.0, 4.0]])
+        forecast, safety_stock, levels = planning.reorder_points(demand, 2, 7, 0.95)
+        self.assertEqual(forecast.tolist(), [2.0, 2.0])
+        self.assertEqual(safety_stock[0], 0)
+        self.assertEqual(levels[0], 14)
+        self.assertGreater(levels[1], 14)
+
+    def test_dry_run_then_write(self):
+        plan = planning.plan_reorder_points(dry_run=True)
+        self.assertEqual((plan.products, plan.with_history, plan.raised), (2, 1, 1))
+        change, = plan.changes
+        self.assertEqual(change["sku"], "B-1")
+        self.busy.refresh_from_db()
+        self.assertEqual(self.busy.min_stock_level, 1)
+
+        written = planning.plan_reorder_points(chunk_size=1)
+        self.assertEqual(written.changes, plan.changes)
+        self.busy.refresh_from_db()
+        self.idle.refresh_from_db()
+        self.assertEqual(self.busy.min_stock_level, change["new"])
+        self.assertEqual(self.idle.min_stock_level, 3)
+        self.assertEqual(planning.plan_reorder_points().changed, 0)
+
+
+class ApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dairy = Category.objects.create(name="Dairy")
+        Category.objects.create(name="Bakery")
+        cls.farm = Supplier.objects.create(name="Farm", email="farm@example.com")
+        cls.milk = Product.objects.create(name="Milk", description="", sku="M-1", category=cls.dairy, cost_price=1, selling_price=2,
+                                          current_stock=1, min_stock_level=5)
+        cls.milk.suppliers.add(cls.farm)
+        cls.salt = Product.objects.create(name="Salt", description="", sku="S-1", cost_price=1, selling_price=2, current_stock=50)
+        cls.bread = Product.objects.create(name="Bread", description="", sku="B-1", cost_price=1, selling_price=2, current_stock=0)
+        cls.clerk = User.objects.create_user("clerk", password="secret")
+        cls.staff = User.objects.create_user("staff", password="secret", is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("api:product_api_view")
+
+    def get(self, url, **params):
+        return self.client.get(url, params)
+
+    def test_authentication(self):
+        response = self.get(self.url)
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("WWW-Authenticate", response)
+
+        credentials = base64.b64encode(b"clerk:secret").decode()
+        response = self.client.get(self.url, HTTP_AUTHORIZATION=f"Basic {credentials}")
+        self.assertEqual(response.status_code, 200)
+        wrong = base64.b64encode(b"clerk:wrong").decode()
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION=f"Basic {wrong}").status_code, 401)
+
+    def test_sparse_fields(self):
+        self.client.force_login(self.clerk)
+        data = self.get(self.url, fields="sku,name,category,suppliers").json()
+        self.assertEqual(data["fields"], ["sku", "name", "category", "suppliers"])
+        self.assertEqual(data["results"][0], {
+            "sku": "M-1", "name": "Milk",
+            "category": {"id": self.dairy.id, "name": "Dairy"},
+            "suppliers": [{"id": self.farm.id, "name": "Farm"}],
+        })
+        self.assertNotIn("cost_price", self.get(self.url).json()["fields"])
+
+    def test_cost_price_is_staff_only(self):
+        self.client.force_login(self.clerk)
+        self.assertEqual(self.get(self.url, fields="sku,cost_price").status_code, 400)
+        self.client.force_login(self.staff)
+        data = self.get(self.url, fields="sku,cost_price").json()
+        self.assertEqual(data["results"][0]["cost_price"], "1.00")
+
+    def test_filters(self):
+        self.client.force_login(self.clerk)
+
+        def skus(**params):
+            return [row["sku"] for row in self.get(self.url, fields="sku", **params).json()["results"]]
+
+        self.assertEqual(skus(status="low_stock"), ["M-1"])
+        self.assertEqual(skus(status="out_of_stock"), ["B-1"])
+        self.assertEqual(skus(category=self.dairy.id), ["M-1"])
+        self.assertEqual(skus(category="none"), ["S-1", "B-1"])
+        self.assertEqual(skus(supplier=self.farm.id), ["M-1"])
+        for params in ({"status": "bogus"}, {"category": "dairy"}, {"supplier": "x"}, {"perishable": "maybe"},
+                       {"updated_since": "yesterday"}, {"limit": "0"}, {"fields": "sku,secret"}, {"cursor": "junk"}):
+            with self.subTest(params):
+                response = self.get(self.url, **params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+    def test_cursor_pages(self):
+        self.client.force_login(self.clerk)
+        first = self.get(self.url, fields="sku", limit=2).json()
+        self.assertEqual([row["sku"] for row in first["results"]], ["M-1", "S-1"])
+        self.assertIsNone(first["previous"])
+        second = self.client.get(first["next"]).json()
+        self.assertEqual([row["sku"] for row in second["results"]], ["B-1"])
+        self.assertIsNone(second["next"])
+        self.assertIsNotNone(second["previous"])
+
+    def test_conditional_get(self):
+        self.client.force_login(self.clerk)
+        response = self.get(self.url)
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.get(self.url, fields="sku")["ETag"], etag)
+
+        self.salt.name = "Sea Salt"
+        self.salt.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_read_only(self):
+        self.client.force_login(self.clerk)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    def test_category_and_supplier_listings(self):
+        self.client.force_login(self.clerk)
+        data = self.get(reverse("api:category_api_view")).json()
+        self.assertEqual(data["results"], [
+            {"id": Category.objects.get(name="Bakery").id, "name": "Bakery", "product_count": 0},
+            {"id": self.dairy.id, "name": "Dairy", "product_count": 1},
+        ])
+        data = self.get(reverse("api:supplier_api_view")).json()
+        self.assertEqual([row["name"] for row in data["results"]], ["Farm"])
+        self.assertNotIn("notes", data["fields"])
+
+
+class CardCacheTest(TestCase):
+    '''Queryset updates skip the signals, so a stale card shows the cache was used.'''
+
+    def setUp(self):
+        cache.clear()
+        self.dairy = Category.objects.create(name="Dairy")
+        self.milk = Product.objects.create(name="Milk", description="", sku="M-1", category=self.dairy, cost_price=1, selling_price=2, current_stock=50)
+        self.salt = Product.objects.create(name="Salt", description="", sku="S-1", cost_price=1, selling_price=2, current_stock=50)
+        self.url = reverse("products:product_list_view")
+
+    def test_cards_are_kept_per_product_and_version(self):
+        self.assertContains(self.client.get(self.url), "Milk")
+        Product.objects.filter(pk=self.milk.pk).update(name="Milk (renamed)")
+        Product.objects.filter(pk=self.salt.pk).update(name="Salt (renamed)")
+        response = self.client.get(self.url)
+        self.assertNotContains(response, "(renamed)")
+
+        versions.bump_objects(Product, [self.milk.pk])
+        response = self.client.get(self.url)
+        self.assertContains(response, "Milk (renamed)")
+        self.assertNotContains(response, "Salt (renamed)")
+
+        self.salt.refresh_from_db()
+        self.salt.save()
+        self.assertContains(self.client.get(self.url), "Salt (renamed)")
+
+    def test_stock_movement_refreshes_the_card(self):
+        self.assertNotContains(self.client.get(self.url), "Low Stock")
+        stock.record_movement(self.milk.id, StockMovement.ISSUE, -50)
+        self.assertContains(self.client.get(self.url), "Low Stock")
+
+    def test_category_rename_refreshes_the_card(self):
+        self.assertContains(self.client.get(self.url), "Dairy")
+        self.dairy.name = "Milk & Cheese"
+        self.dairy.save()
+        self.assertContains(self.client.get(self.url), "Milk &amp; Cheese")
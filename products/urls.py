@@ -9,8 +9,11 @@ urlpatterns = [
     path("create/", views.product_create_view, name="product_create_view"),
     path("detail/<int:product_id>/", views.product_detail_view, name="product_detail_view"),
     path("update/<int:product_id>/", views.product_update_view, name="product_update_view"),
+    path("stock/<int:product_id>/", views.stock_movement_view, name="stock_movement_view"),
+    path("stock/bulk/", views.bulk_stock_view, name="bulk_stock_view"),
     path("delete/<int:product_id>/", views.product_delete_view, name="product_delete_view"),
     path("search/", views.product_search_view, name="product_search_view"),
+    path("autocomplete/", views.autocomplete_view, name="autocomplete_view"),
     path("categories/", views.category_list_view, name="category_list_view"),
     path("categories/create/", views.category_create_view, name="category_create_view"),
     path("categories/update/<int:category_id>/", views.category_update_view, name="category_update_view"),
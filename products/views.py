@@ -1,11 +1,19 @@
-import csv
-import io
-from datetime import datetime
+import json
 from django.shortcuts import render, redirect
-from django.http import HttpRequest, HttpResponse, Http404
+from django.http import HttpRequest, HttpResponse, Http404, StreamingHttpResponse, JsonResponse
 from .models import Product, Category
-from .forms import ProductForm, CategoryForm, CSVUploadForm
-from suppliers.models import Supplier
+from .forms import ProductForm, ProductUpdateForm, CategoryForm, CSVUploadForm, StockMovementForm
+from .importer import import_products
+from .exporter import export_products, parse_columns
+from .alerts import check_alerts, check_products
+from .search import search_products
+from . import autocomplete, stock, api
+from main.pagination import CursorPaginator
+from main import versions
+from main.api import api_view, json_error, conditional_json, make_etag, ApiError
+from reports.stats import get_summary
+from reports.inventory import parse_category
+from django.db import transaction
 from django.db.models import Q, F
 from django.core.paginator import Paginator
 from django.contrib import messages
@@ -14,11 +22,12 @@ from django.contrib import messages
 
 def product_list_view(request:HttpRequest):
     
-    products = Product.objects.all().order_by("-created_at")
+    products = Product.objects.select_related("category")
 
-    page_number = request.GET.get("page", 1)
-    paginator = Paginator(products, 6)
-    products_page = paginator.get_page(page_number)
+    paginator = CursorPaginator(products, 6, ("-created_at", "-id"), estimate=lambda: get_summary().total_products)
+    products_page = paginator.get_page(request.GET.get("cursor"))
+    # the cards show the category name, so a rename moves them all
+    versions.with_versions(products_page, "products.category")
 
     return render(request, "products/product_list.html", {"products":products_page})
 
@@ -30,30 +39,38 @@ def product_create_view(request:HttpRequest):
         return redirect("main:home_view")
 
     product_form = ProductForm()
-    categories = Category.objects.all()
-    suppliers = Supplier.objects.all()
 
     if request.method == "POST":
         
         product_form = ProductForm(request.POST, request.FILES)
         if product_form.is_valid():
-            product = product_form.save(commit=False)
-            product.created_by = request.user
-            product.save()
-            product_form.save_m2m()
+            with transaction.atomic():
+                product = product_form.save(commit=False)
+                product.created_by = request.user
+                product.save()
+                product_form.save_m2m()
+                stock.record_opening_stock(product, request.user)
             messages.success(request, "Created Product Successfully", "alert-success")
             return redirect('main:home_view')
         else:
             print("not valid form", product_form.errors)
 
-    return render(request, "products/create.html", {"product_form":product_form, "categories":categories, "suppliers": suppliers})
+    return render(request, "products/create.html", {"product_form":product_form})
 
 
+@versions.conditional_page(lambda request, product_id: [
+    versions.object_key(Product, product_id), "products.category", "suppliers.supplier",
+])
 def product_detail_view(request:HttpRequest, product_id:int):
 
     product = Product.objects.get(pk=product_id)
+    movements = product.movements.select_related("created_by").order_by("-created_at")[:10]
 
-    return render(request, 'products/product_detail.html', {"product" : product})
+    return render(request, 'products/product_detail.html', {
+        "product" : product,
+        "movements" : movements,
+        "movement_form" : StockMovementForm(),
+    })
 
 
 def product_update_view(request:HttpRequest, product_id:int):
@@ -63,30 +80,118 @@ def product_update_view(request:HttpRequest, product_id:int):
         return redirect("main:home_view")
     
     product = Product.objects.get(pk=product_id)
-    categories = Category.objects.all()
-    suppliers = Supplier.objects.all()
 
     if request.method == "POST":
-        product_form = ProductForm(instance=product, data=request.POST, files=request.FILES)
+        product_form = ProductUpdateForm(instance=product, data=request.POST, files=request.FILES)
         if product_form.is_valid():
-            # Get old values before saving
-            old_product = Product.objects.get(pk=product_id)
-            old_stock = old_product.current_stock
-            old_expiry = old_product.expiry_date
-            
-            product_form.save()
-            
-            if product.current_stock < old_stock and product.is_low_stock():
-                product.send_low_stock_notification()
-            
-            if product.is_perishable and product.expiry_date and product.is_expiring_soon():
-                product.send_expiry_notification()
+            # alerts go to the outbox in the same transaction as the edit
+            with transaction.atomic():
+                product = product_form.save(commit=False)
+                # current_stock is left out so stock movements made meanwhile are kept
+                product.save(update_fields=[
+                    field for field in product_form.Meta.fields if field != 'suppliers'
+                ] + ['updated_at'])
+                product_form.save_m2m()
+                # only a change of alert state (e.g. newly low or expiring) notifies
+                check_products([product.id])
         else:
             print(product_form.errors)
 
         return redirect("products:product_detail_view", product_id=product.id)
 
-    return render(request, "products/product_update.html", {"product":product, "categories" : categories, "suppliers": suppliers})
+    return render(request, "products/product_update.html", {"product":product})
+
+
+def stock_movement_view(request:HttpRequest, product_id:int):
+
+    if not (request.user.is_staff and request.user.has_perm("products.change_product")):
+        messages.warning(request, "only staff can change stock levels", "alert-warning")
+        return redirect("main:home_view")
+
+    if request.method == "POST":
+        movement_form = StockMovementForm(request.POST)
+        if movement_form.is_valid():
+            data = movement_form.cleaned_data
+            try:
+                movement = stock.record_movement(
+                    product_id,
+                    data["movement_type"],
+                    stock.signed_quantity(data["movement_type"], data["quantity"]),
+                    user=request.user,
+                    location=data["location"],
+                    reference=data["reference"],
+                    note=data["note"],
+                )
+                messages.success(request, f"Stock updated: {movement.quantity:+d}, now {movement.stock_after}", "alert-success")
+            except (stock.InsufficientStock, ValueError) as e:
+                messages.error(request, f"Couldn't update stock: {e}", "alert-danger")
+        else:
+            print(movement_form.errors)
+            messages.error(request, "Couldn't update stock, please check the form", "alert-danger")
+
+    return redirect("products:product_detail_view", product_id=product_id)
+
+
+@api_view
+def bulk_stock_view(request:HttpRequest):
+    '''
+    POST a JSON array of {"sku", "delta" | "absolute", "type"?, "reference"?}.
+    Add ?all_or_nothing=1 to apply the batch only if every item is valid.
+    '''
+
+    if request.method != "POST":
+        return json_error("POST a JSON array of stock changes", 405)
+
+    if not (request.user.is_staff and request.user.has_perm("products.change_product")):
+        return json_error("only staff can change stock levels", 403)
+
+    try:
+        items = json.loads(request.body)
+    except ValueError:
+        return json_error("body is not valid JSON", 400)
+    if not isinstance(items, list):
+        return json_error("body must be a JSON array", 400)
+    if len(items) > stock.MAX_BULK_ITEMS:
+        return json_error(f"at most {stock.MAX_BULK_ITEMS} items per request", 413)
+
+    all_or_nothing = request.GET.get("all_or_nothing") in ("1", "true")
+    try:
+        results, applied = stock.apply_bulk(items, request.user, all_or_nothing)
+    except stock.InsufficientStock as e:
+        return json_error(str(e), 409)
+
+    rejected = sum(1 for result in results if result["status"] == "error")
+    return JsonResponse({
+        "applied": applied,
+        "accepted": len(results) - rejected if applied else 0,
+        "rejected": rejected,
+        "results": results,
+    }, status=409 if all_or_nothing and rejected else 200)
+
+
+@api_view
+def product_api_view(request:HttpRequest):
+    '''GET /api/v1/products/, see products.api for the fields and filters.'''
+
+    if request.method != "GET":
+        return json_error("read-only endpoint", 405)
+
+    try:
+        return conditional_json(request, make_etag(request, *api.product_etag_parts(request)), lambda: api.product_listing(request))
+    except ApiError as e:
+        return json_error(str(e), e.status)
+
+
+@api_view
+def category_api_view(request:HttpRequest):
+
+    if request.method != "GET":
+        return json_error("read-only endpoint", 405)
+
+    try:
+        return conditional_json(request, make_etag(request, *api.category_etag_parts(request)), lambda: api.category_listing(request))
+    except ApiError as e:
+        return json_error(str(e), e.status)
 
 
 def product_delete_view(request:HttpRequest, product_id:int):
@@ -168,18 +273,33 @@ def category_delete_view(request:HttpRequest, category_id:int):
 def product_search_view(request:HttpRequest):
 
     if "search" in request.GET and len(request.GET["search"]) >= 3:
-        products = Product.objects.filter(name__contains=request.GET["search"])
+        results = search_products(request.GET["search"], request.GET.get("order_by"))
 
-        if "order_by" in request.GET and request.GET["order_by"] == "name":
-            products = products.order_by("name")
-        elif "order_by" in request.GET and request.GET["order_by"] == "created_at":
-            products = products.order_by("-created_at")
+        page_number = request.GET.get("page", 1)
+        paginator = Paginator(results, 12)
+        products = paginator.get_page(page_number)
+        versions.with_versions(products, "products.category")
     else:
         products = []
 
     return render(request, "products/search_products.html", {"products" : products})
 
 
+def autocomplete_view(request:HttpRequest):
+
+    kind = request.GET.get("kind", "product")
+    if kind not in autocomplete.INDEXES:
+        return JsonResponse({"error": f"unknown kind '{kind}'"}, status=400)
+
+    try:
+        limit = min(int(request.GET.get("limit", autocomplete.MAX_RESULTS)), 25)
+    except ValueError:
+        limit = autocomplete.MAX_RESULTS
+
+    return JsonResponse({"results": autocomplete.lookup(kind, request.GET.get("q", ""), limit)})
+
+
+@versions.conditional_page(lambda request: ["products.category"])
 def category_list_view(request:HttpRequest):
 
     categories = Category.objects.all().order_by('name')
@@ -198,33 +318,12 @@ def check_notifications_view(request:HttpRequest):
         messages.warning(request, "Only staff can check notifications", "alert-warning")
         return redirect("main:home_view")
     
-    low_stock_products = Product.objects.filter(
-        current_stock__lte=F('min_stock_level')
-    )
-    
-    low_stock_count = 0
-    for product in low_stock_products:
-        product.send_low_stock_notification()
-        low_stock_count += 1
-    
-    from datetime import date, timedelta
-    today = date.today()
-    threshold_date = today + timedelta(days=30)
-    
-    expiring_products = Product.objects.filter(
-        is_perishable=True,
-        expiry_date__isnull=False,
-        expiry_date__lte=threshold_date
-    )
-    
-    expiry_count = 0
-    for product in expiring_products:
-        product.send_expiry_notification()
-        expiry_count += 1
+    mode = "item" if request.GET.get("mode") == "item" else "digest"
+    run = check_alerts(mode)
     
     messages.success(
         request, 
-        f"Notifications sent: {low_stock_count} low stock, {expiry_count} expiry alerts", 
+        f"Notifications queued: {len(run.low_stock_products)} low stock, {len(run.expiring_products)} expiry alerts ({run.emails_sent} emails, {run.cleared_alerts} cleared)", 
         "alert-success"
     )
     
@@ -236,21 +335,23 @@ def export_products_csv(request: HttpRequest):
     if not request.user.is_staff:
         return redirect("main:home_view")
     
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="products.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Name', 'Description', 'SKU', 'Category', 'Cost Price', 'Selling Price', 'Current Stock', 'Min Stock Level', 'Is Perishable', 'Expiry Date'])
-    
-    for product in Product.objects.all():
-        writer.writerow([
-            product.name, product.description, product.sku,
-            product.category.name if product.category else '',
-            product.cost_price, product.selling_price,
-            product.current_stock, product.min_stock_level,
-            'Yes' if product.is_perishable else 'No',
-            product.expiry_date.strftime('%Y-%m-%d') if product.expiry_date else ''
-        ])
+    compress = request.GET.get("gzip") == "1"
+    category_id = parse_category(request.GET.get("category"))
+
+    stream = export_products(
+        columns=parse_columns(request.GET.get("columns", "")),
+        category_id=None if category_id == "none" else category_id,
+        low_stock=request.GET.get("low_stock") == "1",
+        perishable=request.GET.get("perishable") == "1",
+        compress=compress,
+    )
+
+    if compress:
+        response = StreamingHttpResponse(stream, content_type='application/gzip')
+        response['Content-Disposition'] = 'attachment; filename="products.csv.gz"'
+    else:
+        response = StreamingHttpResponse(stream, content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="products.csv"'
     
     return response
 
@@ -260,37 +361,18 @@ def import_products_csv(request: HttpRequest):
     if not request.user.is_staff:
         return redirect("main:home_view")
     
+    report = None
+
     if request.method == 'POST':
         form = CSVUploadForm(request.POST, request.FILES)
         if form.is_valid():
-            csv_file = request.FILES['csv_file']
-            decoded_file = csv_file.read().decode('utf-8')
-            csv_data = csv.DictReader(io.StringIO(decoded_file))
-            
-            for row in csv_data:
-                try:
-                    category, created = Category.objects.get_or_create(name=row['category'])
-                    Product.objects.create(
-                        name=row['name'],
-                        description=row['description'],
-                        sku=row['sku'],
-                        category=category,
-                        cost_price=float(row['cost_price']),
-                        selling_price=float(row['selling_price']),
-                        current_stock=int(row['current_stock']),
-                        min_stock_level=int(row['min_stock_level']),
-                        is_perishable=row['is_perishable'].lower() == 'yes',
-                        expiry_date=datetime.strptime(row['expiry_date'], '%Y-%m-%d').date() if row['expiry_date'] else None,
-                        created_by=request.user
-                    )
-                except:
-                    pass
-            
-            messages.success(request, "Products imported", "alert-success")
-            return redirect('products:product_list_view')
+            report = import_products(request.FILES['csv_file'], user=request.user)
+
+            if report.failed:
+                messages.warning(request, f"Imported {report.imported} of {report.rows} rows, {report.failed} failed", "alert-warning")
+            else:
+                messages.success(request, f"Imported {report.imported} products ({report.created} new, {report.updated} updated)", "alert-success")
     else:
         form = CSVUploadForm()
     
-    return render(request, 'products/import_products.html', {'form': form})
-
-
+    return render(request, 'products/import_products.html', {'form': form, 'report': report})
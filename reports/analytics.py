@@ -0,0 +1,295 @@
+import time
+from datetime import timedelta
+import numpy as np
+from django.core.cache import cache
+from django.db.models import FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+from main import versions
+from products.models import Product, Category, StockMovement
+
+
+# cached results are keyed by these version stamps, so any catalog write starts a new entry;
+# stock movements bump the products they move
+CATALOG_KEYS = ("products.product", "products.category")
+CACHE_TIMEOUT = 60 * 60
+
+# cumulative stock value share that closes classes A and B; the rest is C
+ABC_THRESHOLDS = (0.80, 0.95)
+ABC_CLASSES = ("A", "B", "C")
+
+PERCENTILES = (10, 25, 50, 75, 90)
+MARGIN_BINS = (-np.inf, 0, 10, 20, 30, 40, 50, np.inf)
+TOP_PRODUCTS = 20
+
+COLUMNS = np.dtype([
+    ("id", np.int64),
+    ("category", np.int64),
+    ("stock", np.int64),
+    ("cost", np.float64),
+    ("price", np.float64),
+])
+
+# issues over this many days make up the turnover figures
+TURNOVER_DAYS = 90
+DAYS_PER_YEAR = 365
+
+MOVEMENT_COLUMNS = np.dtype([
+    ("id", np.int64),
+    ("issued", np.int64),
+    ("net", np.int64),
+])
+
+
+def load_columns(queryset=None) -> np.ndarray:
+    '''
+    The product columns the analysis needs, as one structured array.
+
+    One values_list query streamed straight into NumPy; prices are cast to
+    REAL in SQL so no Decimal objects are built. Category 0 means none.
+    '''
+    queryset = Product.objects.all() if queryset is None else queryset
+    rows = queryset.order_by().values_list(
+        "id",
+        Coalesce("category_id", Value(0)),
+        "current_stock",
+        Cast("cost_price", FloatField()),
+        Cast("selling_price", FloatField()),
+    )
+    return np.fromiter(rows.iterator(chunk_size=10000), dtype=COLUMNS)
+
+
+def load_movements(days:int=TURNOVER_DAYS) -> np.ndarray:
+    '''
+    Per product, the units issued over the last days and the net change of
+    all its movements in that time, from one grouped query over the ledger.
+    '''
+    rows = (
+        StockMovement.objects
+        .filter(created_at__gte=timezone.now() - timedelta(days=days))
+        .order_by()
+        .values("product_id")
+        .annotate(
+            issued=Coalesce(Sum("quantity", filter=Q(movement_type=StockMovement.ISSUE)), 0),
+            net=Sum("quantity"),
+        )
+        .values_list("product_id", "issued", "net")
+    )
+    movements = np.fromiter(rows.iterator(), dtype=MOVEMENT_COLUMNS)
+    # issues are stored as negative changes
+    movements["issued"] = -movements["issued"]
+    return movements
+
+
+def _share(part, whole) -> float:
+    return float(part / whole) if whole else 0.0
+
+
+def abc_classification(columns:np.ndarray) -> dict:
+    value = columns["stock"] * columns["cost"]
+    total = value.sum()
+
+    order = np.argsort(-value, kind="stable")
+    ranked = value[order]
+    if total > 0:
+        # the share held by everything ranked above a product decides its class,
+        # so the product that crosses 80% is still an A item
+        before = (np.cumsum(ranked) - ranked) / total
+        classes = np.searchsorted(ABC_THRESHOLDS, before, side="right")
+    else:
+        classes = np.full(len(ranked), len(ABC_CLASSES) - 1)
+
+    counts = np.bincount(classes, minlength=len(ABC_CLASSES))
+    values = np.bincount(classes, weights=ranked, minlength=len(ABC_CLASSES))
+
+    top = order[:TOP_PRODUCTS]
+    cumulative = np.cumsum(ranked[:TOP_PRODUCTS])
+    names = dict(
+        (row["id"], row) for row in
+        Product.objects.filter(id__in=columns["id"][top].tolist()).values("id", "name", "sku")
+    )
+    top_products = []
+    for position, index in enumerate(top):
+        product = names.get(int(columns["id"][index]))
+        if product is None:
+            continue
+        top_products.append({
+            "id": product["id"],
+            "name": product["name"],
+            "sku": product["sku"],
+            "stock_value": round(float(value[index]), 2),
+            "cumulative_share": _share(cumulative[position], total),
+            "class": ABC_CLASSES[classes[position]],
+        })
+
+    return {
+        "total_value": round(float(total), 2),
+        "classes": [
+            {
+                "class": name,
+                "products": int(counts[i]),
+                "product_share": _share(counts[i], len(columns)),
+                "stock_value": round(float(values[i]), 2),
+                "value_share": _share(values[i], total),
+            }
+            for i, name in enumerate(ABC_CLASSES)
+        ],
+        "top_products": top_products,
+    }
+
+
+def _bin_label(low, high) -> str:
+    if low == -np.inf:
+        return f"< {high:g}%"
+    if high == np.inf:
+        return f"≥ {low:g}%"
+    return f"{low:g}–{high:g}%"
+
+
+def margin_distribution(columns:np.ndarray) -> dict:
+    priced = columns[columns["price"] > 0]
+    margin = (priced["price"] - priced["cost"]) / priced["price"] * 100
+    retail = (priced["stock"] * priced["price"]).sum()
+    profit = (priced["stock"] * (priced["price"] - priced["cost"])).sum()
+
+    counts, _ = np.histogram(margin, bins=MARGIN_BINS)
+    return {
+        "products": int(len(margin)),
+        "mean": float(margin.mean()) if len(margin) else None,
+        "stock_weighted": _share(profit, retail) * 100 if retail else None,
+        "negative": int((margin < 0).sum()),
+        "percentiles": [
+            {"percentile": p, "margin": float(v)}
+            for p, v in zip(PERCENTILES, np.percentile(margin, PERCENTILES) if len(margin) else [])
+        ],
+        "histogram": [
+            {"label": _bin_label(MARGIN_BINS[i], MARGIN_BINS[i + 1]), "products": int(count), "share": _share(count, len(margin))}
+            for i, count in enumerate(counts)
+        ],
+    }
+
+
+def category_concentration(columns:np.ndarray) -> dict:
+    value = columns["stock"] * columns["cost"]
+    total = value.sum()
+
+    keys, inverse = np.unique(columns["category"], return_inverse=True)
+    values = np.bincount(inverse, weights=value, minlength=len(keys))
+    counts = np.bincount(inverse, minlength=len(keys))
+    shares = values / total if total else np.zeros(len(keys))
+    order = np.argsort(-values, kind="stable")
+
+    names = dict(Category.objects.filter(id__in=keys[keys > 0].tolist()).values_list("id", "name"))
+    return {
+        # Herfindahl-Hirschman index of stock value: 1.0 means a single category holds it all
+        "hhi": float((shares ** 2).sum()),
+        "top3_share": float(shares[order[:3]].sum()),
+        "categories": [
+            {
+                "id": int(keys[i]) or None,
+                "name": names.get(int(keys[i]), "No Category"),
+                "products": int(counts[i]),
+                "stock_value": round(float(values[i]), 2),
+                "value_share": float(shares[i]),
+            }
+            for i in order
+        ],
+    }
+
+
+def _ratio(part, whole):
+    return float(part / whole) if whole else None
+
+
+def stock_turnover(columns:np.ndarray, movements:np.ndarray, days:int=TURNOVER_DAYS) -> dict:
+    '''
+    Cost of the units issued over the window divided by the average stock
+    value at cost, for the catalog and per category.
+
+    The average is taken between the stock at the start of the window,
+    rebuilt from today's level and the window's net movements, and today's.
+    Both are valued at today's cost price.
+    '''
+    issued = np.zeros(len(columns))
+    net = np.zeros(len(columns))
+    if len(columns) and len(movements):
+        order = np.argsort(columns["id"])
+        ids = columns["id"][order]
+        positions = np.minimum(np.searchsorted(ids, movements["id"]), len(ids) - 1)
+        # movements of products deleted since are dropped
+        found = ids[positions] == movements["id"]
+        issued[order[positions[found]]] = movements["issued"][found]
+        net[order[positions[found]]] = movements["net"][found]
+
+    opening = np.maximum(columns["stock"] - net, 0)
+    average_value = (opening + columns["stock"]) / 2 * columns["cost"]
+    cogs = issued * columns["cost"]
+    turnover = _ratio(cogs.sum(), average_value.sum())
+
+    keys, inverse = np.unique(columns["category"], return_inverse=True)
+    category_cogs = np.bincount(inverse, weights=cogs, minlength=len(keys))
+    category_average = np.bincount(inverse, weights=average_value, minlength=len(keys))
+    names = dict(Category.objects.filter(id__in=keys[keys > 0].tolist()).values_list("id", "name"))
+
+    idle = (issued == 0) & (columns["stock"] > 0)
+    return {
+        "days": days,
+        "issued_units": int(issued.sum()),
+        "cogs": round(float(cogs.sum()), 2),
+        "average_value": round(float(average_value.sum()), 2),
+        "turnover": turnover,
+        "annual_turnover": turnover * DAYS_PER_YEAR / days if turnover is not None else None,
+        "days_of_inventory": days / turnover if turnover else None,
+        "idle_products": int(idle.sum()),
+        "idle_value": round(float((columns["stock"][idle] * columns["cost"][idle]).sum()), 2),
+        "categories": [
+            {
+                "id": int(keys[i]) or None,
+                "name": names.get(int(keys[i]), "No Category"),
+                "cogs": round(float(category_cogs[i]), 2),
+                "turnover": _ratio(category_cogs[i], category_average[i]),
+            }
+            for i in np.argsort(-category_cogs, kind="stable")
+        ],
+    }
+
+
+def analyse(columns:np.ndarray, movements:np.ndarray=None) -> dict:
+    movements = np.empty(0, dtype=MOVEMENT_COLUMNS) if movements is None else movements
+    return {
+        "products": int(len(columns)),
+        "abc": abc_classification(columns),
+        "margins": margin_distribution(columns),
+        "categories": category_concentration(columns),
+        "turnover": stock_turnover(columns, movements),
+    }
+
+
+def get_analytics() -> dict:
+    '''
+    ABC classes, margin distribution, category concentration and stock
+    turnover of the catalog.
+
+    Cached until a product or category changes, or the day does since the
+    turnover window moves with it; a miss loads the columns once and
+    computes everything on the arrays.
+    '''
+    version = versions.stamp(*CATALOG_KEYS)
+    key = f"reports:analytics:{version}:{timezone.localdate().isoformat()}"
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    start = time.perf_counter()
+    columns = load_columns()
+    movements = load_movements()
+    loaded = time.perf_counter()
+    result = analyse(columns, movements)
+    result.update({
+        "version": version,
+        "computed_at": timezone.now().isoformat(),
+        "load_seconds": round(loaded - start, 4),
+        "analysis_seconds": round(time.perf_counter() - loaded, 4),
+    })
+    cache.set(key, result, CACHE_TIMEOUT)
+    return result
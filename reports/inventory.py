@@ -0,0 +1,110 @@
+from decimal import Decimal
+from django.db.models import Case, When, Value, Count, Sum, F, Q, CharField, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce
+from products.models import Product
+
+
+MONEY = DecimalField(max_digits=18, decimal_places=2)
+
+STATUS_OUT = "out_of_stock"
+STATUS_LOW = "low_stock"
+STATUS_OK = "in_stock"
+
+STATUS_LABELS = {
+    STATUS_OUT: "Out of Stock",
+    STATUS_LOW: "Low Stock",
+    STATUS_OK: "In Stock",
+}
+
+
+def stock_status():
+    return Case(
+        When(current_stock=0, then=Value(STATUS_OUT)),
+        When(low_stock=True, then=Value(STATUS_LOW)),
+        default=Value(STATUS_OK),
+        output_field=CharField(),
+    )
+
+
+def _value(price_field:str):
+    return ExpressionWrapper(F("current_stock") * F(price_field), output_field=MONEY)
+
+
+def _money_sum(expression):
+    return Coalesce(Sum(expression), Value(Decimal("0")), output_field=MONEY)
+
+
+def parse_category(value):
+    '''A ?category= value: a category id, "none" for uncategorised, or None for anything else.'''
+    if value == "none":
+        return value
+    if value and value.isascii() and value.isdigit() and int(value) < 2 ** 63:
+        return int(value)
+    return None
+
+
+def filter_inventory(queryset, category_id=None, status=None):
+    '''category_id is a ?category= value; one that parse_category() rejects is ignored.'''
+    category_id = parse_category(category_id)
+    if category_id == "none":
+        queryset = queryset.filter(category__isnull=True)
+    elif category_id is not None:
+        queryset = queryset.filter(category_id=category_id)
+    if status:
+        queryset = queryset.alias(status=stock_status()).filter(status=status)
+    return queryset
+
+
+def inventory_rows(queryset):
+    '''Report rows with their values computed in SQL, for one page at a time.'''
+    return (
+        queryset
+        .select_related("category")
+        .only("id", "name", "sku", "image", "current_stock", "min_stock_level", "cost_price", "selling_price", "created_at", "category__name")
+        .annotate(
+            status=stock_status(),
+            value_cost=_value("cost_price"),
+            value_retail=_value("selling_price"),
+            unit_margin=ExpressionWrapper(F("selling_price") - F("cost_price"), output_field=MONEY),
+        )
+    )
+
+
+def _aggregates():
+    return {
+        "products": Count("id"),
+        "units": Coalesce(Sum("current_stock"), Value(0)),
+        "value_cost": _money_sum(_value("cost_price")),
+        "value_retail": _money_sum(_value("selling_price")),
+    }
+
+
+def _with_margin(row:dict) -> dict:
+    row["margin"] = row["value_retail"] - row["value_cost"]
+    row["margin_percent"] = (row["margin"] / row["value_retail"] * 100) if row["value_retail"] else None
+    return row
+
+
+def inventory_totals(queryset) -> dict:
+    return _with_margin(queryset.order_by().aggregate(**_aggregates()))
+
+
+def category_subtotals(queryset) -> list:
+    rows = (
+        queryset.order_by()
+        .values("category_id", "category__name")
+        .annotate(**_aggregates())
+        .order_by("-value_cost")
+    )
+    return [_with_margin(row) for row in rows]
+
+
+def status_subtotals(queryset) -> list:
+    rows = (
+        queryset.order_by()
+        .annotate(status=stock_status())
+        .values("status")
+        .annotate(**_aggregates())
+        .order_by("status")
+    )
+    return [_with_margin(dict(row, label=STATUS_LABELS[row["status"]])) for row in rows]
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from reports.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored dashboard statistics and report any drift'
+
+    def handle(self, *args, **options):
+        self.stdout.write("Reconciling inventory statistics...")
+
+        summary = reconcile()
+
+        for field, (stored, actual) in summary.drift.items():
+            self.stdout.write(self.style.WARNING(f"  {field}: stored {stored}, actual {actual}"))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Reconciled: {summary.total_products} products, {len(summary.drift)} figure(s) corrected"
+            )
+        )
@@ -0,0 +1,25 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from reports import snapshots
+
+
+class Command(BaseCommand):
+    help = 'Snapshot every product\'s stock for the day, update the weekly/monthly rollups and prune old periods'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, default=None, help='Day to record (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--no-prune', action='store_true', help='Keep periods past their retention')
+
+    def handle(self, *args, **options):
+        try:
+            snapshot = snapshots.take_snapshot(options['date'])
+        except snapshots.SnapshotError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Snapshot of {snapshot.date}: {snapshot.products} products in {snapshot.duration:.2f}s")
+        )
+
+        if not options['no_prune']:
+            deleted = snapshots.prune(snapshot.date)
+            self.stdout.write(", ".join(f"{granularity}: {count} rows pruned" for granularity, count in deleted.items()))
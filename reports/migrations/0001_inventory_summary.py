@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0004_stock_status_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_products', models.IntegerField(default=0)),
+                ('total_suppliers', models.IntegerField(default=0)),
+                ('total_categories', models.IntegerField(default=0)),
+                ('low_stock_count', models.IntegerField(default=0)),
+                ('expiring_count', models.IntegerField(default=0)),
+                ('expiring_as_of', models.DateField(blank=True, null=True)),
+                ('stock_value_cost', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('stock_value_retail', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CategoryStockSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.PositiveBigIntegerField(unique=True)),
+                ('product_count', models.IntegerField(default=0)),
+                ('low_stock_count', models.IntegerField(default=0)),
+                ('stock_value_cost', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('stock_value_retail', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='products.category')),
+            ],
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_stockmovement'),
+        ('reports', '0001_inventory_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('products', models.PositiveIntegerField(default=0)),
+                ('taken_at', models.DateTimeField(auto_now_add=True)),
+                ('duration', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CategorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('key', models.PositiveBigIntegerField()),
+                ('samples', models.PositiveIntegerField(default=1)),
+                ('stock_sum', models.BigIntegerField(default=0)),
+                ('value_sum', models.DecimalField(decimal_places=2, default=0, max_digits=22)),
+                ('closing_products', models.IntegerField(default=0)),
+                ('closing_stock', models.BigIntegerField(default=0)),
+                ('closing_value', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularity', 'period_start'], name='reports_cat_granula_865f93_idx')],
+                'constraints': [models.UniqueConstraint(fields=('key', 'granularity', 'period_start'), name='unique_category_snapshot_period')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('samples', models.PositiveIntegerField(default=1)),
+                ('stock_sum', models.BigIntegerField(default=0)),
+                ('value_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('closing_stock', models.IntegerField(default=0)),
+                ('closing_value', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularity', 'period_start'], name='reports_pro_granula_505498_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'granularity', 'period_start'), name='unique_product_snapshot_period')],
+            },
+        ),
+    ]
@@ -1,3 +1,120 @@
 from django.db import models
+from products.models import Product, Category
 
 # Create your models here.
+
+
+class InventorySummary(models.Model):
+    '''
+    Single row of inventory totals, kept current by reports.signals.
+
+    Read it through reports.stats.get_summary(), which creates and reconciles
+    the row on first use and refreshes the date dependent expiring count.
+    '''
+
+    total_products = models.IntegerField(default=0)
+    total_suppliers = models.IntegerField(default=0)
+    total_categories = models.IntegerField(default=0)
+    low_stock_count = models.IntegerField(default=0)
+    expiring_count = models.IntegerField(default=0)
+    expiring_as_of = models.DateField(null=True, blank=True)
+    stock_value_cost = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    stock_value_retail = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"Inventory summary ({self.total_products} products)"
+
+
+class CategoryStockSummary(models.Model):
+
+    # category id, or 0 for products without a category
+    key = models.PositiveBigIntegerField(unique=True)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
+    product_count = models.IntegerField(default=0)
+    low_stock_count = models.IntegerField(default=0)
+    stock_value_cost = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    stock_value_retail = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    def __str__(self) -> str:
+        return f"{self.category.name if self.category else 'No Category'}: {self.product_count} products"
+
+
+class SnapshotDay(models.Model):
+    '''One row per day the stock snapshot was taken; keeps the rollups from counting a day twice.'''
+
+    date = models.DateField(unique=True)
+    products = models.PositiveIntegerField(default=0)
+    taken_at = models.DateTimeField(auto_now_add=True)
+    duration = models.FloatField(default=0)
+
+    def __str__(self) -> str:
+        return f"Snapshot {self.date}"
+
+
+class ProductSnapshot(models.Model):
+    '''
+    Stock of one product over a day, week or month.
+
+    Daily rows are written by reports.snapshots.take_snapshot, which adds the
+    same day into the week and month rows at the same time; old daily and
+    weekly rows are pruned, so the table stays a fixed number of rows per product.
+    '''
+
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+    GRANULARITY_CHOICES = [
+        (DAY, 'Day'),
+        (WEEK, 'Week'),
+        (MONTH, 'Month'),
+    ]
+
+    granularity = models.CharField(max_length=5, choices=GRANULARITY_CHOICES)
+    period_start = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="snapshots")
+
+    samples = models.PositiveIntegerField(default=1)
+    stock_sum = models.BigIntegerField(default=0)
+    value_sum = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    closing_stock = models.IntegerField(default=0)
+    closing_value = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "granularity", "period_start"], name="unique_product_snapshot_period"),
+        ]
+        indexes = [
+            models.Index(fields=["granularity", "period_start"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.product_id} {self.granularity} {self.period_start}"
+
+
+class CategorySnapshot(models.Model):
+    '''Category totals with the same periods as ProductSnapshot; kept after products are deleted.'''
+
+    granularity = models.CharField(max_length=5, choices=ProductSnapshot.GRANULARITY_CHOICES)
+    period_start = models.DateField()
+    # category id, or 0 for products without a category
+    key = models.PositiveBigIntegerField()
+
+    samples = models.PositiveIntegerField(default=1)
+    stock_sum = models.BigIntegerField(default=0)
+    value_sum = models.DecimalField(max_digits=22, decimal_places=2, default=0)
+    closing_products = models.IntegerField(default=0)
+    closing_stock = models.BigIntegerField(default=0)
+    closing_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["key", "granularity", "period_start"], name="unique_category_snapshot_period"),
+        ]
+        indexes = [
+            models.Index(fields=["granularity", "period_start"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"Category {self.key} {self.granularity} {self.period_start}"
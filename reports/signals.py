@@ -0,0 +1,69 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from products.models import Product, Category
+from suppliers.models import Supplier
+from . import stats
+
+
+def _before(instance) -> dict:
+    if instance.pk is None:
+        return {}
+    loaded = stats.loaded_values(instance)
+    if loaded is None:
+        return stats.contributions(Product.objects.filter(pk=instance.pk))
+    return stats.row_contributions(loaded)
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._stats_before = _before(instance)
+
+
+@receiver(post_save, sender=Product)
+def update_product_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    current = stats.current_values(instance)
+    if current is None:
+        after = stats.contributions(Product.objects.filter(pk=instance.pk))
+        instance._loaded_values = None
+    else:
+        after = stats.row_contributions(current)
+        # the next save of this instance diffs against what was just written
+        instance._loaded_values = current
+    stats.apply_delta(getattr(instance, "_stats_before", {}), after)
+
+
+@receiver(pre_delete, sender=Product)
+def remember_deleted_product_stats(sender, instance, **kwargs):
+    # deletes are rare and often go through an instance loaded long before
+    instance._stats_before = stats.contributions(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Product)
+def update_deleted_product_stats(sender, instance, **kwargs):
+    stats.apply_delta(getattr(instance, "_stats_before", {}), {})
+
+
+@receiver(post_save, sender=Supplier)
+def count_created_supplier(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.add_to_count("total_suppliers", 1)
+
+
+@receiver(post_delete, sender=Supplier)
+def count_deleted_supplier(sender, instance, **kwargs):
+    stats.add_to_count("total_suppliers", -1)
+
+
+@receiver(post_save, sender=Category)
+def count_created_category(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.add_to_count("total_categories", 1)
+
+
+@receiver(post_delete, sender=Category)
+def count_deleted_category(sender, instance, **kwargs):
+    stats.add_to_count("total_categories", -1)
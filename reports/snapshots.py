@@ -0,0 +1,198 @@
+import time
+from datetime import date, timedelta
+from django.db import connection, transaction
+from django.db.models import Sum, Max
+from django.utils import timezone
+from main import versions
+from products.models import Product
+from .models import SnapshotDay, ProductSnapshot, CategorySnapshot
+
+
+# how long each granularity is kept; older periods are only available at the next coarser one
+DAILY_RETENTION_DAYS = 35
+WEEKLY_RETENTION_WEEKS = 26
+MONTHLY_RETENTION_MONTHS = 24
+
+TREND_MONTHS = 12
+
+SNAPSHOT_KEY = "reports.snapshotday"
+
+PRODUCT_TABLE = Product._meta.db_table
+PRODUCT_SNAPSHOT_TABLE = ProductSnapshot._meta.db_table
+CATEGORY_SNAPSHOT_TABLE = CategorySnapshot._meta.db_table
+
+# Each statement adds one day to the given period with a single INSERT ... SELECT:
+# a new period starts with that day, an existing one adds it to its sums and
+# moves its closing figures to it. ("WHERE true" keeps SQLite's parser from
+# reading ON CONFLICT as part of the SELECT.)
+PRODUCT_UPSERT_SQL = f"""
+INSERT INTO {PRODUCT_SNAPSHOT_TABLE}
+    (granularity, period_start, product_id, samples, stock_sum, value_sum, closing_stock, closing_value)
+SELECT %s, %s, id, 1, current_stock, current_stock * cost_price, current_stock, current_stock * cost_price
+FROM {PRODUCT_TABLE}
+WHERE true
+ON CONFLICT (product_id, granularity, period_start) DO UPDATE SET
+    samples = {PRODUCT_SNAPSHOT_TABLE}.samples + 1,
+    stock_sum = {PRODUCT_SNAPSHOT_TABLE}.stock_sum + excluded.stock_sum,
+    value_sum = {PRODUCT_SNAPSHOT_TABLE}.value_sum + excluded.value_sum,
+    closing_stock = excluded.closing_stock,
+    closing_value = excluded.closing_value
+"""
+
+CATEGORY_UPSERT_SQL = f"""
+INSERT INTO {CATEGORY_SNAPSHOT_TABLE}
+    (granularity, period_start, key, samples, stock_sum, value_sum, closing_products, closing_stock, closing_value)
+SELECT %s, %s, COALESCE(category_id, 0), 1,
+       SUM(current_stock), SUM(current_stock * cost_price),
+       COUNT(*), SUM(current_stock), SUM(current_stock * cost_price)
+FROM {PRODUCT_TABLE}
+WHERE true
+GROUP BY COALESCE(category_id, 0)
+ON CONFLICT (key, granularity, period_start) DO UPDATE SET
+    samples = {CATEGORY_SNAPSHOT_TABLE}.samples + 1,
+    stock_sum = {CATEGORY_SNAPSHOT_TABLE}.stock_sum + excluded.stock_sum,
+    value_sum = {CATEGORY_SNAPSHOT_TABLE}.value_sum + excluded.value_sum,
+    closing_products = excluded.closing_products,
+    closing_stock = excluded.closing_stock,
+    closing_value = excluded.closing_value
+"""
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def week_start(day:date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def month_start(day:date, months_back:int=0) -> date:
+    month = day.year * 12 + day.month - 1 - months_back
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def periods(day:date) -> list:
+    return [
+        (ProductSnapshot.DAY, day),
+        (ProductSnapshot.WEEK, week_start(day)),
+        (ProductSnapshot.MONTH, month_start(day)),
+    ]
+
+
+def take_snapshot(day:date=None) -> SnapshotDay:
+    '''
+    Records every product's stock for the day and adds it to the week and month rollups.
+
+    Six set-based statements whatever the catalog size. Days must be taken
+    in order, and each only once, since the rollups add each day to their sums.
+    '''
+    day = day or timezone.localdate()
+    start = time.perf_counter()
+
+    with transaction.atomic():
+        latest = SnapshotDay.objects.aggregate(latest=Max("date"))["latest"]
+        if latest is not None and day <= latest:
+            raise SnapshotError(f"stock was already snapshotted up to {latest}")
+
+        with connection.cursor() as cursor:
+            for granularity, period_start in periods(day):
+                cursor.execute(PRODUCT_UPSERT_SQL, [granularity, period_start])
+                cursor.execute(CATEGORY_UPSERT_SQL, [granularity, period_start])
+
+        snapshot = SnapshotDay.objects.create(
+            date=day,
+            products=Product.objects.count(),
+            duration=time.perf_counter() - start,
+        )
+        versions.bump(SNAPSHOT_KEY)
+    return snapshot
+
+
+def prune(today:date=None) -> dict:
+    '''Drops the periods that are past their retention; returns rows deleted per granularity.'''
+    today = today or timezone.localdate()
+    cutoffs = {
+        ProductSnapshot.DAY: today - timedelta(days=DAILY_RETENTION_DAYS),
+        ProductSnapshot.WEEK: week_start(today) - timedelta(weeks=WEEKLY_RETENTION_WEEKS),
+        ProductSnapshot.MONTH: month_start(today, MONTHLY_RETENTION_MONTHS),
+    }
+    deleted = {}
+    for granularity, cutoff in cutoffs.items():
+        products, _ = ProductSnapshot.objects.filter(granularity=granularity, period_start__lt=cutoff).delete()
+        categories, _ = CategorySnapshot.objects.filter(granularity=granularity, period_start__lt=cutoff).delete()
+        deleted[granularity] = products + categories
+    SnapshotDay.objects.filter(date__lt=cutoffs[ProductSnapshot.MONTH]).exclude(
+        date=SnapshotDay.objects.aggregate(latest=Max("date"))["latest"]
+    ).delete()
+    return deleted
+
+
+def _points(rows, months:int, today:date) -> list:
+    '''One point per month, oldest first; months without snapshots are None.'''
+    by_month = {row["period_start"]: row for row in rows}
+    points = []
+    for months_back in range(months - 1, -1, -1):
+        period_start = month_start(today, months_back)
+        row = by_month.get(period_start)
+        if row is None:
+            points.append({"period_start": period_start, "avg_stock": None, "avg_value": None, "closing_stock": None, "closing_value": None})
+            continue
+        points.append({
+            "period_start": period_start,
+            "avg_stock": row["stock_sum"] / row["samples"],
+            "avg_value": row["value_sum"] / row["samples"],
+            "closing_stock": row["closing_stock"],
+            "closing_value": row["closing_value"],
+        })
+    return points
+
+
+def _monthly(queryset, months:int, today:date):
+    return queryset.filter(
+        granularity=ProductSnapshot.MONTH,
+        period_start__gte=month_start(today, months - 1),
+    )
+
+
+def product_trend(product_id:int, months:int=TREND_MONTHS) -> list:
+    today = timezone.localdate()
+    rows = _monthly(ProductSnapshot.objects.filter(product_id=product_id), months, today).values(
+        "period_start", "samples", "stock_sum", "value_sum", "closing_stock", "closing_value",
+    )
+    return _points(rows, months, today)
+
+
+def category_trend(key:int, months:int=TREND_MONTHS) -> list:
+    '''key is the category id, or 0 for products without a category.'''
+    today = timezone.localdate()
+    rows = _monthly(CategorySnapshot.objects.filter(key=key), months, today).values(
+        "period_start", "samples", "stock_sum", "value_sum", "closing_stock", "closing_value",
+    )
+    return _points(rows, months, today)
+
+
+def total_trend(months:int=TREND_MONTHS) -> list:
+    today = timezone.localdate()
+    rows = (
+        _monthly(CategorySnapshot.objects.all(), months, today)
+        .values("period_start")
+        .annotate(
+            days=Max("samples"),
+            total_stock=Sum("stock_sum"),
+            total_value=Sum("value_sum"),
+            total_closing_stock=Sum("closing_stock"),
+            total_closing_value=Sum("closing_value"),
+        )
+        .order_by("period_start")
+    )
+    return _points([
+        {
+            "period_start": row["period_start"],
+            "samples": row["days"],
+            "stock_sum": row["total_stock"],
+            "value_sum": row["total_value"],
+            "closing_stock": row["total_closing_stock"],
+            "closing_value": row["total_closing_value"],
+        }
+        for row in rows
+    ], months, today)
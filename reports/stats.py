@@ -0,0 +1,249 @@
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import DEFERRED, Count, Sum, F, Q, DecimalField, ExpressionWrapper
+from django.utils import timezone
+from products.models import Product, Category
+from products.notifications import EXPIRY_DAYS_THRESHOLD
+from suppliers.models import Supplier
+from .models import InventorySummary, CategoryStockSummary
+
+
+SUMMARY_ID = 1
+
+FIELDS = ("count", "low", "expiring", "cost", "retail")
+
+ZERO = {"count": 0, "low": 0, "expiring": 0, "cost": Decimal("0"), "retail": Decimal("0")}
+
+# the product columns the summary is computed from
+COLUMNS = ("category_id", "current_stock", "min_stock_level", "cost_price", "selling_price", "is_perishable", "expiry_date")
+
+
+def _value(price_field:str):
+    return Sum(ExpressionWrapper(
+        F("current_stock") * F(price_field),
+        output_field=DecimalField(max_digits=18, decimal_places=2),
+    ))
+
+
+def contributions(queryset) -> dict:
+    '''
+    What the given products add to the summary, grouped by category.
+
+    Keys are category ids (0 for no category); one grouped query.
+    '''
+    threshold = timezone.localdate() + timedelta(days=EXPIRY_DAYS_THRESHOLD)
+    rows = (
+        queryset.order_by()
+        .values("category_id")
+        .annotate(
+            count=Count("id"),
+            low=Count("id", filter=Q(low_stock=True)),
+            expiring=Count("id", filter=Q(is_perishable=True, expiry_date__isnull=False, expiry_date__lte=threshold)),
+            cost=_value("cost_price"),
+            retail=_value("selling_price"),
+        )
+    )
+    return {
+        row["category_id"] or 0: {
+            "count": row["count"],
+            "low": row["low"],
+            "expiring": row["expiring"],
+            "cost": row["cost"] or Decimal("0"),
+            "retail": row["retail"] or Decimal("0"),
+        }
+        for row in rows
+    }
+
+
+def row_contributions(values:dict) -> dict:
+    '''contributions() of a single product from its column values, without a query.'''
+    threshold = timezone.localdate() + timedelta(days=EXPIRY_DAYS_THRESHOLD)
+    stock = values["current_stock"]
+    expiry_date = values["expiry_date"]
+    return {
+        values["category_id"] or 0: {
+            "count": 1,
+            "low": int(stock <= values["min_stock_level"]),
+            "expiring": int(bool(values["is_perishable"] and expiry_date is not None and expiry_date <= threshold)),
+            "cost": stock * values["cost_price"],
+            "retail": stock * values["selling_price"],
+        }
+    }
+
+
+def loaded_values(product):
+    '''The summary columns as they were loaded from the database, or None when some were deferred.'''
+    loaded = getattr(product, "_loaded_values", None)
+    if loaded is None or any(loaded.get(name, DEFERRED) is DEFERRED for name in COLUMNS):
+        return None
+    return {name: loaded[name] for name in COLUMNS}
+
+
+def current_values(product):
+    '''
+    The summary columns as the instance holds them now, or None when one
+    is an expression such as F("current_stock") - 1 that only the
+    database can resolve.
+    '''
+    values = {}
+    for name in COLUMNS:
+        value = getattr(product, name)
+        if hasattr(value, "resolve_expression"):
+            return None
+        values[name] = product._meta.get_field(name).to_python(value)
+    return values
+
+
+def _delta(before:dict, after:dict) -> dict:
+    delta = {}
+    for key in before.keys() | after.keys():
+        old = before.get(key, ZERO)
+        new = after.get(key, ZERO)
+        change = {field: new[field] - old[field] for field in FIELDS}
+        if any(change.values()):
+            delta[key] = change
+    return delta
+
+
+def apply_delta(before:dict, after:dict):
+    '''Adds after - before to the summary rows with F() updates.'''
+    delta = _delta(before, after)
+    if not delta:
+        return
+
+    summary = InventorySummary.objects.filter(pk=SUMMARY_ID).first()
+    if summary is None:
+        # first write ever: build the summary from the tables, which already hold the change
+        reconcile()
+        return
+
+    totals = {field: sum(change[field] for change in delta.values()) for field in FIELDS}
+    updates = {
+        "total_products": F("total_products") + totals["count"],
+        "low_stock_count": F("low_stock_count") + totals["low"],
+        "stock_value_cost": F("stock_value_cost") + totals["cost"],
+        "stock_value_retail": F("stock_value_retail") + totals["retail"],
+        "updated_at": timezone.now(),
+    }
+    # the expiring count is only valid for the day it was computed on
+    if summary.expiring_as_of == timezone.localdate():
+        updates["expiring_count"] = F("expiring_count") + totals["expiring"]
+    InventorySummary.objects.filter(pk=SUMMARY_ID).update(**updates)
+
+    CategoryStockSummary.objects.bulk_create(
+        [CategoryStockSummary(key=key, category_id=key or None) for key in delta],
+        ignore_conflicts=True,
+    )
+    for key, change in delta.items():
+        CategoryStockSummary.objects.filter(key=key).update(
+            product_count=F("product_count") + change["count"],
+            low_stock_count=F("low_stock_count") + change["low"],
+            stock_value_cost=F("stock_value_cost") + change["cost"],
+            stock_value_retail=F("stock_value_retail") + change["retail"],
+        )
+
+
+@contextmanager
+def track(queryset):
+    '''
+    Keeps the summary right around bulk writes that bypass model signals.
+
+        with track(Product.objects.filter(sku__in=skus)):
+            Product.objects.bulk_create(...)
+
+    The queryset must select the same rows before and after the write.
+    '''
+    before = contributions(queryset)
+    yield
+    apply_delta(before, contributions(queryset))
+
+
+def add_to_count(field:str, amount:int):
+    updated = InventorySummary.objects.filter(pk=SUMMARY_ID).update(**{field: F(field) + amount, "updated_at": timezone.now()})
+    if not updated:
+        reconcile()
+
+
+def _summary_row() -> InventorySummary:
+    summary = InventorySummary.objects.filter(pk=SUMMARY_ID).first()
+    if summary is None:
+        summary = reconcile()
+    return summary
+
+
+def refresh_expiring(summary:InventorySummary) -> InventorySummary:
+    today = timezone.localdate()
+    summary.expiring_count = Product.objects.filter(
+        is_perishable=True,
+        expiry_date__isnull=False,
+        expiry_date__lte=today + timedelta(days=EXPIRY_DAYS_THRESHOLD)
+    ).count()
+    summary.expiring_as_of = today
+    InventorySummary.objects.filter(pk=SUMMARY_ID).update(expiring_count=summary.expiring_count, expiring_as_of=today)
+    return summary
+
+
+def get_summary() -> InventorySummary:
+    '''The current totals: one primary key lookup, plus one indexed count once a day.'''
+    summary = _summary_row()
+    if summary.expiring_as_of != timezone.localdate():
+        summary = refresh_expiring(summary)
+    return summary
+
+
+def category_breakdown():
+    return CategoryStockSummary.objects.filter(product_count__gt=0).select_related("category").order_by("-stock_value_cost")
+
+
+def reconcile() -> InventorySummary:
+    '''
+    Recomputes every stored figure from the source tables.
+
+    Returns the fresh summary; the drift found is attached as .drift, a dict
+    of field -> (stored, actual) for every figure that was off.
+    '''
+    with transaction.atomic():
+        grouped = contributions(Product.objects.all())
+        totals = {field: sum(row[field] for row in grouped.values()) if grouped else ZERO[field] for field in FIELDS}
+
+        actual = {
+            "total_products": totals["count"],
+            "total_suppliers": Supplier.objects.count(),
+            "total_categories": Category.objects.count(),
+            "low_stock_count": totals["low"],
+            "expiring_count": totals["expiring"],
+            "stock_value_cost": totals["cost"],
+            "stock_value_retail": totals["retail"],
+        }
+
+        stored = InventorySummary.objects.filter(pk=SUMMARY_ID).first()
+        drift = {}
+        if stored is not None:
+            for field, value in actual.items():
+                if getattr(stored, field) != value:
+                    drift[field] = (getattr(stored, field), value)
+
+        summary, _ = InventorySummary.objects.update_or_create(
+            pk=SUMMARY_ID,
+            defaults=dict(actual, expiring_as_of=timezone.localdate()),
+        )
+
+        CategoryStockSummary.objects.exclude(key__in=grouped.keys()).delete()
+        CategoryStockSummary.objects.bulk_create(
+            [
+                CategoryStockSummary(
+                    key=key, category_id=key or None,
+                    product_count=row["count"], low_stock_count=row["low"],
+                    stock_value_cost=row["cost"], stock_value_retail=row["retail"],
+                )
+                for key, row in grouped.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["key"],
+            update_fields=["product_count", "low_stock_count", "stock_value_cost", "stock_value_retail"],
+        )
+
+    summary.drift = drift
+    return summary
@@ -0,0 +1,137 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db.models import Count, Sum, F, Q, ExpressionWrapper
+from django.utils import timezone
+from main import versions
+from products.models import Product
+from products.notifications import EXPIRY_DAYS_THRESHOLD
+from suppliers.models import Supplier
+from .inventory import MONEY
+
+
+# the report moves with any supplier, product or supplier-link change
+SUPPLIER_KEYS = ("suppliers.supplier", "products.product")
+CACHE_TIMEOUT = 60 * 60
+
+# ?sort= values; a leading "-" sorts descending
+SORTS = {
+    "name": lambda row: row["name"].lower(),
+    "rating": lambda row: row["rating"],
+    "country": lambda row: row["country"].lower(),
+    "products": lambda row: row["products"],
+    "value": lambda row: row["value_cost"],
+    "low_share": lambda row: row["low_share"],
+    "expiring_share": lambda row: row["expiring_share"],
+}
+DEFAULT_SORT = "-value"
+# sorted A-Z on first click; the figures largest first
+ASCENDING_FIRST = {"name", "country"}
+
+
+def _product_metrics() -> dict:
+    '''
+    Per-supplier product figures, grouped over the Product.suppliers
+    through-table in one query. A product with several suppliers counts
+    for each of them.
+    '''
+    threshold = timezone.localdate() + timedelta(days=EXPIRY_DAYS_THRESHOLD)
+    rows = (
+        Product.suppliers.through.objects
+        .values("supplier_id")
+        .annotate(
+            products=Count("product_id"),
+            units=Sum("product__current_stock"),
+            value_cost=Sum(ExpressionWrapper(F("product__current_stock") * F("product__cost_price"), output_field=MONEY)),
+            value_retail=Sum(ExpressionWrapper(F("product__current_stock") * F("product__selling_price"), output_field=MONEY)),
+            low=Count("product_id", filter=Q(product__low_stock=True)),
+            expiring=Count("product_id", filter=Q(
+                product__is_perishable=True, product__expiry_date__isnull=False, product__expiry_date__lte=threshold,
+            )),
+        )
+        .order_by()
+    )
+    return {row.pop("supplier_id"): row for row in rows}
+
+
+def _share(part:int, whole:int) -> float:
+    return part / whole * 100 if whole else 0.0
+
+
+def build_rows() -> list:
+    '''Every supplier with its product figures: two queries however many suppliers and links.'''
+    metrics = _product_metrics()
+    empty = {"products": 0, "units": 0, "value_cost": Decimal("0"), "value_retail": Decimal("0"), "low": 0, "expiring": 0}
+    rows = []
+    for supplier in Supplier.objects.values("id", "name", "email", "phone", "country", "rating", "is_active", "logo", "created_at"):
+        row = dict(supplier, **metrics.get(supplier["id"], empty))
+        logo = row.pop("logo")
+        row["logo_url"] = default_storage.url(logo) if logo else None
+        row["units"] = row["units"] or 0
+        row["value_cost"] = row["value_cost"] or Decimal("0")
+        row["value_retail"] = row["value_retail"] or Decimal("0")
+        row["low_share"] = _share(row["low"], row["products"])
+        row["expiring_share"] = _share(row["expiring"], row["products"])
+        rows.append(row)
+    return rows
+
+
+def get_rows() -> list:
+    '''
+    build_rows(), cached until a supplier, product or supplier link
+    changes. The date is part of the key since "expiring" moves with it.
+    '''
+    key = f"reports:suppliers:{versions.stamp(*SUPPLIER_KEYS)}:{timezone.localdate().isoformat()}"
+    rows = cache.get(key)
+    if rows is None:
+        rows = build_rows()
+        cache.set(key, rows, CACHE_TIMEOUT)
+    return rows
+
+
+def filter_rows(rows:list, is_active=None, min_rating=None, country=None) -> list:
+    if is_active is not None:
+        rows = [row for row in rows if row["is_active"] == is_active]
+    if min_rating:
+        rows = [row for row in rows if row["rating"] >= min_rating]
+    if country:
+        rows = [row for row in rows if row["country"].lower() == country.lower()]
+    return rows
+
+
+def parse_sort(value:str) -> str:
+    return value if value and value.lstrip("-") in SORTS else DEFAULT_SORT
+
+
+def sort_links(sort:str) -> dict:
+    '''The ?sort= each column header links to: the current column flips, the others start in their usual direction.'''
+    links = {}
+    for field in SORTS:
+        if sort.lstrip("-") == field:
+            links[field] = field if sort.startswith("-") else f"-{field}"
+        else:
+            links[field] = field if field in ASCENDING_FIRST else f"-{field}"
+    return links
+
+
+def sort_rows(rows:list, sort:str) -> list:
+    field = sort.lstrip("-")
+    # name, then id, breaks ties so the order is stable between requests
+    rows = sorted(rows, key=lambda row: (row["name"].lower(), row["id"]))
+    return sorted(rows, key=SORTS[field], reverse=sort.startswith("-"))
+
+
+def countries(rows:list) -> list:
+    return sorted({row["country"] for row in rows if row["country"]}, key=str.lower)
+
+
+def totals(rows:list) -> dict:
+    return {
+        "suppliers": len(rows),
+        "active": sum(row["is_active"] for row in rows),
+        "links": sum(row["products"] for row in rows),
+        "value_cost": sum((row["value_cost"] for row in rows), Decimal("0")),
+        "low": sum(row["low"] for row in rows),
+        "expiring": sum(row["expiring"] for row in rows),
+    }
@@ -1,3 +1,275 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from products import stock
+from products.importer import import_products
+from products.models import Product, Category, StockMovement
+from suppliers.models import Supplier
+from . import analytics, snapshots, stats, supplier_performance
+from .models import CategoryStockSummary, CategorySnapshot, ProductSnapshot
 
-# Create your tests here.
+
+class InventoryReportFilterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Dairy")
+        Product.objects.create(name="Milk", sku="M-1", category=category, cost_price=1, selling_price=2)
+        Product.objects.create(name="Loose", sku="L-1", cost_price=1, selling_price=2)
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+        cls.category = category
+
+    def test_bad_category_is_ignored(self):
+        self.client.force_login(self.staff)
+        url = reverse("reports:inventory_report")
+        for value in ("abc", "-1", "99999999999999999999999", "²"):
+            with self.subTest(value):
+                self.assertEqual(self.client.get(url, {"category": value}).status_code, 200)
+        self.assertEqual(self.client.get(url, {"category": self.category.id}).status_code, 200)
+        self.assertEqual(self.client.get(url, {"category": "none"}).status_code, 200)
+
+
+class DashboardStatsTest(TestCase):
+
+    def figures(self) -> tuple:
+        summary = stats.get_summary()
+        categories = dict(CategoryStockSummary.objects.filter(product_count__gt=0).values_list("key", "product_count"))
+        return (
+            summary.total_products, summary.total_categories, summary.total_suppliers,
+            summary.low_stock_count, summary.stock_value_cost, summary.stock_value_retail, categories,
+        )
+
+    def assertInStep(self):
+        stored = self.figures()
+        self.assertEqual(stats.reconcile().drift, {})
+        self.assertEqual(self.figures(), stored)
+
+    def test_summary_follows_writes_without_drift(self):
+        dairy = Category.objects.create(name="Dairy")
+        Supplier.objects.create(name="Farm", email="farm@example.com")
+        milk = Product.objects.create(name="Milk", description="", sku="M-1", category=dairy, cost_price=1, selling_price=2, current_stock=4, min_stock_level=5)
+        self.assertEqual(self.figures()[:6], (1, 1, 1, 1, Decimal("4.00"), Decimal("8.00")))
+        self.assertInStep()
+
+        milk.category = None
+        milk.cost_price = 3
+        milk.save()
+        self.assertInStep()
+
+        stock.record_movement(milk.id, StockMovement.RECEIPT, 10)
+        self.assertEqual(self.figures()[3], 0)
+        self.assertInStep()
+
+        import_products(BytesIO(b"name,sku,cost_price,selling_price,current_stock,category\nEggs,E-1,1,2,3,Dairy\nMilk,M-1,3,2,1,\n"))
+        self.assertInStep()
+
+        milk.delete()
+        dairy.product_set.all().delete()
+        self.assertEqual(self.figures()[0], 0)
+        self.assertInStep()
+
+
+    def test_saves_diff_in_memory(self):
+        dairy = Category.objects.create(name="Dairy")
+        Product.objects.create(name="Milk", description="", sku="M-1", category=dairy, cost_price=1, selling_price=2, current_stock=4, min_stock_level=5)
+        milk = Product.objects.get(sku="M-1")
+        milk.current_stock = 9
+        with CaptureQueriesContext(connection) as queries:
+            milk.save()
+        self.assertFalse([query["sql"] for query in queries if "GROUP BY" in query["sql"]])
+        self.assertEqual(self.figures()[3:6], (0, Decimal("9.00"), Decimal("18.00")))
+        self.assertInStep()
+
+        # the second save diffs against the first, not against the load
+        milk.selling_price = "2.50"
+        milk.save()
+        self.assertInStep()
+
+        milk.current_stock = F("current_stock") - 5
+        milk.save()
+        self.assertEqual(self.figures()[3], 1)
+        self.assertInStep()
+        milk.refresh_from_db()
+        milk.min_stock_level = 1
+        milk.save()
+        self.assertInStep()
+
+        deferred = Product.objects.only("id", "name").get(sku="M-1")
+        deferred.name = "Whole Milk"
+        deferred.save()
+        self.assertInStep()
+
+
+class AnalyticsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        dairy = Category.objects.create(name="Dairy")
+        # stock values at cost: 700, 200, 60, 40
+        for sku, stock_level, cost, price, category in (
+            ("A-1", 70, 10, 20, dairy), ("B-1", 20, 10, 12, dairy), ("C-1", 6, 10, 9, None), ("C-2", 4, 10, 15, None),
+        ):
+            Product.objects.create(name=sku, description="", sku=sku, category=category, cost_price=cost, selling_price=price, current_stock=stock_level)
+
+    def test_abc_margins_and_concentration(self):
+        result = analytics.analyse(analytics.load_columns())
+        self.assertEqual(result["products"], 4)
+
+        abc = result["abc"]
+        self.assertEqual(abc["total_value"], 1000.0)
+        self.assertEqual([row["products"] for row in abc["classes"]], [2, 1, 1])
+        self.assertEqual([product["class"] for product in abc["top_products"]], ["A", "A", "B", "C"])
+
+        margins = result["margins"]
+        self.assertEqual(margins["negative"], 1)
+        self.assertAlmostEqual(margins["mean"], (50 + 100 / 6 - 100 / 9 + 100 / 3) / 4)
+
+        categories = result["categories"]
+        self.assertAlmostEqual(categories["hhi"], 0.9 ** 2 + 0.1 ** 2)
+        self.assertEqual([row["name"] for row in categories["categories"]], ["Dairy", "No Category"])
+
+    def test_turnover_from_issues(self):
+        # A-1 issues 30 of its 70, B-1 receives 20 and issues nothing
+        stock.record_movement(Product.objects.get(sku="A-1").id, StockMovement.ISSUE, -30)
+        stock.record_movement(Product.objects.get(sku="B-1").id, StockMovement.RECEIPT, 20)
+
+        turnover = analytics.analyse(analytics.load_columns(), analytics.load_movements())["turnover"]
+        self.assertEqual((turnover["issued_units"], turnover["cogs"]), (30, 300.0))
+        # average stock at cost: A-1 (70 + 40) / 2, B-1 (20 + 40) / 2, C-1 and C-2 unchanged
+        self.assertEqual(turnover["average_value"], 550.0 + 300.0 + 60.0 + 40.0)
+        self.assertAlmostEqual(turnover["turnover"], 300 / 950)
+        self.assertAlmostEqual(turnover["annual_turnover"], 300 / 950 * 365 / 90)
+        self.assertAlmostEqual(turnover["days_of_inventory"], 90 / (300 / 950))
+        self.assertEqual((turnover["idle_products"], turnover["idle_value"]), (3, 500.0))
+        self.assertEqual([(row["name"], row["cogs"]) for row in turnover["categories"]], [("Dairy", 300.0), ("No Category", 0.0)])
+        self.assertAlmostEqual(turnover["categories"][0]["turnover"], 300 / 850)
+
+        # issues from before the window are left out
+        StockMovement.objects.update(created_at=timezone.now() - timedelta(days=analytics.TURNOVER_DAYS + 1))
+        self.assertEqual(analytics.analyse(analytics.load_columns(), analytics.load_movements())["turnover"]["issued_units"], 0)
+
+    def test_cached_until_the_catalog_changes(self):
+        # version stamps restart with each test's rolled back database, the cache does not
+        cache.clear()
+        first = analytics.get_analytics()
+        with self.assertNumQueries(1):
+            self.assertEqual(analytics.get_analytics()["computed_at"], first["computed_at"])
+        Product.objects.filter(sku="C-2").get().delete()
+        self.assertEqual(analytics.get_analytics()["products"], 3)
+
+
+class SnapshotTest(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Tea", description="", sku="T-1", cost_price=2, selling_price=3, current_stock=10)
+        self.first = snapshots.month_start(timezone.localdate())
+        self.second = self.first + timedelta(days=1)
+
+    def test_days_roll_up_into_weeks_and_months(self):
+        snapshots.take_snapshot(self.first)
+        Product.objects.filter(pk=self.product.pk).update(current_stock=30)
+        snapshots.take_snapshot(self.second)
+
+        month = ProductSnapshot.objects.get(product=self.product, granularity=ProductSnapshot.MONTH)
+        self.assertEqual((month.samples, month.stock_sum, month.value_sum, month.closing_stock), (2, 40, Decimal("80.00"), 30))
+        self.assertEqual(ProductSnapshot.objects.filter(product=self.product, granularity=ProductSnapshot.DAY).count(), 2)
+        weeks = ProductSnapshot.objects.filter(granularity=ProductSnapshot.WEEK)
+        self.assertEqual(sum(week.samples for week in weeks), 2)
+        self.assertEqual(CategorySnapshot.objects.get(granularity=ProductSnapshot.MONTH).closing_products, 1)
+
+        point = snapshots.product_trend(self.product.id)[-1]
+        self.assertEqual((point["avg_stock"], point["closing_stock"]), (20, 30))
+        self.assertEqual(snapshots.total_trend()[-1]["avg_value"], Decimal("40"))
+        self.assertIsNone(snapshots.total_trend()[0]["avg_stock"])
+
+    def test_a_day_is_only_taken_once(self):
+        snapshots.take_snapshot(self.second)
+        for day in (self.second, self.first):
+            with self.subTest(day), self.assertRaises(snapshots.SnapshotError):
+                snapshots.take_snapshot(day)
+
+    def test_prune_keeps_only_the_coarser_periods(self):
+        snapshots.take_snapshot(self.first)
+        deleted = snapshots.prune(self.first + timedelta(days=snapshots.DAILY_RETENTION_DAYS + 1))
+        self.assertEqual(deleted[ProductSnapshot.DAY], 2)
+        self.assertEqual(deleted[ProductSnapshot.MONTH], 0)
+        self.assertFalse(ProductSnapshot.objects.filter(granularity=ProductSnapshot.DAY).exists())
+
+
+class SupplierReportTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm = Supplier.objects.create(name="Farm", country="France", rating=5)
+        cls.mill = Supplier.objects.create(name="Mill", country="italy", rating=2)
+        cls.idle = Supplier.objects.create(name="Idle", country="France", is_active=False)
+        milk = Product.objects.create(name="Milk", sku="M-1", cost_price=1, selling_price=2, current_stock=10, min_stock_level=20,
+                                      is_perishable=True, expiry_date=timezone.localdate())
+        flour = Product.objects.create(name="Flour", sku="F-1", cost_price="2.50", selling_price=4, current_stock=4, min_stock_level=0)
+        milk.suppliers.add(cls.farm)
+        flour.suppliers.add(cls.farm, cls.mill)
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_build_rows(self):
+        with self.assertNumQueries(2):
+            rows = {row["name"]: row for row in supplier_performance.build_rows()}
+        farm = rows["Farm"]
+        self.assertEqual((farm["products"], farm["units"], farm["low"], farm["expiring"]), (2, 14, 1, 1))
+        self.assertEqual(farm["value_cost"], Decimal("20.00"))
+        self.assertEqual(farm["value_retail"], Decimal("36.00"))
+        self.assertEqual(farm["low_share"], 50.0)
+        mill = rows["Mill"]
+        self.assertEqual((mill["products"], mill["value_cost"], mill["low_share"]), (1, Decimal("10.00"), 0.0))
+        idle = rows["Idle"]
+        self.assertEqual((idle["products"], idle["units"], idle["value_cost"], idle["expiring_share"]), (0, 0, Decimal("0"), 0.0))
+
+    def test_filter_sort_and_totals(self):
+        rows = supplier_performance.build_rows()
+        names = lambda rows: [row["name"] for row in rows]
+        self.assertEqual(names(supplier_performance.filter_rows(rows, is_active=True)), ["Farm", "Mill"])
+        self.assertEqual(names(supplier_performance.filter_rows(rows, min_rating=3)), ["Farm", "Idle"])
+        self.assertEqual(names(supplier_performance.filter_rows(rows, country="ITALY")), ["Mill"])
+        self.assertEqual(supplier_performance.countries(rows), ["France", "italy"])
+
+        self.assertEqual(names(supplier_performance.sort_rows(rows, "-value")), ["Farm", "Mill", "Idle"])
+        self.assertEqual(names(supplier_performance.sort_rows(rows, "name")), ["Farm", "Idle", "Mill"])
+        self.assertEqual(names(supplier_performance.sort_rows(rows, "rating")), ["Mill", "Idle", "Farm"])
+        self.assertEqual(supplier_performance.parse_sort("bogus"), supplier_performance.DEFAULT_SORT)
+
+        links = supplier_performance.sort_links("name")
+        self.assertEqual((links["name"], links["country"], links["value"]), ("-name", "country", "-value"))
+        self.assertEqual(supplier_performance.sort_links("-value")["value"], "value")
+
+        self.assertEqual(supplier_performance.totals(rows), {
+            "suppliers": 3, "active": 2, "links": 3, "value_cost": Decimal("30.00"), "low": 1, "expiring": 1,
+        })
+
+    def test_rows_are_cached_until_a_change(self):
+        first = supplier_performance.get_rows()
+        with self.assertNumQueries(1):
+            self.assertEqual(supplier_performance.get_rows(), first)
+        self.mill.rating = 4
+        self.mill.save()
+        rows = {row["name"]: row for row in supplier_performance.get_rows()}
+        self.assertEqual(rows["Mill"]["rating"], 4)
+
+    def test_view(self):
+        url = reverse("reports:supplier_report")
+        self.assertRedirects(self.client.get(url), reverse("main:home_view"))
+        self.client.force_login(self.staff)
+        response = self.client.get(url, {"is_active": "1", "sort": "name"})
+        self.assertEqual([row["name"] for row in response.context["suppliers"]], ["Farm", "Mill"])
+        self.assertEqual(response.context["totals"]["suppliers"], 2)
+        self.assertEqual(response.context["countries"], ["France", "italy"])
+        self.assertEqual(response.context["sort_links"]["name"], "-name")
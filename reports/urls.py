@@ -6,6 +6,9 @@ app_name = "reports"
 urlpatterns = [
     path("", views.reports_dashboard_view, name="reports_dashboard"),
     path("inventory/", views.inventory_report_view, name="inventory_report"),
+    path("analytics/", views.analytics_report_view, name="analytics_report"),
+    path("analytics.json", views.analytics_api_view, name="analytics_api"),
+    path("trend.json", views.stock_trend_api_view, name="stock_trend_api"),
     path("suppliers/", views.supplier_report_view, name="supplier_report"),
     path("low-stock/", views.low_stock_report_view, name="low_stock_report"),
     path("expiring/", views.expiring_products_report_view, name="expiring_products_report")
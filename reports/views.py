@@ -1,62 +1,141 @@
 from django.shortcuts import render, redirect
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, HttpResponse, JsonResponse
 from products.models import Product, Category
 from suppliers.models import Supplier
 from django.contrib import messages
-from django.db.models import F
+from .stats import get_summary, category_breakdown
+from . import inventory, analytics, snapshots, supplier_performance
+from main.pagination import CursorPaginator
+from main import versions
 
 # Create your views here.
 
+@versions.conditional_page(lambda request: analytics.CATALOG_KEYS + (snapshots.SNAPSHOT_KEY,))
 def reports_dashboard_view(request:HttpRequest):
 
     if not request.user.is_staff:
         messages.warning(request, "Access denied. Staff privileges required.", "alert-warning")
         return redirect("main:home_view")
 
-    total_products = Product.objects.count()
-    total_suppliers = Supplier.objects.count()
-    total_categories = Category.objects.count()
+    summary = get_summary()
+    trend = snapshots.total_trend()
 
     return render(request, 'reports/dashboard.html', {
-        "total_products": total_products,
-        "total_suppliers": total_suppliers,
-        "total_categories": total_categories,
+        "total_products": summary.total_products,
+        "total_suppliers": summary.total_suppliers,
+        "total_categories": summary.total_categories,
+        "summary": summary,
+        "categories": category_breakdown(),
+        "trend": trend,
+        "trend_max": max((point["avg_value"] for point in trend if point["avg_value"]), default=0),
     })
 
 
+def stock_trend_api_view(request:HttpRequest):
+
+    if not request.user.is_staff:
+        return JsonResponse({"error": "staff privileges required"}, status=403)
+
+    try:
+        months = min(int(request.GET.get("months", snapshots.TREND_MONTHS)), snapshots.MONTHLY_RETENTION_MONTHS)
+        if request.GET.get("product"):
+            trend = snapshots.product_trend(int(request.GET["product"]), months)
+        elif request.GET.get("category"):
+            trend = snapshots.category_trend(int(request.GET["category"]), months)
+        else:
+            trend = snapshots.total_trend(months)
+    except ValueError:
+        return JsonResponse({"error": "product, category and months must be numbers"}, status=400)
+
+    return JsonResponse({"months": months, "trend": trend})
+
+
+@versions.conditional_page(lambda request: analytics.CATALOG_KEYS)
 def inventory_report_view(request:HttpRequest):
 
     if not request.user.is_staff:
         messages.warning(request, "Access denied. Staff privileges required.", "alert-warning")
         return redirect("main:home_view")
 
-    products = Product.objects.all().order_by("name")
+    category_id = request.GET.get("category")
+    status = request.GET.get("status") if request.GET.get("status") in inventory.STATUS_LABELS else None
+    products = inventory.filter_inventory(Product.objects.all(), category_id, status)
+
+    paginator = CursorPaginator(inventory.inventory_rows(products), 100, ("name", "id"))
+    products_page = paginator.get_page(request.GET.get("cursor"))
+
+    return render(request, 'reports/inventory_report.html', {
+        "products": products_page,
+        "totals": inventory.inventory_totals(products),
+        "category_subtotals": inventory.category_subtotals(products),
+        "status_subtotals": inventory.status_subtotals(products),
+        "selected_category": category_id,
+        "selected_status": status,
+        "selected_status_label": inventory.STATUS_LABELS.get(status),
+    })
+
+
+@versions.conditional_page(lambda request: analytics.CATALOG_KEYS)
+def analytics_report_view(request:HttpRequest):
+
+    if not request.user.is_staff:
+        messages.warning(request, "Access denied. Staff privileges required.", "alert-warning")
+        return redirect("main:home_view")
+
+    return render(request, 'reports/analytics_report.html', {"analytics": analytics.get_analytics()})
+
 
-    return render(request, 'reports/inventory_report.html', {"products": products})
+def analytics_api_view(request:HttpRequest):
+
+    if not request.user.is_staff:
+        return JsonResponse({"error": "staff privileges required"}, status=403)
+
+    return JsonResponse(analytics.get_analytics())
 
 
+@versions.conditional_page(lambda request: supplier_performance.SUPPLIER_KEYS)
 def supplier_report_view(request:HttpRequest):
 
     if not request.user.is_staff:
         messages.warning(request, "Access denied. Staff privileges required.", "alert-warning")
         return redirect("main:home_view")
 
-    suppliers = Supplier.objects.all().order_by("name")
-
-    return render(request, 'reports/supplier_report.html', {"suppliers": suppliers})
+    is_active = {"1": True, "0": False}.get(request.GET.get("is_active"))
+    min_rating = request.GET.get("min_rating")
+    min_rating = int(min_rating) if min_rating in ("1", "2", "3", "4", "5") else None
+    country = request.GET.get("country", "").strip()
+    sort = supplier_performance.parse_sort(request.GET.get("sort"))
+
+    rows = supplier_performance.get_rows()
+    suppliers = supplier_performance.sort_rows(
+        supplier_performance.filter_rows(rows, is_active, min_rating, country), sort,
+    )
+
+    return render(request, 'reports/supplier_report.html', {
+        "suppliers": suppliers,
+        "totals": supplier_performance.totals(suppliers),
+        "countries": supplier_performance.countries(rows),
+        "selected_is_active": request.GET.get("is_active", ""),
+        "selected_min_rating": min_rating,
+        "selected_country": country,
+        "sort": sort,
+        "sort_links": supplier_performance.sort_links(sort),
+    })
 
 
+@versions.conditional_page(lambda request: analytics.CATALOG_KEYS)
 def low_stock_report_view(request:HttpRequest):
 
     if not request.user.is_staff:
         messages.warning(request, "Access denied. Staff privileges required.", "alert-warning")
         return redirect("main:home_view")
 
-    low_stock_products = Product.objects.filter(current_stock__lte=F('min_stock_level')).order_by("current_stock")
+    low_stock_products = Product.objects.filter(low_stock=True).select_related("category").order_by("current_stock")
 
     return render(request, 'reports/low_stock_report.html', {"products": low_stock_products})
 
 
+@versions.conditional_page(lambda request: analytics.CATALOG_KEYS)
 def expiring_products_report_view(request:HttpRequest):
 
     if not request.user.is_staff:
@@ -67,6 +146,6 @@ def expiring_products_report_view(request:HttpRequest):
     expiring_products = Product.objects.filter(
         is_perishable=True,
         expiry_date__lte=date.today() + timedelta(days=30)
-    ).order_by("expiry_date")
+    ).select_related("category").order_by("expiry_date")
 
     return render(request, 'reports/expiring_products_report.html', {"products": expiring_products})
@@ -0,0 +1,55 @@
+from main import versions
+from main.api import ApiError, parse_fields, parse_bool, parse_page_size, page_url, cursor_page
+from main.pagination import CursorPaginator
+from .models import Supplier
+
+
+SUPPLIER_VERSION_KEYS = ("suppliers.supplier",)
+
+SUPPLIER_FIELDS = {
+    "id": lambda supplier: supplier.id,
+    "name": lambda supplier: supplier.name,
+    "email": lambda supplier: supplier.email,
+    "phone": lambda supplier: supplier.phone,
+    "website": lambda supplier: supplier.website,
+    "country": lambda supplier: supplier.country,
+    "postal_code": lambda supplier: supplier.postal_code,
+    "logo": lambda supplier: supplier.logo.url if supplier.logo else None,
+    "is_active": lambda supplier: supplier.is_active,
+    "rating": lambda supplier: supplier.rating,
+    "notes": lambda supplier: supplier.notes,
+    "created_at": lambda supplier: supplier.created_at,
+}
+SUPPLIER_DEFAULT_FIELDS = ("id", "name", "email", "phone", "country", "is_active", "rating")
+SUPPLIER_STAFF_FIELDS = ("notes",)
+
+
+def supplier_etag_parts(request) -> tuple:
+    return (versions.stamp(*SUPPLIER_VERSION_KEYS),)
+
+
+def supplier_listing(request) -> dict:
+    '''One page of suppliers, ?is_active=true|false, ?country=, ?min_rating=1..5.'''
+    fields = parse_fields(request, SUPPLIER_FIELDS, SUPPLIER_DEFAULT_FIELDS, SUPPLIER_STAFF_FIELDS)
+    limit = parse_page_size(request)
+    queryset = Supplier.objects.only("id", "name", *fields)
+
+    is_active = parse_bool(request, "is_active")
+    if is_active is not None:
+        queryset = queryset.filter(is_active=is_active)
+    country = request.GET.get("country", "").strip()
+    if country:
+        queryset = queryset.filter(country__iexact=country)
+    min_rating = request.GET.get("min_rating")
+    if min_rating:
+        if min_rating not in ("1", "2", "3", "4", "5"):
+            raise ApiError("min_rating must be between 1 and 5")
+        queryset = queryset.filter(rating__gte=int(min_rating))
+
+    page = cursor_page(request, CursorPaginator(queryset, limit, ("name", "id")))
+    return {
+        "fields": fields,
+        "results": [{name: SUPPLIER_FIELDS[name](supplier) for name in fields} for supplier in page],
+        "next": page_url(request, page.next_token),
+        "previous": page_url(request, page.previous_token),
+    }
@@ -1,3 +1,29 @@
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from main import versions
+from .models import Supplier
 
-# Create your tests here.
+
+class CardCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.farm = Supplier.objects.create(name="Farm", email="farm@example.com")
+        self.mill = Supplier.objects.create(name="Mill", email="mill@example.com")
+        self.url = reverse("suppliers:supplier_list_view")
+
+    def test_cards_are_kept_per_supplier_and_version(self):
+        self.assertContains(self.client.get(self.url), "farm@example.com")
+        # a queryset update skips the signals, so the cached cards stay
+        Supplier.objects.update(email="orders@example.com")
+        self.assertNotContains(self.client.get(self.url), "orders@example.com")
+
+        versions.bump_objects(Supplier, [self.farm.pk])
+        response = self.client.get(self.url)
+        self.assertContains(response, "orders@example.com", count=1)
+        self.assertContains(response, "mill@example.com")
+
+        self.mill.refresh_from_db()
+        self.mill.save()
+        self.assertNotContains(self.client.get(self.url), "mill@example.com")
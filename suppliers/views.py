@@ -2,23 +2,40 @@ from django.shortcuts import render, redirect
 from django.http import HttpRequest, HttpResponse, Http404
 from .models import Supplier
 from .forms import SupplierForm
+from . import api
 from django.db.models import Q
-from django.core.paginator import Paginator
+from main.pagination import CursorPaginator
+from main import versions
+from main.api import api_view, json_error, conditional_json, make_etag, ApiError
+from reports.stats import get_summary
 from django.contrib import messages
 
 # Create your views here.
 
 def supplier_list_view(request:HttpRequest):
     
-    suppliers = Supplier.objects.all().order_by("name")
+    suppliers = Supplier.objects.all()
 
-    page_number = request.GET.get("page", 1)
-    paginator = Paginator(suppliers, 6)
-    suppliers_page = paginator.get_page(page_number)
+    paginator = CursorPaginator(suppliers, 6, ("name", "id"), estimate=lambda: get_summary().total_suppliers)
+    suppliers_page = paginator.get_page(request.GET.get("cursor"))
+    versions.with_versions(suppliers_page)
 
     return render(request, "suppliers/supplier_list.html", {"suppliers":suppliers_page})
 
 
+@api_view
+def supplier_api_view(request:HttpRequest):
+    '''GET /api/v1/suppliers/, see suppliers.api for the fields and filters.'''
+
+    if request.method != "GET":
+        return json_error("read-only endpoint", 405)
+
+    try:
+        return conditional_json(request, make_etag(request, *api.supplier_etag_parts(request)), lambda: api.supplier_listing(request))
+    except ApiError as e:
+        return json_error(str(e), e.status)
+
+
 def supplier_create_view(request:HttpRequest):
 
     if not (request.user.is_staff and request.user.has_perm("suppliers.add_supplier")):
@@ -42,6 +59,7 @@ def supplier_create_view(request:HttpRequest):
     return render(request, "suppliers/create.html", {"supplier_form":supplier_form})
 
 
+@versions.conditional_page(lambda request, supplier_id: [versions.object_key(Supplier, supplier_id)])
 def supplier_detail_view(request:HttpRequest, supplier_id:int):
 
     supplier = Supplier.objects.get(pk=supplier_id)
@@ -95,6 +113,7 @@ def supplier_search_view(request:HttpRequest):
             suppliers = suppliers.order_by("name")
         elif "order_by" in request.GET and request.GET["order_by"] == "rating":
             suppliers = suppliers.order_by("-rating")
+        suppliers = versions.with_versions(suppliers)
     else:
         suppliers = []
 